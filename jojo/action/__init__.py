@@ -1,8 +1,13 @@
 # import abc
 import argparse
+import importlib
 import logging
 import typing
 
+import cache
+import tracing
+import util
+
 
 class JojoAction(argparse.Action):
     '''
@@ -15,8 +20,10 @@ class JojoAction(argparse.Action):
 
         :name namespace: The namespace for parsed args.
         '''
-        level = namespace.log_level or 'info'
-        logging.basicConfig(level=logging.getLevelName(level.upper()))
+        level = logging.getLevelName((namespace.log_level or 'info').upper())
+        logging.basicConfig(level=level)
+        # basicConfig does nothing when run again by the daemon
+        logging.getLogger().setLevel(level)
 
     def __call__(
             self,
@@ -36,7 +43,63 @@ class JojoAction(argparse.Action):
         :raises: subprocess.CalledProcessError
         '''
         self._setup_logger(namespace)
-        return self.run(parser, namespace, values, option_string)
+        if namespace.trace:
+            tracing.enable()
+
+        try:
+            with tracing.span(type(self).__name__, 'action'):
+                cache.configure(
+                    directory=namespace.cache_dir,
+                    ttl=namespace.cache_ttl)
+                return self.run(parser, namespace, values, option_string)
+        finally:
+            if namespace.trace:
+                tracing.get_tracer().write(namespace.trace)
 
     def run(self, parser, namespace, values, option_string):
         pass
+
+    @staticmethod
+    def _get_image_names(
+            parser: argparse.ArgumentParser,
+            namespace: argparse.Namespace,
+            values: typing.List[str]) -> typing.List[str]:
+        '''
+        Returns the images given on the command line, or all the images
+        of the images directory with --all.
+
+        :name parser: The argument parser in use.
+        :name namespace: The namespace for parsed args.
+        :name values: Values for the action.
+        '''
+        image_names = values
+        if namespace.all:
+            image_names = util.get_image_names(namespace.path)
+
+        if not image_names:
+            parser.error('an image or --all is required')
+
+        return image_names
+
+
+def lazy(module: str, name: str) -> typing.Type[argparse.Action]:
+    '''
+    Returns an action importing its module only once it is called, so
+    that the CLI does not import the dependencies of every command.
+
+    :name module: The module of the action in the action package.
+    :name name: The name of the action class.
+    '''
+    class LazyAction(argparse.Action):
+        def __init__(self, **kwargs):
+            super().__init__(**kwargs)
+            self._kwargs = kwargs
+
+        def __call__(self, parser, namespace, values, option_string=None):
+            cls = getattr(
+                importlib.import_module(f'action.{module}'), name)
+            return cls(**self._kwargs)(
+                parser, namespace, values, option_string)
+
+    LazyAction.__name__ = name
+    return LazyAction
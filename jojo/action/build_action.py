@@ -1,24 +1,116 @@
 import argparse
+import concurrent.futures
 import logging
+import threading
 import typing
 
 import action
+import builder
 import config
+import graph
+import tracing
 import util
 
 LOGGER = logging.getLogger(__name__)
 
 
+def build_images(
+        namespace: argparse.Namespace,
+        image_names: typing.List[str],
+        cancelled: typing.Optional[threading.Event] = None
+        ) -> typing.Dict[str, BaseException]:
+    '''
+    Builds images, after the images they depend on. The images unchanged
+    since their last build are skipped.
+    :param namespace: The namespace for parsed args.
+    :param image_names: The names of the images.
+    :param cancelled: Once set, the images not started yet are not built.
+    :returns: The exceptions raised, by image name.
+    :raises: graph.CycleError
+    '''
+    build_configs = config.get_build_configs(
+            path=namespace.path,
+            image_names=image_names,
+            cache_dir=namespace.cache_dir)
+    dependencies = graph.get_dependencies(build_configs)
+
+    LOGGER.debug(dependencies)
+
+    image_builder = util.get_class(
+        package='builder',
+        module=namespace.builder,
+        name=namespace.builder)()
+    build_state = builder.get_build_state(namespace)
+    digests = {}
+
+    def build(image_name: str):
+        if cancelled is not None and cancelled.is_set():
+            raise concurrent.futures.CancelledError('build cancelled')
+        with tracing.span('build', 'image', image=image_name):
+            try:
+                _build(image_name)
+            except concurrent.futures.CancelledError:
+                # a builder command was killed
+                raise concurrent.futures.CancelledError(
+                    'build cancelled') from None
+
+    def _build(image_name: str):
+        build_config = build_configs[image_name]
+        LOGGER.debug(build_config)
+
+        image_dir = util.get_image_dir(namespace.path, image_name)
+        with tracing.span('digest', 'image', image=image_name):
+            digest = builder.get_build_digest(
+                namespace=namespace,
+                image=image_name,
+                build_config=build_config,
+                base_digests=[
+                    digests[d] for d in sorted(dependencies[image_name])])
+        digests[image_name] = digest
+        LOGGER.debug('%s: build digest %s', image_name, digest)
+
+        if not namespace.force and build_state.is_built(
+                image_dir=image_dir,
+                digest=digest,
+                push=namespace.push):
+            LOGGER.info('%s: unchanged since the last build, skipping',
+                        image_name)
+            return
+
+        image = build_config.image.full_name
+        if namespace.check_registry and not namespace.rebuild and \
+                builder.has_registry_tag(image):
+            LOGGER.info('%s: %s already exists in the registry, '
+                        'skipping', image_name, image)
+            return
+
+        image_builder.build(
+            namespace=namespace,
+            image=image_name,
+            build_config=build_config)
+
+        if not namespace.dry_run:
+            build_state.set_built(
+                image_dir=image_dir,
+                digest=digest,
+                pushed=namespace.push)
+
+    return graph.run(
+        dependencies=dependencies,
+        func=build,
+        jobs=namespace.jobs)
+
+
 class BuildAction(action.JojoAction):
     '''
-    Build an image.
+    Build one or several images.
     '''
 
     def run(
             self,
             parser: argparse.ArgumentParser,
             namespace: argparse.Namespace,
-            values: str,
+            values: typing.List[str],
             option_string: typing.Optional[str]):
         '''
         Execution of the action.
@@ -26,19 +118,12 @@ class BuildAction(action.JojoAction):
         :name namespace: The namespace for parsed args.
         :name values: Values for the action.
         :name option_string: Option string.
+        :raises: subprocess.CalledProcessError
         '''
-        build_config = config.get_build_config(
-                path=namespace.path,
-                image_name=values)
-
-        LOGGER.debug(build_config)
+        image_names = self._get_image_names(parser, namespace, values)
 
-        builder = util.get_class(
-            package='builder',
-            module=namespace.builder,
-            name=namespace.builder)()
+        failed = build_images(namespace, image_names)
 
-        builder.build(
-            namespace=namespace,
-            image=values,
-            build_config=build_config)
+        if failed:
+            LOGGER.error('Failed builds: %s', ', '.join(sorted(failed)))
+            raise next(iter(failed.values()))
@@ -4,11 +4,73 @@ import typing
 
 import action
 import config
+import resolver
 import util
 
 LOGGER = logging.getLogger(__name__)
 
 
+class Change(typing.NamedTuple):
+    '''
+    A version written to a buildfile.
+    '''
+    image_name: str
+    previous: typing.Optional[str]
+    version: str
+
+
+def update_versions(
+        results: typing.List[resolver.Result],
+        build_configs: typing.Dict[str, config.ImageBuildConfig],
+        buildfile_paths: typing.Dict[str, str],
+        dry_run: bool = False) -> typing.List[Change]:
+    '''
+    Writes the latest versions found to the buildfiles, only those whose
+    version changed are written.
+    :param results: The results of the lookups of the latest versions.
+    :param build_configs: The build configurations, by image name.
+    :param buildfile_paths: The paths of the buildfiles, by image name.
+    :param dry_run: Do not write the buildfiles.
+    :returns: The versions that changed.
+    '''
+    changes = []
+    for result in results:
+        if result.version_from is None:
+            LOGGER.info('%s: no tag_build configured', result.image_name)
+            continue
+
+        version = result.latest
+        if version is None:
+            LOGGER.error('%s: no version found', result.image_name)
+            continue
+
+        LOGGER.info('%s: found version %s using %s',
+                    result.image_name,
+                    version,
+                    result.version_from.type.value)
+
+        # TODO: add tag build construction VERSION+GIT etc
+        build_config = build_configs[result.image_name]
+        current = build_config.image.tag_build.version
+        if build_config.image.tag == version and current == version:
+            # rewriting would change the mtime for nothing, and with it
+            # every cache and change detection based on it
+            LOGGER.debug('%s: already at version %s',
+                         result.image_name, version)
+            continue
+
+        build_config.image.tag = version
+        build_config.image.tag_build.version = version
+        changes.append(Change(result.image_name, current, version))
+
+        if not dry_run:
+            util.write_atomic(
+                buildfile_paths[result.image_name],
+                build_config.to_yaml())
+
+    return changes
+
+
 class FindVersionAction(action.JojoAction):
     '''
     Finds the version of a package from OS repo or GIT.
@@ -18,7 +80,7 @@ class FindVersionAction(action.JojoAction):
             self,
             parser: argparse.ArgumentParser,
             namespace: argparse.Namespace,
-            values: str,
+            values: typing.List[str],
             option_string: typing.Optional[str]):
         '''
         :name parser: The argument parser in use.
@@ -26,38 +88,35 @@ class FindVersionAction(action.JojoAction):
         :name values: Values for the action.
         :name option_string: Option string.
         '''
+        image_names = self._get_image_names(parser, namespace, values)
+
+        buildfile_paths = {
+            image_name: config.get_buildfile_path(
+                path=namespace.path,
+                image_name=image_name)
+            for image_name in image_names
+        }
+        build_configs = {
+            image_name: config.load_build_config(
+                buildfile_path,
+                cache_dir=namespace.cache_dir)
+            for image_name, buildfile_path in buildfile_paths.items()
+        }
+
+        results = resolver.resolve(
+            build_configs=build_configs,
+            first_versions=namespace.first_versions,
+            jobs=namespace.jobs,
+            latest=True)
+
+        changes = update_versions(
+            results=results,
+            build_configs=build_configs,
+            buildfile_paths=buildfile_paths,
+            dry_run=namespace.dry_run)
 
-        buildfile_path = config.get_buildfile_path(
-            path=namespace.path,
-            image_name=values)
-        build_config = config.get_build_config(
-            path=namespace.path,
-            image_name=values)
-        tag_build = build_config.get_tag_build()
-        version_from = tag_build.version_from
-
-        if tag_build is None:
-            LOGGER.info('No tag_build configured')
-            return
-
-        if version_from:
-            LOGGER.info('Using tag_build for %s', version_from.type.value)
-
-            repository = util.get_class(
-                package='version_finder',
-                module=version_from.type.value,
-                name=version_from.type.value)(version_from=version_from)
-
-            # TODO: add semver
-            version = repository.get_latest(
-                    first_versions=namespace.first_versions)
-
-        if version is not None:
-            LOGGER.info('Found version, %s', version)
-            # TODO: add tag build construction VERSION+GIT etc
-            build_config.image.tag = version
-            build_config.image.tag_build.version = version
-
-            if not namespace.dry_run:
-                with open(file=buildfile_path, mode='w') as buildfile:
-                    build_config.to_fobj(fileobj=buildfile)
+        LOGGER.info('%d of %d images changed', len(changes), len(results))
+        for change in changes:
+            print(f'{change.image_name}\t{change.previous or "-"}\t'
+                  f'{change.version}')
+        resolver.check_results(results)
@@ -0,0 +1,59 @@
+import argparse
+import json
+import logging
+import typing
+
+import action
+import index
+
+LOGGER = logging.getLogger(__name__)
+
+
+class ListAction(action.JojoAction):
+    '''
+    Lists the image projects of the images directory.
+    '''
+
+    def run(
+            self,
+            parser: argparse.ArgumentParser,
+            namespace: argparse.Namespace,
+            values: typing.List[str],
+            option_string: typing.Optional[str]):
+        '''
+        Execution of the action.
+        :name parser: The argument parser in use.
+        :name namespace: The namespace for parsed args.
+        :name values: Patterns of the image names.
+        :name option_string: Option string.
+        '''
+        if not namespace.path:
+            parser.error('the images directory is required, see --path')
+
+        image_index = index.get_index(
+            path=namespace.path,
+            cache_dir=namespace.cache_dir)
+        entries = image_index.query(
+            patterns=values,
+            source=namespace.source,
+            registry=namespace.registry,
+            base_image=namespace.base_image)
+
+        if namespace.json:
+            print(json.dumps([
+                {k: v for k, v in e._asdict().items()
+                 if k not in ('mtime_ns', 'size')}
+                for e in entries
+            ], indent=2))
+            return
+
+        for entry in entries:
+            source = 'none'
+            if entry.source:
+                source = f'{entry.source}:{entry.source_name}'
+            print('\t'.join([
+                entry.image_name,
+                entry.image,
+                source,
+                ','.join(entry.base_images) or '-',
+            ]))
@@ -4,7 +4,7 @@ import typing
 
 import action
 import config
-import util
+import resolver
 
 LOGGER = logging.getLogger(__name__)
 
@@ -18,7 +18,7 @@ class ListVersionAction(action.JojoAction):
             self,
             parser: argparse.ArgumentParser,
             namespace: argparse.Namespace,
-            values: str,
+            values: typing.List[str],
             option_string: typing.Optional[str]):
         '''
         :name parser: The argument parser in use.
@@ -26,31 +26,44 @@ class ListVersionAction(action.JojoAction):
         :name values: Values for the action.
         :name option_string: Option string.
         '''
-        build_config = config.get_build_config(
+        image_names = self._get_image_names(parser, namespace, values)
+
+        build_configs = config.get_build_configs(
             path=namespace.path,
-            image_name=values)
-        tag_build = build_config.get_tag_build()
-        version_from = tag_build.version_from
+            image_names=image_names,
+            cache_dir=namespace.cache_dir)
+
+        results = resolver.resolve(
+            build_configs=build_configs,
+            first_versions=namespace.first_versions,
+            jobs=namespace.jobs)
 
-        if tag_build is None:
-            LOGGER.info('no tag_build configured')
+        for result in results:
+            if result.version_from is None:
+                LOGGER.info('%s: no tag_build configured', result.image_name)
+                continue
 
-        if tag_build and version_from:
-            LOGGER.info('using tag_build for %s', version_from.type.value)
-            LOGGER.debug(version_from)
+            LOGGER.info('%s: using tag_build for %s',
+                        result.image_name,
+                        result.version_from.type.value)
+            LOGGER.debug(result.version_from)
 
-            repository = util.get_class(
-                package='version_finder',
-                module=version_from.type.value,
-                name=version_from.type.value)(version_from=version_from)
+            if result.failed:
+                # the error of the lookup is already logged
+                if result.error is None:
+                    LOGGER.error('%s: no version found', result.image_name)
+                continue
 
-            versions = repository.get_all(
-                    first_versions=namespace.first_versions)
+            for v in [v for v in (result.versions.stable or [])]:
+                LOGGER.info(f'{result.image_name}: stable: {v}')
 
-            for v in [v for v in (versions.stable or [])]:
-                LOGGER.info(f'stable: {v}')
+            for v in [v for v in (result.versions.unstable or [])]:
+                LOGGER.info(f'{result.image_name}: unstable: {v}')
 
-            for v in [v for v in (versions.unstable or [])]:
-                LOGGER.info(f'unstable: {v}')
+            if result.versions.match:
+                LOGGER.info('%s: match for %s: %s',
+                            result.image_name,
+                            result.version_from.semver,
+                            result.versions.match)
 
-            # TODO: add if a matched version
+        resolver.check_results(results)
@@ -3,6 +3,7 @@ import logging
 import typing
 
 import action
+import builder
 import config
 import util
 
@@ -29,16 +30,23 @@ class PushAction(action.JojoAction):
         '''
         build_config = config.get_build_config(
                 path=namespace.path,
-                image_name=values)
+                image_name=values,
+                cache_dir=namespace.cache_dir)
         image = build_config.image.full_name
 
         LOGGER.debug(build_config)
 
-        builder = util.get_class(
+        if namespace.check_registry and not namespace.rebuild and \
+                builder.has_registry_tag(image):
+            LOGGER.info('%s already exists in the registry, skipping', image)
+            return
+
+        image_builder = util.get_class(
             package='builder',
             module=namespace.builder,
             name=namespace.builder)()
 
-        builder.push(
+        image_builder.push(
             namespace=namespace,
-            image=image)
+            image=image,
+            platforms=builder.get_platforms(namespace, build_config))
@@ -0,0 +1,144 @@
+import argparse
+import logging
+import time
+import typing
+
+import action
+from action import find_version_action
+import config
+import default
+import resolver
+import scheduler
+import util
+
+LOGGER = logging.getLogger(__name__)
+
+
+class ScheduleAction(action.JojoAction):
+    '''
+    Checks the versions of the images periodically and writes the new
+    ones to their buildfiles.
+    '''
+
+    @staticmethod
+    def _get_intervals(
+            parser: argparse.ArgumentParser,
+            namespace: argparse.Namespace) -> typing.Dict[str, float]:
+        '''
+        Returns the intervals by source type, the CLI overriding the
+        defaults.
+        '''
+        intervals = dict(default.Schedule.INTERVALS.value)
+        for arg in namespace.interval or []:
+            source, _, seconds = arg.partition('=')
+            try:
+                config.SourceType(source)
+                intervals[source] = float(seconds)
+            except ValueError:
+                parser.error(f'invalid interval: {arg}, expected '
+                             'SOURCE=SECONDS, e.g. github=7200')
+            if not intervals[source] > 0:
+                parser.error(f'invalid interval: {arg}, the seconds must '
+                             'be positive')
+        return intervals
+
+    def _check(
+            self,
+            namespace: argparse.Namespace,
+            image_scheduler: scheduler.Scheduler,
+            values: typing.List[str]):
+        '''
+        Checks the versions of the images due.
+        '''
+        image_names = util.get_image_names(namespace.path)
+        if values:
+            image_names = [n for n in image_names if n in values]
+
+        buildfile_paths = {
+            image_name: config.get_buildfile_path(
+                path=namespace.path,
+                image_name=image_name)
+            for image_name in image_names
+        }
+        build_configs = {}
+        for image_name, buildfile_path in buildfile_paths.items():
+            build_config = config.load_valid_build_config(
+                buildfile_path,
+                image_name=image_name,
+                cache_dir=namespace.cache_dir)
+            if build_config is not None:
+                build_configs[image_name] = build_config
+
+        now = time.time()
+        # a single run checks the new images, not only some of them
+        image_scheduler.update(build_configs, now, spread=not namespace.once)
+        due = image_scheduler.get_due(now)
+        if not due:
+            return
+
+        LOGGER.info('Checking %s', ', '.join(due))
+        results = resolver.resolve(
+            build_configs={n: build_configs[n] for n in due},
+            first_versions=namespace.first_versions,
+            jobs=namespace.jobs,
+            latest=True)
+        image_scheduler.record(results, time.time())
+
+        changes = find_version_action.update_versions(
+            results=results,
+            build_configs=build_configs,
+            buildfile_paths=buildfile_paths,
+            dry_run=namespace.dry_run)
+        for change in changes:
+            LOGGER.info('%s: version changed from %s to %s',
+                        change.image_name, change.previous, change.version)
+
+    def run(
+            self,
+            parser: argparse.ArgumentParser,
+            namespace: argparse.Namespace,
+            values: typing.List[str],
+            option_string: typing.Optional[str]):
+        '''
+        Execution of the action.
+        :name parser: The argument parser in use.
+        :name namespace: The namespace for parsed args.
+        :name values: The images to check, all by default.
+        :name option_string: Option string.
+        '''
+        if not namespace.path:
+            parser.error('the images directory is required, see --path')
+
+        image_scheduler = scheduler.Scheduler(
+            path=namespace.path,
+            cache_dir=namespace.cache_dir,
+            intervals=self._get_intervals(parser, namespace),
+            jitter=namespace.jitter)
+        image_scheduler.load()
+
+        # stop as on ctrl-c, so that the state is saved
+        util.interrupt_on_sigterm()
+
+        try:
+            while True:
+                try:
+                    self._check(namespace, image_scheduler, values)
+                except Exception as err:
+                    # e.g. the images directory was removed, the next
+                    # round may succeed
+                    LOGGER.exception('Unable to check the versions: %s', err)
+                image_scheduler.save()
+                if namespace.once:
+                    return
+
+                # woken up regularly to schedule the new images
+                delay = default.SCHEDULE_RESCAN_INTERVAL
+                next_at = image_scheduler.get_next_at()
+                if next_at is not None:
+                    delay = min(delay, next_at - time.time())
+                if delay > 0:
+                    LOGGER.debug('Sleeping %ds', delay)
+                    time.sleep(delay)
+        except KeyboardInterrupt:
+            LOGGER.info('Stopping')
+            image_scheduler.save()
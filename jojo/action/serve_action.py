@@ -0,0 +1,35 @@
+import argparse
+import logging
+import typing
+
+import action
+import server
+
+LOGGER = logging.getLogger(__name__)
+
+
+class ServeAction(action.JojoAction):
+    '''
+    Runs the daemon.
+    '''
+
+    def run(
+            self,
+            parser: argparse.ArgumentParser,
+            namespace: argparse.Namespace,
+            values: typing.Optional[str],
+            option_string: typing.Optional[str]):
+        '''
+        Execution of the action.
+        :name parser: The argument parser in use.
+        :name namespace: The namespace for parsed args.
+        :name values: The path of the socket.
+        :name option_string: Option string.
+        '''
+        if not values:
+            parser.error('the socket path is empty')
+
+        try:
+            server.serve(socket_path=values)
+        except (OSError, ValueError) as err:
+            parser.error(str(err))
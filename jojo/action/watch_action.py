@@ -0,0 +1,172 @@
+import argparse
+import logging
+import os
+import threading
+import typing
+
+import action
+from action import build_action
+import builder
+import config
+import default
+import graph
+import util
+import watcher
+
+LOGGER = logging.getLogger(__name__)
+
+
+class BuildRun(threading.Thread):
+    '''
+    Builds images in the background, until done or cancelled.
+    '''
+
+    def __init__(
+            self,
+            namespace: argparse.Namespace,
+            image_names: typing.Set[str]):
+        '''
+        :param namespace: The namespace for parsed args.
+        :param image_names: The names of the images to build.
+        '''
+        super().__init__(name='jojo-watch-build', daemon=True)
+        self.namespace = namespace
+        self.image_names = set(image_names)
+        self.failed: typing.Dict[str, BaseException] = {}
+        self.cancelled = threading.Event()
+
+    def run(self):
+        try:
+            self.failed = build_action.build_images(
+                self.namespace,
+                sorted(self.image_names),
+                cancelled=self.cancelled)
+        except Exception as err:
+            # e.g. an invalid buildfile, the next change may fix it
+            LOGGER.error('Unable to build %s: %s',
+                         ', '.join(sorted(self.image_names)), err)
+            self.failed = {name: err for name in self.image_names}
+
+    def cancel(self):
+        '''
+        Cancels the build and waits for its end, the builder commands
+        running are killed.
+        '''
+        self.cancelled.set()
+        while self.is_alive():
+            # again, an image may have started a command meanwhile, the
+            # commands running are all those of this build
+            builder.cancel_calls()
+            self.join(0.1)
+
+
+class WatchAction(action.JojoAction):
+    '''
+    Builds the images again when their files change.
+    '''
+
+    @staticmethod
+    def _get_affected(
+            namespace: argparse.Namespace,
+            image_names: typing.List[str],
+            changed: typing.Set[str]) -> typing.Set[str]:
+        '''
+        Returns the changed images and the images built from them.
+        '''
+        build_configs = {}
+        for image_name in image_names:
+            # the images of invalid buildfiles have no known dependencies
+            build_config = config.load_valid_build_config(
+                os.path.join(namespace.path, image_name,
+                             default.Config.BUILDFILE_NAME.value),
+                image_name=image_name,
+                cache_dir=namespace.cache_dir)
+            if build_config is not None:
+                build_configs[image_name] = build_config
+
+        return graph.get_dependents(
+            graph.get_dependencies(build_configs),
+            changed)
+
+    def run(
+            self,
+            parser: argparse.ArgumentParser,
+            namespace: argparse.Namespace,
+            values: typing.List[str],
+            option_string: typing.Optional[str]):
+        '''
+        Execution of the action.
+        :name parser: The argument parser in use.
+        :name namespace: The namespace for parsed args.
+        :name values: The images to watch, all by default.
+        :name option_string: Option string.
+        '''
+        if not namespace.path:
+            parser.error('the images directory is required, see --path')
+
+        def get_image_names() -> typing.List[str]:
+            image_names = util.get_image_names(namespace.path)
+            if values:
+                image_names = [n for n in image_names if n in values]
+            return image_names
+
+        try:
+            tree_watcher = watcher.get_watcher(
+                namespace.path,
+                poll=namespace.poll,
+                interval=namespace.poll_interval)
+        except (OSError, ValueError) as err:
+            parser.error(str(err))
+
+        # build first what changed while jojo was not watching
+        pending = set(get_image_names())
+        running: typing.Optional[BuildRun] = None
+        LOGGER.info('Watching %s', tree_watcher.path)
+
+        try:
+            while True:
+                # wake up regularly while building, to start what waits
+                paths = tree_watcher.wait(
+                    debounce=namespace.debounce,
+                    timeout=namespace.debounce if running or pending
+                    else None)
+
+                if running and not running.is_alive():
+                    if running.failed:
+                        LOGGER.error('Failed builds: %s',
+                                     ', '.join(sorted(running.failed)))
+                    else:
+                        LOGGER.info('Built %s',
+                                    ', '.join(sorted(running.image_names)))
+                    running = None
+
+                image_names = get_image_names()
+                changed = tree_watcher.get_image_names(paths) & \
+                    set(image_names)
+                if changed:
+                    affected = self._get_affected(
+                        namespace, image_names, changed)
+                    LOGGER.info('Changed: %s', ', '.join(sorted(changed)))
+
+                    if running and affected & running.image_names:
+                        LOGGER.info('Cancelling the build of %s',
+                                    ', '.join(sorted(running.image_names)))
+                        running.cancel()
+                        # the images already built are skipped as unchanged
+                        pending |= running.image_names
+                        running = None
+                    pending |= affected
+
+                if pending and running is None:
+                    # images removed meanwhile are dropped
+                    pending &= set(image_names)
+                    if pending:
+                        running = BuildRun(namespace, pending)
+                        running.start()
+                    pending = set()
+        except KeyboardInterrupt:
+            LOGGER.info('Stopping')
+            if running:
+                running.cancel()
+        finally:
+            tree_watcher.close()
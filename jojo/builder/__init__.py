@@ -1,7 +1,19 @@
 import abc
 import argparse
+import concurrent.futures
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import threading
+import typing
 
 import config
+import default
+import util
+
+LOGGER = logging.getLogger(__name__)
 
 
 class Builder(abc.ABC):
@@ -25,6 +37,35 @@ class Builder(abc.ABC):
         pass
 
 
+def check_call(
+        command: typing.List[str],
+        image: str,
+        cwd: typing.Optional[str] = None):
+    '''
+    Runs a builder command with the process-wide executor, its output
+    being prefixed with the image.
+    :param command: The command and its arguments.
+    :param image: The image the command is run for.
+    :param cwd: The working directory of the command.
+    :raises: subprocess.CalledProcessError
+    '''
+    from builder import executor
+
+    executor.get_executor().check_call(command, prefix=image, cwd=cwd)
+
+
+def cancel_calls(image: typing.Optional[str] = None) -> int:
+    '''
+    Cancels running builder commands, their processes are killed.
+    :param image: The image the commands are run for, all the commands
+                  when None.
+    :returns: The number of commands cancelled.
+    '''
+    from builder import executor
+
+    return executor.get_executor().cancel(image)
+
+
 def get_build_args(build_config: config.ImageBuildConfig):
     args = []
 
@@ -44,6 +85,177 @@ def get_build_args(build_config: config.ImageBuildConfig):
     return args
 
 
+def get_platforms(
+        namespace: argparse.Namespace,
+        build_config: config.ImageBuildConfig) -> typing.List[str]:
+    '''
+    Returns the platforms to build for, the CLI overriding the buildfile.
+    No platform means the platform of the builder.
+    :param namespace: Namespace passed in via CLI.
+    :param build_config: the image build configuration.
+    '''
+    platforms = getattr(namespace, 'platform', None)
+    if platforms:
+        return [p for arg in platforms for p in arg.split(',') if p]
+    return list(build_config.platforms or [])
+
+
+def get_build_cache(
+        namespace: argparse.Namespace,
+        build_config: config.ImageBuildConfig
+        ) -> typing.Optional[config.BuildCache]:
+    '''
+    Returns the layer cache of a build, the CLI overriding the buildfile.
+    :param namespace: Namespace passed in via CLI.
+    :param build_config: the image build configuration.
+    '''
+    build_cache = build_config.cache
+    cache_type = getattr(namespace, 'build_cache_type', None)
+    cache_ref = getattr(namespace, 'build_cache_ref', None)
+
+    if cache_ref:
+        build_cache = config.BuildCache(
+            ref=cache_ref,
+            type=build_cache.type if build_cache else config.CacheType.LOCAL)
+    if build_cache and cache_type:
+        build_cache = dataclasses.replace(
+            build_cache,
+            type=config.CacheType(cache_type))
+
+    return build_cache
+
+
+def get_build_digest(
+        namespace: argparse.Namespace,
+        image: str,
+        build_config: config.ImageBuildConfig,
+        base_digests: typing.Optional[typing.List[str]] = None) -> str:
+    '''
+    Returns a digest of everything a build depends on: the builder, the
+    build context, the build args, the version and the image names.
+    :param namespace: Namespace passed in via CLI.
+    :param image: The image to build.
+    :param build_config: the image build configuration.
+    :param base_digests: The digests of the base images built by jojo,
+                         so that rebuilding them rebuilds this image.
+    '''
+    tag_build = build_config.get_tag_build()
+    inputs = {
+        'builder': namespace.builder,
+        'context': util.hash_context(
+            util.get_image_dir(namespace.path, image),
+            cache_dir=namespace.cache_dir,
+            dry_run=namespace.dry_run),
+        'build_args': get_build_args(build_config),
+        'version': tag_build.version if tag_build else None,
+        'image': build_config.image.full_name,
+        'base_images': [i.full_name for i in build_config.get_base_images()],
+        'base_digests': base_digests or [],
+        'platforms': get_platforms(namespace, build_config),
+        'tag_latest': namespace.tag_latest,
+    }
+    return hashlib.sha256(
+        json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+
+def has_registry_tag(image: str) -> bool:
+    '''
+    Returns whether the tag of an image already exists in its registry.
+    :param image: The full name of the image.
+    '''
+    import registry
+
+    return registry.get_registry().has_tag(image)
+
+
+def add_registry_tags(image: str, tags: typing.List[str]) -> typing.List[str]:
+    '''
+    Adds tags to a pushed image directly in its registry, concurrently,
+    which costs a manifest upload per tag instead of a push.
+    :param image: The full name of the pushed image.
+    :param tags: The tags to add.
+    :returns: The tags that could not be added, to push with the builder.
+    '''
+    if not tags:
+        return []
+
+    import registry
+
+    client = registry.get_registry()
+    if len(tags) == 1:
+        # usually only latest, not worth a thread
+        added = [client.add_tag(image, tags[0])]
+    else:
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=len(tags),
+                thread_name_prefix='jojo-tag') as executor:
+            added = list(executor.map(
+                lambda tag: client.add_tag(image, tag), tags))
+    return [tag for tag, ok in zip(tags, added) if not ok]
+
+
+class BuildState:
+    '''
+    Digests of the last successful build of each image directory,
+    persisted in a JSON file.
+    '''
+
+    def __init__(self, path: str):
+        '''
+        :param path: The path of the state file.
+        '''
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as fobj:
+                return json.load(fobj)
+        except (OSError, ValueError):
+            return {}
+
+    def is_built(self, image_dir: str, digest: str, push: bool) -> bool:
+        '''
+        Returns whether the image was already built from the same inputs,
+        and pushed when a push is requested.
+        :param image_dir: The image directory.
+        :param digest: The digest of the build inputs.
+        :param push: Whether the image must have been pushed.
+        '''
+        with self._lock:
+            entry = self._load().get(os.path.abspath(image_dir))
+        if not entry or entry.get('digest') != digest:
+            return False
+        return entry.get('pushed', False) or not push
+
+    def set_built(self, image_dir: str, digest: str, pushed: bool):
+        '''
+        Records a successful build.
+        :param image_dir: The image directory.
+        :param digest: The digest of the build inputs.
+        :param pushed: Whether the image was pushed.
+        '''
+        with self._lock:
+            # reload so that concurrent jojo processes lose less updates
+            state = self._load()
+            state[os.path.abspath(image_dir)] = {
+                'digest': digest,
+                'pushed': pushed,
+            }
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            util.write_atomic(self.path, json.dumps(state, indent=2))
+
+
+def get_build_state(namespace: argparse.Namespace) -> BuildState:
+    '''
+    Returns the build state stored in the cache directory.
+    :param namespace: Namespace passed in via CLI.
+    '''
+    return BuildState(os.path.join(
+        namespace.cache_dir,
+        default.Builder.STATE_FILENAME.value))
+
+
 # def get_build_args(build_config: config.ImageBuildConfig):
 #     build_config_dict = build_config.to_dict()
 #     args = []
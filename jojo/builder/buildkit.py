@@ -1,7 +1,6 @@
 import argparse
 # import copy
 import logging
-import subprocess
 
 import builder
 import config
@@ -37,6 +36,27 @@ class Buildkit(builder.Builder):
 
         return command
 
+    def _add_cache_args(
+            self,
+            command: util.Command,
+            build_cache: config.BuildCache,
+            cache_ref: str):
+        '''
+        Adds the export and import of the layer cache to the command.
+        '''
+        if build_cache.type == config.CacheType.LOCAL:
+            export_cache = f'type=local,dest={cache_ref}'
+            import_cache = f'type=local,src={cache_ref}'
+        else:
+            export_cache = f'type=registry,ref={cache_ref}'
+            import_cache = f'type=registry,ref={cache_ref}'
+
+        if build_cache.mode:
+            export_cache += f',mode={build_cache.mode}'
+
+        command.add_args(name='--export-cache', value=export_cache)
+        command.add_args(name='--import-cache', value=import_cache)
+
     def build(
             self,
             namespace: argparse.Namespace,
@@ -50,6 +70,7 @@ class Buildkit(builder.Builder):
         '''
         LOGGER.info('Build image')
 
+        image_name = image
         image_dir = util.get_image_dir(namespace.path, image)
         image = build_config.image.full_name
         build_args = builder.get_build_args(build_config)
@@ -63,6 +84,12 @@ class Buildkit(builder.Builder):
             action='build',
             build_args=build_args)
 
+        platforms = builder.get_platforms(namespace, build_config)
+        if platforms:
+            command.add_args(
+                name='--opt',
+                value=f'platform={",".join(platforms)}')
+
         image_names_output = [image]
 
         image_tag = build_config.image.tag
@@ -76,11 +103,18 @@ class Buildkit(builder.Builder):
             name='--output',
             value=f'type=image,{names_output},push={namespace.push}')
 
+        build_cache = builder.get_build_cache(namespace, build_config)
+        if build_cache:
+            self._add_cache_args(
+                command=command,
+                build_cache=build_cache,
+                cache_ref=build_cache.get_ref(
+                    namespace.cache_dir, image_name))
+
         LOGGER.info('Image name: %s', image)
         LOGGER.info('Command: %s', ' '.join(command))
 
         if namespace.dry_run:
             return
 
-        with util.pushd(image_dir):
-            subprocess.check_call(command)
+        builder.check_call(command, image, cwd=image_dir)
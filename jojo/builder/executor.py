@@ -0,0 +1,204 @@
+import asyncio
+import collections
+import concurrent.futures
+import logging
+import subprocess
+import sys
+import threading
+import typing
+
+import default
+import tracing
+
+LOGGER = logging.getLogger(__name__)
+
+# longest line read from a command, progress bars can be long
+LINE_LIMIT = 1024 * 1024
+
+
+class CommandError(subprocess.CalledProcessError):
+    '''
+    Raised when a command fails, with the last lines of its output.
+    '''
+
+    def __str__(self) -> str:
+        message = super().__str__()
+        if self.output:
+            message += '\nLast lines of output:\n' + self.output
+        return message
+
+
+class Executor:
+    '''
+    Runs commands as asyncio subprocesses on an event loop running in its
+    own thread, so several builds run at once from any thread.
+    The output of the commands is written line by line, prefixed with the
+    image name, and only its last lines are kept for failure reports.
+    '''
+
+    def __init__(
+            self,
+            tail_lines: int = default.Builder.TAIL_LINES.value,
+            stdout: typing.Optional[typing.TextIO] = None,
+            stderr: typing.Optional[typing.TextIO] = None):
+        '''
+        :param tail_lines: Lines of output kept per command.
+        :param stdout: Where the standard output of commands is written,
+                       sys.stdout at the time of writing by default.
+        :param stderr: Where the error output of commands is written,
+                       sys.stderr at the time of writing by default.
+        '''
+        self.tail_lines = int(tail_lines)
+        self.stdout = stdout
+        self.stderr = stderr
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._loop: typing.Optional[asyncio.AbstractEventLoop] = None
+        # running commands by prefix, to cancel those of an image
+        self._running: typing.Dict[
+            str, typing.Set[concurrent.futures.Future]] = {}
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=self._loop.run_forever,
+                    name='jojo-executor',
+                    daemon=True).start()
+            return self._loop
+
+    def _write(
+            self,
+            stream: typing.Optional[typing.TextIO],
+            default_stream: str,
+            prefix: str,
+            line: str):
+        stream = stream or getattr(sys, default_stream)
+        with self._write_lock:
+            stream.write(f'{prefix} | {line}\n' if prefix else f'{line}\n')
+            stream.flush()
+
+    async def _forward(
+            self,
+            reader: asyncio.StreamReader,
+            stream: typing.Optional[typing.TextIO],
+            default_stream: str,
+            prefix: str,
+            tail: collections.deque):
+        '''
+        Writes the lines of a pipe as they come and keeps the last ones.
+        '''
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            line = line.decode(errors='replace').rstrip('\r\n')
+            tail.append(line)
+            self._write(stream, default_stream, prefix, line)
+
+    async def _run(
+            self,
+            command: typing.List[str],
+            prefix: str,
+            cwd: typing.Optional[str]):
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            cwd=cwd,
+            stdin=subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            limit=LINE_LIMIT)
+
+        # bounded, so memory does not grow with the output of the build
+        tail: collections.deque = collections.deque(maxlen=self.tail_lines)
+        try:
+            await asyncio.gather(
+                self._forward(
+                    process.stdout, self.stdout, 'stdout', prefix, tail),
+                self._forward(
+                    process.stderr, self.stderr, 'stderr', prefix, tail))
+            returncode = await process.wait()
+        except BaseException:
+            # cancelled, or reading its output failed: it must not be left
+            # running
+            if process.returncode is None:
+                try:
+                    process.kill()
+                except ProcessLookupError:
+                    pass
+                await process.wait()
+            raise
+
+        if returncode != 0:
+            LOGGER.debug('%s exited with %d', command[0], returncode)
+            raise CommandError(
+                returncode,
+                command,
+                output='\n'.join(tail))
+
+    def check_call(
+            self,
+            command: typing.List[str],
+            prefix: str = '',
+            cwd: typing.Optional[str] = None):
+        '''
+        Runs a command and waits for its completion.
+        :param command: The command and its arguments.
+        :param prefix: Prefix of the output lines, e.g. the image name.
+        :param cwd: The working directory of the command.
+        :raises: CommandError
+        :raises: concurrent.futures.CancelledError
+        '''
+        with tracing.span(
+                ' '.join(command[:2]),
+                'subprocess',
+                command=' '.join(command)):
+            future = asyncio.run_coroutine_threadsafe(
+                self._run(list(command), prefix, cwd),
+                self._get_loop())
+            with self._lock:
+                self._running.setdefault(prefix, set()).add(future)
+            try:
+                return future.result()
+            except BaseException:
+                # e.g. KeyboardInterrupt, do not leave the command running
+                future.cancel()
+                raise
+            finally:
+                with self._lock:
+                    self._running[prefix].discard(future)
+                    if not self._running[prefix]:
+                        del self._running[prefix]
+
+    def cancel(self, prefix: typing.Optional[str] = None) -> int:
+        '''
+        Cancels running commands, their processes are killed and
+        check_call raises concurrent.futures.CancelledError.
+        :param prefix: The prefix of the commands to cancel, e.g. the
+                       image name, all the commands when None.
+        :returns: The number of commands cancelled.
+        '''
+        with self._lock:
+            futures = [
+                future
+                for key, running in self._running.items()
+                if prefix is None or key == prefix
+                for future in running
+            ]
+        return sum(future.cancel() for future in futures)
+
+
+_EXECUTOR: typing.Optional[Executor] = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def get_executor() -> Executor:
+    '''
+    Returns the process-wide executor.
+    '''
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = Executor()
+        return _EXECUTOR
@@ -1,6 +1,7 @@
 import argparse
 import logging
 import subprocess
+import typing
 
 import builder
 import config
@@ -28,18 +29,34 @@ class Podman(builder.Builder):
         LOGGER.info('Build image')
         LOGGER.info('Dry Run: %s', namespace.dry_run)
 
+        image_name = image
         image_dir = util.get_image_dir(namespace.path, image)
         image = build_config.image.full_name
         build_args = builder.get_build_args(build_config)
 
-        command = util.Command(['podman', 'build', '-t'])
-        command.add_arg(image)
+        platforms = builder.get_platforms(namespace, build_config)
+        if platforms:
+            # one manifest list holding an image per platform
+            command = util.Command(['podman', 'build', '--manifest'])
+            command.add_arg(image)
+            command.add_args('--platform', ','.join(platforms))
+        else:
+            command = util.Command(['podman', 'build', '-t'])
+            command.add_arg(image)
         command.add_args_list('--build-arg', build_args)
 
         version = build_config.image.tag_build.version
         if version:
             command.add_args('--build-arg', f'VERSION={version}')
 
+        build_cache = builder.get_build_cache(namespace, build_config)
+        if build_cache:
+            self._add_cache_args(
+                command=command,
+                build_cache=build_cache,
+                cache_ref=build_cache.get_ref(
+                    namespace.cache_dir, image_name))
+
         # add build context
         command.add_arg('.')
 
@@ -50,8 +67,9 @@ class Podman(builder.Builder):
             return
 
         # build
-        with util.pushd(image_dir):
-            subprocess.check_call(command)
+        if platforms:
+            self._remove_manifest(image)
+        builder.check_call(command, image, cwd=image_dir)
 
         image_tag = build_config.image.tag
         if namespace.tag_latest and image_tag != 'latest':
@@ -60,11 +78,36 @@ class Podman(builder.Builder):
         if namespace.push:
             self.push(
                 namespace=namespace,
-                image=image)
+                image=image,
+                platforms=platforms)
 
-    def push(self, namespace: argparse.Namespace, image: str):
+    def _add_cache_args(
+            self,
+            command: util.Command,
+            build_cache: config.BuildCache,
+            cache_ref: str):
+        '''
+        Adds the layer cache to the command. podman keeps layers in its local
+        storage, only registry caches can be shared across hosts.
+        '''
+        command.add_arg('--layers')
+
+        if build_cache.type == config.CacheType.REGISTRY:
+            command.add_args('--cache-from', cache_ref)
+            command.add_args('--cache-to', cache_ref)
+        else:
+            LOGGER.warning('podman only supports registry caches, '
+                           'using its local storage')
+
+    def push(
+            self,
+            namespace: argparse.Namespace,
+            image: str,
+            platforms: typing.Optional[typing.List[str]] = None):
         '''
         :param image: The image to tag.
+        :param platforms: The platforms of the image, it is then pushed
+                          as a manifest list.
         :raises: subprocess.CalledProcessError
         '''
         LOGGER.info('Push image')
@@ -72,18 +115,42 @@ class Podman(builder.Builder):
         LOGGER.info('Image to push: %s', image)
 
         command = util.Command(['podman', 'push', image])
+        if platforms:
+            command = util.Command(
+                ['podman', 'manifest', 'push', '--all', image])
+            command.add_arg(f'docker://{image}')
         LOGGER.info('Command: %s', ' '.join(command))
 
         if namespace.dry_run:
             return
 
-        subprocess.check_call(command)
+        builder.check_call(command, image)
 
-        if namespace.tag_latest:
+        _, image_tag = image.rsplit(':', 1)
+        if namespace.tag_latest and image_tag != 'latest':
             self.tag_latest(image)
-            command[-1] = util.set_image_tag_latest(image=image)
-            LOGGER.info('Command: %s', ' '.join(command))
-            subprocess.check_call(command)
+            # the image is in the registry, only its manifest is needed
+            # for the new tag, push it with the builder as a fallback
+            if builder.add_registry_tags(image, ['latest']):
+                image_latest = util.set_image_tag_latest(image=image)
+                command[-1] = image_latest
+                if platforms:
+                    command[-1] = f'docker://{image_latest}'
+                LOGGER.info('Command: %s', ' '.join(command))
+                builder.check_call(command, image)
+
+    def _remove_manifest(self, image: str):
+        '''
+        Removes the manifest list of a previous build, as building adds
+        the images to an existing list.
+        :param image: The name of the manifest list.
+        '''
+        command = util.Command(['podman', 'manifest', 'rm', image])
+        LOGGER.info('Command: %s', ' '.join(command))
+        subprocess.call(
+            command,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL)
 
     def tag_latest(self, image: str):
         '''
@@ -109,4 +176,4 @@ class Podman(builder.Builder):
         LOGGER.info('Image to tag: %s', image)
         LOGGER.info('Additional tag: %s', new_image)
         LOGGER.info('Command: %s', ' '.join(command))
-        subprocess.check_call(command)
+        builder.check_call(command, image)
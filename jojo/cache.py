@@ -0,0 +1,265 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import typing
+
+import default
+import util
+
+LOGGER = logging.getLogger(__name__)
+
+READ_SIZE = 64 * 1024
+
+
+class HttpCache:
+    '''
+    On-disk cache of HTTP responses, revalidated with conditional requests.
+    '''
+
+    def __init__(self, directory: str, ttl: int):
+        '''
+        :param directory: The directory where responses are stored.
+        :param ttl: Seconds during which a stored response is used
+                    without contacting the server.
+        '''
+        self.directory = os.path.join(directory, 'http')
+        self.ttl = int(ttl)
+        self._lock = threading.Lock()
+        self._locks: typing.Dict[str, threading.Lock] = {}
+
+    def _paths(self, url: str) -> typing.Tuple[str, str]:
+        key = hashlib.sha256(url.encode()).hexdigest()
+        path = os.path.join(self.directory, key)
+        return path, path + '.json'
+
+    def _read(self, url: str) -> typing.Tuple[typing.Optional[bytes], dict]:
+        data_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as fobj:
+                meta = json.load(fobj)
+            with open(data_path, 'rb') as fobj:
+                data = fobj.read()
+        except (OSError, ValueError):
+            return None, {}
+
+        if meta.get('url') != url:
+            return None, {}
+        return data, meta
+
+    def _write(self, url: str, data: typing.Optional[bytes], meta: dict):
+        data_path, meta_path = self._paths(url)
+        os.makedirs(self.directory, exist_ok=True)
+        if data is not None:
+            util.write_atomic(data_path, data)
+        util.write_atomic(meta_path, json.dumps(meta))
+
+    def discard(self, url: str):
+        '''
+        Removes the stored response of a url, e.g. found unusable.
+        :param url: The url of the response.
+        '''
+        with self._url_lock(url):
+            for path in self._paths(url):
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+
+    def _url_lock(self, url: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(url, threading.Lock())
+
+    def fetch(self, url: str, timeout: typing.Optional[float] = None) -> bytes:
+        '''
+        Returns the body of a GET request on the url.
+        A stored response younger than the TTL is returned as is, an older
+        one is revalidated with If-None-Match/If-Modified-Since.
+        :param url: The url to fetch.
+        :param timeout: Timeout of the request, in seconds, for each socket
+                        operation and for the whole request, so that a
+                        server sending the body slowly is given up too.
+        :raises: urllib.error.URLError
+        :raises: TimeoutError
+        :raises: http.client.IncompleteRead
+        '''
+        import urllib.error
+        import urllib.request
+
+        with self._url_lock(url):
+            data, meta = self._read(url)
+            now = time.time()
+
+            if data is not None and now - meta.get('fetched_at', 0) < self.ttl:
+                LOGGER.debug('Cache hit: %s', url)
+                return data
+
+            request = urllib.request.Request(url)
+            if data is not None:
+                if meta.get('etag'):
+                    request.add_header('If-None-Match', meta['etag'])
+                if meta.get('last_modified'):
+                    request.add_header(
+                        'If-Modified-Since', meta['last_modified'])
+
+            deadline = None
+            if timeout is not None:
+                deadline = time.monotonic() + timeout
+            try:
+                with urllib.request.urlopen(request, timeout=timeout) as resp:
+                    LOGGER.debug('Cache miss: %s', url)
+                    body = _read(resp, deadline)
+                    headers = resp.headers
+            except urllib.error.HTTPError as err:
+                if err.code != 304 or data is None:
+                    raise
+                LOGGER.debug('Cache revalidated: %s', url)
+                meta['fetched_at'] = now
+                self._write(url, None, meta)
+                return data
+
+            self._write(url, body, {
+                'url': url,
+                'etag': headers.get('ETag'),
+                'last_modified': headers.get('Last-Modified'),
+                'fetched_at': now,
+            })
+            return body
+
+
+def _read(
+        response: typing.Any,
+        deadline: typing.Optional[float]) -> bytes:
+    '''
+    Returns the whole body of a response, read before the deadline.
+    :raises: TimeoutError
+    :raises: http.client.IncompleteRead
+    '''
+    import http.client
+
+    chunks = []
+    while True:
+        if deadline is not None and time.monotonic() >= deadline:
+            raise TimeoutError('the response took too long to read')
+        # read1 returns what arrived, instead of waiting for a full chunk
+        chunk = response.read1(READ_SIZE)
+        if not chunk:
+            break
+        chunks.append(chunk)
+
+    body = b''.join(chunks)
+    # read1 does not check that the server sent the whole body
+    length = response.headers.get('Content-Length')
+    if length is not None and length.isdigit() and len(body) < int(length):
+        raise http.client.IncompleteRead(body, int(length) - len(body))
+    return body
+
+
+class JsonCache:
+    '''
+    On-disk cache of JSON values with a TTL.
+    '''
+
+    def __init__(self, directory: str, ttl: int):
+        '''
+        :param directory: The directory where values are stored.
+        :param ttl: Seconds during which a stored value is returned.
+        '''
+        self.directory = os.path.join(directory, 'json')
+        self.ttl = int(ttl)
+
+    def _path(self, namespace: str, key: str) -> str:
+        digest = hashlib.sha256(f'{namespace}:{key}'.encode()).hexdigest()
+        return os.path.join(self.directory, namespace, digest + '.json')
+
+    def get(self, namespace: str, key: str) -> typing.Any:
+        '''
+        Returns a stored value, None if missing or older than the TTL.
+        :param namespace: The kind of value, e.g. github.
+        :param key: The key of the value.
+        '''
+        try:
+            with open(self._path(namespace, key), 'r',
+                      encoding='utf-8') as fobj:
+                entry = json.load(fobj)
+        except (OSError, ValueError):
+            return None
+
+        if entry.get('key') != key:
+            return None
+        if time.time() - entry.get('stored_at', 0) >= self.ttl:
+            return None
+        LOGGER.debug('Cache hit: %s %s', namespace, key)
+        return entry.get('value')
+
+    def set(self, namespace: str, key: str, value: typing.Any):
+        '''
+        Stores a value.
+        :param namespace: The kind of value, e.g. github.
+        :param key: The key of the value.
+        :param value: The value, must be serializable to JSON.
+        '''
+        path = self._path(namespace, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        util.write_atomic(path, json.dumps({
+            'key': key,
+            'stored_at': time.time(),
+            'value': value,
+        }))
+
+
+_HTTP_CACHE: typing.Optional[HttpCache] = None
+_JSON_CACHE: typing.Optional[JsonCache] = None
+
+
+def configure(
+        directory: typing.Optional[str] = None,
+        ttl: typing.Optional[int] = None):
+    '''
+    Configures the process-wide caches.
+    :param directory: The cache directory.
+    :param ttl: Seconds during which cached data is used as is.
+    '''
+    global _HTTP_CACHE, _JSON_CACHE
+    directory = directory or get_directory()
+    ttl = get_ttl() if ttl is None else ttl
+    _HTTP_CACHE = HttpCache(directory=directory, ttl=ttl)
+    _JSON_CACHE = JsonCache(directory=directory, ttl=ttl)
+
+
+def get_directory() -> str:
+    '''
+    Returns the cache directory from the environment or the default.
+    '''
+    return os.environ.get(
+        default.EnvVar.CACHE_DIR.value,
+        default.Cache.DIR.value)
+
+
+def get_ttl() -> int:
+    '''
+    Returns the cache TTL from the environment or the default.
+    '''
+    return int(os.environ.get(
+        default.EnvVar.CACHE_TTL.value,
+        default.Cache.TTL.value))
+
+
+def get_http_cache() -> HttpCache:
+    '''
+    Returns the process-wide HTTP cache.
+    '''
+    if _HTTP_CACHE is None:
+        configure()
+    return _HTTP_CACHE
+
+
+def get_json_cache() -> JsonCache:
+    '''
+    Returns the process-wide JSON cache.
+    '''
+    if _JSON_CACHE is None:
+        configure()
+    return _JSON_CACHE
@@ -1,21 +1,23 @@
 #!/usr/bin/env python3
 
 import argparse
-from distutils.util import strtobool
 import logging
 import os
 import platform
 import subprocess
+import sys
 
+import action
 import default
-from action.new_project_action import NewProjectAction
-from action.find_version_action import FindVersionAction
-from action.list_version_action import ListVersionAction
-from action.build_action import BuildAction
-from action.push_action import PushAction
+import util
 
+# Every command starts here: the modules slow to import (jinja2, requests,
+# yaml, dacite, asyncio, urllib...) are imported by the functions that use
+# them, not at the top of the modules, so that commands only pay for what
+# they use. tests/test_import_time.py checks it.
 
-def parse_args():
+
+def parse_args(argv=None):
     parser = argparse.ArgumentParser()
 
     # Verify that we are being executed with Python 3+
@@ -41,11 +43,31 @@ def parse_args():
         help='Path to the container images directory')
     parent_parser.add_argument(
         '--dry-run',
-        default=bool(strtobool(os.environ.get(
+        default=util.strtobool(os.environ.get(
             default.EnvVar.DRY_RUN.value,
-            default.Config.DRY_RUN.value))),
+            default.Config.DRY_RUN.value)),
         action='store_true',
         help='Do not write any files or execute commands')
+    parent_parser.add_argument(
+        '--cache-dir',
+        default=os.environ.get(
+            default.EnvVar.CACHE_DIR.value,
+            default.Cache.DIR.value),
+        help='Directory where downloaded data is cached')
+    parent_parser.add_argument(
+        '--cache-ttl',
+        type=int,
+        default=os.environ.get(
+            default.EnvVar.CACHE_TTL.value,
+            default.Cache.TTL.value),
+        help='Seconds during which cached data is used without '
+             'revalidation')
+    parent_parser.add_argument(
+        '--trace',
+        metavar='FILE',
+        default=os.environ.get(default.EnvVar.TRACE.value),
+        help='Write the duration of each phase to FILE, in the Chrome '
+             'trace event format')
     parent_parser.add_argument(
         '--builder',
         default=os.environ.get(
@@ -53,6 +75,71 @@ def parse_args():
             default.Builder.NAME.value),
         choices=['buildah', 'buildkit', 'podman'])
 
+    # Parent parser used by the commands handling several images
+    images_parser = argparse.ArgumentParser(add_help=False)
+    images_parser.add_argument(
+        '--all',
+        default=False,
+        action='store_true',
+        help='Use all the images of the images directory')
+    images_parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=os.environ.get(
+            default.EnvVar.JOBS.value,
+            default.Config.JOBS.value),
+        help='Number of images to process concurrently')
+
+    # Parent parser used by the commands publishing images
+    registry_parser = argparse.ArgumentParser(add_help=False)
+    registry_parser.add_argument(
+        '--check-registry',
+        default=util.strtobool(os.environ.get(
+            default.EnvVar.CHECK_REGISTRY.value,
+            default.CHECK_REGISTRY)),
+        action='store_true',
+        help='Skip images whose tag already exists in the registry')
+    registry_parser.add_argument(
+        '--rebuild',
+        default=False,
+        action='store_true',
+        help='Build and push even if the tag exists in the registry')
+
+    # Parent parser used by the commands building images
+    build_parser = argparse.ArgumentParser(add_help=False)
+    build_parser.add_argument(
+        '--addr',
+        help='Address to connect to')
+    build_parser.add_argument(
+        '--push',
+        default=False,
+        action='store_true',
+        help='Push the image after the build')
+    build_parser.add_argument(
+        '--build-cache-type',
+        choices=['local', 'registry'],
+        help='Type of the layer cache, overrides the buildfile')
+    build_parser.add_argument(
+        '--build-cache-ref',
+        help='Directory or image reference of the layer cache, '
+             '{image} is replaced by the image name, relative directories '
+             'are in the layers directory of --cache-dir')
+    build_parser.add_argument(
+        '--platform',
+        action='append',
+        help='Platform to build for, e.g. linux/arm64, repeat or separate '
+             'with commas for several, overrides the buildfile')
+    build_parser.add_argument(
+        '--force',
+        default=False,
+        action='store_true',
+        help='Build even if nothing changed since the last build')
+    build_parser.add_argument(
+        '--tag-latest',
+        default=default.Config.TAG_LATEST.value,
+        action='store_true',
+        help='Tag built image as latest')
+
     subparsers = parser.add_subparsers(
         title='commands', description='commands')
 
@@ -95,73 +182,197 @@ def parse_args():
         choices=['alpine', 'github'],
         help='Select the source of the package')
     new_project.add_argument(
-        'image', action=NewProjectAction)
+        'image',
+        action=action.lazy('new_project_action', 'NewProjectAction'))
 
     # listver command
     list_version = subparsers.add_parser(
         'listver', help='List the available version of a package',
-        parents=[parent_parser])
+        parents=[parent_parser, images_parser])
     list_version.add_argument(
         '--first-versions',
         default=default.Config.FIRST_VERSIONS_LIST.value,
         help='Release versions to query, from new to old')
     list_version.add_argument(
-        'image', action=ListVersionAction)
+        'image',
+        nargs='*',
+        action=action.lazy('list_version_action', 'ListVersionAction'))
 
     # findver command
     find_version = subparsers.add_parser(
         'findver', help='Find the latest version of a package',
-        parents=[parent_parser])
+        parents=[parent_parser, images_parser])
     find_version.add_argument(
         '--first-versions',
         default=default.Config.FIRST_VERSIONS_FIND.value,
         help='Release versions to query, from new to old')
     find_version.add_argument(
-        'image', action=FindVersionAction)
+        'image',
+        nargs='*',
+        action=action.lazy('find_version_action', 'FindVersionAction'))
 
     # build command
     build = subparsers.add_parser(
         'build', help='Build a container image',
-        parents=[parent_parser])
-    build.add_argument(
-        '--addr',
-        help='Address to connect to')
+        parents=[parent_parser, images_parser, registry_parser,
+                 build_parser])
     build.add_argument(
-        '--push',
-        default=False,
-        action='store_true',
-        help='Push the image after the build')
-    build.add_argument(
-        '--tag-latest',
-        default=default.Config.TAG_LATEST.value,
-        action='store_true',
-        help='Tag built image as latest')
-    build.add_argument(
-        'image', action=BuildAction)
+        'image',
+        nargs='*',
+        action=action.lazy('build_action', 'BuildAction'))
 
     # push command
     push = subparsers.add_parser(
         'push', help='Push a container image',
-        parents=[parent_parser])
+        parents=[parent_parser, registry_parser])
+    push.add_argument(
+        '--platform',
+        action='append',
+        help='Platform of the image, several push a manifest list, '
+             'overrides the buildfile')
     push.add_argument(
         '--tag-latest',
         default=default.Config.TAG_LATEST.value,
         action='store_true',
         help='Tag image as latest before pushing')
     push.add_argument(
-        'image', action=PushAction)
+        'image',
+        action=action.lazy('push_action', 'PushAction'))
 
-    parser.parse_args()
+    # watch command
+    watch = subparsers.add_parser(
+        'watch', help='Build the images again when their files change',
+        parents=[parent_parser, images_parser, registry_parser,
+                 build_parser])
+    watch.add_argument(
+        '--debounce',
+        type=float,
+        default=default.Watch.DEBOUNCE.value,
+        help='Seconds without change before building, so that a burst '
+             'of changes triggers a single build')
+    watch.add_argument(
+        '--poll',
+        default=False,
+        action='store_true',
+        help='Scan the files at intervals instead of using inotify, '
+             'e.g. on network file systems')
+    watch.add_argument(
+        '--poll-interval',
+        type=float,
+        default=default.Watch.POLL_INTERVAL.value,
+        help='Seconds between two scans of the files when polling')
+    watch.add_argument(
+        'image',
+        nargs='*',
+        help='Images to watch, all the images by default',
+        action=action.lazy('watch_action', 'WatchAction'))
 
+    # schedule command
+    schedule = subparsers.add_parser(
+        'schedule', help='Check the versions of the images periodically',
+        parents=[parent_parser, images_parser])
+    schedule.add_argument(
+        '--first-versions',
+        default=default.Config.FIRST_VERSIONS_FIND.value,
+        help='Release versions to query, from new to old')
+    schedule.add_argument(
+        '--interval',
+        action='append',
+        metavar='SOURCE=SECONDS',
+        help='Seconds between two checks of the images of a version '
+             'source, e.g. github=7200, repeat for several sources')
+    schedule.add_argument(
+        '--jitter',
+        type=float,
+        default=default.Schedule.JITTER.value,
+        help='Fraction by which the intervals vary, so that the checks '
+             'are spread over time')
+    schedule.add_argument(
+        '--once',
+        default=False,
+        action='store_true',
+        help='Check the images due and exit, e.g. when run by cron')
+    schedule.add_argument(
+        'image',
+        nargs='*',
+        help='Images to check, all the images by default',
+        action=action.lazy('schedule_action', 'ScheduleAction'))
 
-def main():
+    # ls command
+    list_images = subparsers.add_parser(
+        'ls', help='List the image projects',
+        parents=[parent_parser])
+    list_images.add_argument(
+        '--source',
+        choices=['alpine', 'github', 'none'],
+        help='Only list the images whose version comes from this source')
+    list_images.add_argument(
+        '--registry',
+        help='Only list the images of this registry, wildcards allowed')
+    list_images.add_argument(
+        '--base-image',
+        help='Only list the images built from this image, with or '
+             'without tag, wildcards allowed')
+    list_images.add_argument(
+        '--json',
+        default=False,
+        action='store_true',
+        help='Print the images as JSON')
+    list_images.add_argument(
+        'image',
+        nargs='*',
+        help='Patterns of the image names, wildcards allowed',
+        action=action.lazy('list_action', 'ListAction'))
+
+    # serve command
+    serve = subparsers.add_parser(
+        'serve', help='Run the daemon, other jojo commands then run in it',
+        parents=[parent_parser])
+    serve.add_argument(
+        'socket',
+        nargs='?',
+        default=os.environ.get(
+            default.EnvVar.SOCKET.value,
+            default.Server.SOCKET.value),
+        help='Path of the unix socket of the daemon',
+        action=action.lazy('serve_action', 'ServeAction'))
+
+    parser.parse_args(argv)
+
+
+def run(argv=None) -> int:
+    '''
+    Runs a command.
+    :param argv: The arguments, those of the process by default.
+    :returns: The exit code.
+    '''
     try:
-        parse_args()
+        parse_args(argv)
     except subprocess.CalledProcessError as error:
         logging.debug('Stack Trace: %s', error)
         logging.error('Unable to execute command: %s', error)
+    except SystemExit as error:
+        if isinstance(error.code, str):
+            print(error.code, file=sys.stderr)
+            return 1
+        return error.code or 0
     # TODO: redo this
-    raise SystemExit
+    return 0
+
+
+def main():
+    argv = sys.argv[1:]
+    if argv and argv[0] in default.Server.COMMANDS.value:
+        socket_path = os.environ.get(
+            default.EnvVar.SOCKET.value,
+            default.Server.SOCKET.value)
+        if socket_path and os.path.exists(socket_path):
+            import server
+            code = server.forward(socket_path, argv)
+            if code is not None:
+                raise SystemExit(code)
+
+    raise SystemExit(run(argv))
 
 
 if __name__ == '__main__':
@@ -1,21 +1,35 @@
 import dataclasses
 import enum
+import functools
+import hashlib
+import json
+import logging
 import os
+import time
 import typing
 
-import dacite
 # import jsonschema
-import yaml
 
 import default
+import tracing
 import util
 
+LOGGER = logging.getLogger(__name__)
+
+# seconds after its modification before a buildfile is cached
+BUILDFILE_CACHE_DELAY = 2
+
 
 class SourceType(enum.Enum):
     ALPINE = 'alpine'
     GITHUB = 'github'
 
 
+class CacheType(enum.Enum):
+    LOCAL = 'local'
+    REGISTRY = 'registry'
+
+
 class TagType(enum.Enum):
     TAG = 'TAG'
     VERSION = 'VERSION'
@@ -36,6 +50,12 @@ class Image:
             self.name,
             self.tag)
 
+    @property
+    def repository(self):
+        return util.urljoin(
+            self.registry,
+            self.name)
+
     @staticmethod
     def from_str(image: str) -> 'Image':
         # TODO: create func with ValueError to validate
@@ -55,6 +75,8 @@ class VersionFromAlpine:
     version_id: str
     arch: typing.Optional[str] = default.Image.ARCH.value
     mirror: typing.Optional[str] = default.Alpine.MIRROR.value
+    # other mirrors, the fastest healthy one is used
+    mirrors: typing.Optional[typing.List[str]] = None
     semver: typing.Optional[str] = None
     type: SourceType = SourceType.ALPINE
 
@@ -85,57 +107,273 @@ class ImageTagFrom(Image):
     build_args: typing.Optional[dict] = None
 
 
+@dataclasses.dataclass
+class BuildCache:
+    # a directory for local caches, relative to the cache directory,
+    # an image reference for registry caches, {image} is replaced by
+    # the image name
+    ref: str
+    type: CacheType = CacheType.LOCAL
+    mode: typing.Optional[str] = 'max'
+
+    def get_ref(self, cache_dir: str, image_name: str) -> str:
+        '''
+        Returns the directory or the image reference of the cache. Local
+        caches are kept out of the image directory, they would change the
+        build context on every build.
+        :param cache_dir: The cache directory of jojo.
+        :param image_name: The name of the image.
+        '''
+        ref = self.ref.replace('{image}', image_name)
+        if self.type == CacheType.LOCAL:
+            ref = os.path.abspath(os.path.join(cache_dir, 'layers', ref))
+        return ref
+
+
 @dataclasses.dataclass
 class ImageBuildConfig:
     image: ImageTagFrom
     from_image: typing.Optional[Image] = None
     from_image_builder: typing.Optional[Image] = None
+    cache: typing.Optional[BuildCache] = None
+    # e.g. linux/amd64, linux/arm64
+    platforms: typing.Optional[typing.List[str]] = None
 
     @staticmethod
     def from_dict(image_config_dict: dict) -> 'ImageBuildConfig':
-        image_config = dacite.from_dict(
-            data_class=ImageBuildConfig,
-            data=image_config_dict,
-            config=dacite.Config(
-                cast=[
-                    SourceType,
-                    TagType,
-                ]
+        '''
+        :raises: ValueError
+        '''
+        try:
+            return _convert_build_config(image_config_dict)
+        except ConversionError:
+            # dacite reports what is wrong with the buildfile
+            pass
+
+        import dacite
+
+        try:
+            image_config = dacite.from_dict(
+                data_class=ImageBuildConfig,
+                data=image_config_dict,
+                config=dacite.Config(
+                    cast=[
+                        CacheType,
+                        SourceType,
+                        TagType,
+                    ]
+                )
             )
-        )
+        except dacite.DaciteError as err:
+            raise ValueError(str(err)) from err
 
         return image_config
 
     def to_dict(self):
-        return dataclasses.asdict(self)
+        return _to_dict(self)
 
     def to_yaml(self):
+        import yaml
+
         raw_dict = self.to_dict()
         return yaml.dump(
             data=raw_dict,
-            Dumper=EnumValueYamlDumper,
+            Dumper=get_yaml_dumper(),
         )
 
     def to_fobj(self, fileobj: typing.TextIO):
+        import yaml
+
         raw_dict = self.to_dict()
         yaml.dump(
             data=raw_dict,
             stream=fileobj,
-            Dumper=EnumValueYamlDumper,
+            Dumper=get_yaml_dumper(),
         )
 
     def get_tag_build(self):
         return self.image.tag_build
 
+    def get_base_images(self) -> typing.List[Image]:
+        return [i for i in (self.from_image, self.from_image_builder) if i]
+
 
-class EnumValueYamlDumper(yaml.SafeDumper):
+def _to_dict(value: typing.Any) -> typing.Any:
+    '''
+    Converts dataclasses to dicts as dataclasses.asdict, leaving out the
+    optional fields that are None, so that the buildfiles written keep
+    only what is set.
+    :param value: The value to convert.
     '''
-    a yaml.SafeDumper that will dump enum objects using their values.
+    if dataclasses.is_dataclass(value):
+        return {
+            field.name: _to_dict(getattr(value, field.name))
+            for field in dataclasses.fields(value)
+            if field.default is not None
+            or getattr(value, field.name) is not None
+        }
+    if isinstance(value, (list, tuple)):
+        return type(value)(_to_dict(item) for item in value)
+    if isinstance(value, dict):
+        return {key: _to_dict(item) for key, item in value.items()}
+    return value
+
+
+class ConversionError(ValueError):
     '''
-    def represent_data(self, data):
-        if isinstance(data, enum.Enum):
-            return self.represent_data(data.value)
-        return super().represent_data(data)
+    Raised by the buildfile converter on data it does not handle.
+    '''
+
+
+_MISSING = object()
+
+
+def _get(
+        data: dict,
+        key: str,
+        kind: typing.Any = str,
+        default: typing.Any = _MISSING,
+        optional: bool = False) -> typing.Any:
+    '''
+    Returns a field of a buildfile section, checked as dacite does.
+    :param data: The section.
+    :param key: The name of the field.
+    :param kind: The type, or the enum, of the field.
+    :param default: The default value of the field.
+    :param optional: Whether the field accepts None, it then defaults
+                     to None.
+    :raises: ConversionError
+    '''
+    if key not in data:
+        if default is not _MISSING:
+            return default
+        if optional:
+            return None
+        raise ConversionError(key)
+
+    value = data[key]
+    if value is None and optional:
+        return None
+    if isinstance(kind, type) and issubclass(kind, enum.Enum):
+        try:
+            return kind(value)
+        except ValueError:
+            raise ConversionError(key)
+    if not isinstance(value, kind):
+        raise ConversionError(key)
+    return value
+
+
+def _get_section(data: dict, key: str, optional: bool = True) -> dict:
+    return _get(data, key, kind=dict, optional=optional)
+
+
+def _convert_image(data: typing.Optional[dict]) -> typing.Optional[Image]:
+    if data is None:
+        return None
+    return Image(
+        registry=_get(data, 'registry'),
+        name=_get(data, 'name'),
+        tag=_get(data, 'tag'))
+
+
+def _convert_version_from(
+        data: typing.Optional[dict]
+        ) -> typing.Union[VersionFromAlpine, VersionFromGithub, None]:
+    if data is None:
+        return None
+
+    # as dacite, the first type of the union that matches
+    try:
+        mirrors = _get(data, 'mirrors', list, optional=True)
+        if mirrors is not None and not all(
+                isinstance(m, str) for m in mirrors):
+            raise ConversionError('mirrors')
+        return VersionFromAlpine(
+            package=_get(data, 'package'),
+            repository=_get(data, 'repository'),
+            version_id=_get(data, 'version_id'),
+            arch=_get(
+                data, 'arch', default=default.Image.ARCH.value,
+                optional=True),
+            mirror=_get(
+                data, 'mirror', default=default.Alpine.MIRROR.value,
+                optional=True),
+            mirrors=mirrors,
+            semver=_get(data, 'semver', optional=True),
+            type=_get(data, 'type', SourceType, default=SourceType.ALPINE))
+    except ConversionError:
+        pass
+
+    return VersionFromGithub(
+        owner=_get(data, 'owner'),
+        repository=_get(data, 'repository'),
+        type=_get(data, 'type', SourceType, default=SourceType.GITHUB),
+        semver=_get(data, 'semver', optional=True))
+
+
+def _convert_build_config(data: dict) -> ImageBuildConfig:
+    '''
+    Converts a buildfile to an ImageBuildConfig, as dacite.from_dict does
+    but several times faster. Anything unexpected raises ConversionError
+    so that dacite can report it.
+    :param data: The content of the buildfile.
+    :raises: ConversionError
+    '''
+    if not isinstance(data, dict):
+        raise ConversionError('buildfile')
+
+    image = _get_section(data, 'image', optional=False)
+    tag_build = _get_section(image, 'tag_build')
+    if tag_build is not None:
+        tag_build = TagBuild(
+            version=_get(tag_build, 'version', optional=True),
+            version_from=_convert_version_from(
+                _get_section(tag_build, 'version_from')),
+            type=_get(tag_build, 'type', TagType, default=TagType.TAG))
+
+    build_cache = _get_section(data, 'cache')
+    if build_cache is not None:
+        build_cache = BuildCache(
+            ref=_get(build_cache, 'ref'),
+            type=_get(build_cache, 'type', CacheType,
+                      default=CacheType.LOCAL),
+            mode=_get(build_cache, 'mode', default='max', optional=True))
+
+    platforms = _get(data, 'platforms', list, optional=True)
+    if platforms is not None and not all(
+            isinstance(p, str) for p in platforms):
+        raise ConversionError('platforms')
+
+    return ImageBuildConfig(
+        image=ImageTagFrom(
+            registry=_get(image, 'registry'),
+            name=_get(image, 'name'),
+            tag=_get(image, 'tag', optional=True),
+            tag_build=tag_build,
+            build_args=_get(image, 'build_args', dict, optional=True)),
+        from_image=_convert_image(_get_section(data, 'from_image')),
+        from_image_builder=_convert_image(
+            _get_section(data, 'from_image_builder')),
+        cache=build_cache,
+        platforms=platforms)
+
+
+@functools.lru_cache(maxsize=None)
+def get_yaml_dumper() -> type:
+    '''
+    Returns a yaml.SafeDumper that will dump enum objects using their
+    values.
+    '''
+    import yaml
+
+    class EnumValueYamlDumper(yaml.SafeDumper):
+        def represent_data(self, data):
+            if isinstance(data, enum.Enum):
+                return self.represent_data(data.value)
+            return super().represent_data(data)
+
+    return EnumValueYamlDumper
 
 
 def get_buildfile_path(path: str, image_name: str) -> str:
@@ -154,18 +392,137 @@ def get_buildfile_path(path: str, image_name: str) -> str:
     return buildfile
 
 
+# parsed buildfiles by path, with their mtime and size
+_BUILDFILES: typing.Dict[str, typing.Tuple[typing.List[int], str]] = {}
+
+
+def _load_buildfile(
+        buildfile_path: str,
+        cache_dir: typing.Optional[str] = None) -> typing.Any:
+    '''
+    Returns the content of a buildfile. With a cache_dir, the content is
+    cached as JSON, keyed by the path, mtime and size of the buildfile,
+    on disk and in memory for long running processes.
+    :param buildfile_path: The path of the buildfile.
+    :param cache_dir: The cache directory.
+    '''
+    if not cache_dir:
+        return util.load_yaml(buildfile_path)
+
+    buildfile_path = os.path.abspath(buildfile_path)
+    stat = os.stat(buildfile_path)
+    key = [stat.st_mtime_ns, stat.st_size]
+
+    # JSON, so that every caller gets its own copy
+    cached_key, cached_data = _BUILDFILES.get(buildfile_path, (None, None))
+    if cached_key == key:
+        return json.loads(cached_data)
+
+    cache_path = os.path.join(
+        cache_dir,
+        'buildfile',
+        hashlib.sha256(buildfile_path.encode()).hexdigest() + '.json')
+
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as fobj:
+            entry = json.load(fobj)
+        if entry['path'] == buildfile_path and entry['key'] == key:
+            _BUILDFILES[buildfile_path] = (key, json.dumps(entry['data']))
+            return entry['data']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    data = util.load_yaml(buildfile_path)
+    # a buildfile modified within the mtime granularity could keep its
+    # mtime and size, recent ones are not cached
+    if data is None or time.time() - stat.st_mtime < BUILDFILE_CACHE_DELAY:
+        return data
+
+    try:
+        content = json.dumps({
+            'path': buildfile_path,
+            'key': key,
+            'data': data,
+        })
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        util.write_atomic(cache_path, content)
+        _BUILDFILES[buildfile_path] = (key, json.dumps(data))
+    except (OSError, TypeError, ValueError):
+        # e.g. yaml dates, the buildfile is then parsed every time
+        pass
+    return data
+
+
+def load_build_config(
+        buildfile_path: str,
+        cache_dir: typing.Optional[str] = None) -> ImageBuildConfig:
+    '''
+    Returns an ImageBuildConfig object from a buildfile.
+    :param buildfile_path: The path of the buildfile.
+    :param cache_dir: The cache directory, None to parse the buildfile.
+    :raises: OSError
+    :raises: ValueError
+    '''
+    with tracing.span('parse yaml', 'config'):
+        data = _load_buildfile(buildfile_path, cache_dir)
+    if not isinstance(data, dict):
+        # unreadable or not a mapping, load_yaml logged why
+        raise ValueError(f'invalid buildfile: {buildfile_path}')
+    with tracing.span('convert', 'config'):
+        return ImageBuildConfig.from_dict(data)
+
+
+def load_valid_build_config(
+        buildfile_path: str,
+        image_name: str,
+        cache_dir: typing.Optional[str] = None
+        ) -> typing.Optional[ImageBuildConfig]:
+    '''
+    Returns an ImageBuildConfig object from a buildfile, None when the
+    buildfile is invalid, which is logged: the commands going over all
+    the images skip those until they are fixed.
+    :param buildfile_path: The path of the buildfile.
+    :param image_name: The name of the image, for the log.
+    :param cache_dir: The cache directory, None to parse the buildfile.
+    '''
+    try:
+        return load_build_config(buildfile_path, cache_dir=cache_dir)
+    except (OSError, ValueError) as err:
+        LOGGER.warning('%s: unable to load the buildfile: %s',
+                       image_name, err)
+        return None
+
+
 def get_build_config(
         path: str,
-        image_name: str) -> typing.Optional[ImageBuildConfig]:
+        image_name: str,
+        cache_dir: typing.Optional[str] = None
+        ) -> typing.Optional[ImageBuildConfig]:
     '''
     Returns an ImageBuildConfig object from the default buildfile
     located in the image directory.
     :param path: The path of the images directory.
     :param name: Name of the image, must exist as a directory.
+    :param cache_dir: The cache directory, None to parse the buildfile.
     '''
-    buildfile_path = get_buildfile_path(path, image_name)
-    return ImageBuildConfig.from_dict(
-        util.load_yaml(
-            buildfile_path
-        )
-    )
+    with tracing.span('load buildfile', 'config', image=image_name):
+        return load_build_config(
+            get_buildfile_path(path, image_name),
+            cache_dir=cache_dir)
+
+
+def get_build_configs(
+        path: str,
+        image_names: typing.List[str],
+        cache_dir: typing.Optional[str] = None
+        ) -> typing.Dict[str, ImageBuildConfig]:
+    '''
+    Returns the ImageBuildConfig objects of several images, by image name.
+    :param path: The path of the images directory.
+    :param image_names: Names of the images, must exist as directories.
+    :param cache_dir: The cache directory, None to parse the buildfiles.
+    '''
+    return {
+        image_name: get_build_config(path, image_name, cache_dir)
+        for image_name in image_names
+    }
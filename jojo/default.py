@@ -1,4 +1,5 @@
 import enum
+import os
 
 
 class Alpine(enum.Enum):
@@ -9,6 +10,12 @@ class Alpine(enum.Enum):
     REPO = 'ALPINE_REPO'
     VERSION_ID = 'ALPINE_VERSION_ID'
     MIRROR = 'http://dl-cdn.alpinelinux.org'
+    CONCURRENCY = 4
+    # seconds before giving up on a mirror and trying the next one
+    FETCH_TIMEOUT = 30
+    PROBE_TIMEOUT = 3
+    # seconds a failing mirror is ranked last before it is tried again
+    RETRY_DELAY = 60
 
 
 class Github(enum.Enum):
@@ -17,6 +24,18 @@ class Github(enum.Enum):
     '''
     OWNER = 'GITHUB_OWNER'
     REPO = 'GITHUB_REPO'
+    BATCH_SIZE = 20
+    CONCURRENCY = 2
+    PAGE_SIZE_LATEST = 10
+    RATE_LIMIT_ATTEMPTS = 3
+    RATE_LIMIT_BACKOFF_MIN = 1
+
+
+# an enum member with the value of a previous member is an alias of it,
+# the defaults equal to another of their enum are thus module constants
+
+# points of the GitHub rate limit budget kept unused
+GITHUB_RATE_LIMIT_RESERVE = 10
 
 
 class Builder(enum.Enum):
@@ -25,6 +44,9 @@ class Builder(enum.Enum):
     '''
     NAME = 'podman'
     DOCKERFILE_NAME = 'Dockerfile'
+    STATE_FILENAME = 'build-state.json'
+    # lines of output kept per command for failure reports
+    TAIL_LINES = 50
 
 
 class Image(enum.Enum):
@@ -35,6 +57,61 @@ class Image(enum.Enum):
     NAME = 'registry:443/image:tag'
 
 
+class Registry(enum.Enum):
+    '''
+    Default registry client configuration.
+    '''
+    # seconds before giving up on a request, unless the caller sets one
+    TIMEOUT = 30
+
+
+class Cache(enum.Enum):
+    '''
+    Default cache configuration.
+    '''
+    DIR = os.path.join(
+        os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+        'jojo')
+    TTL = 3600
+
+
+class Server(enum.Enum):
+    '''
+    Default daemon configuration.
+    '''
+    SOCKET = os.path.join(
+        os.environ.get('XDG_RUNTIME_DIR') or Cache.DIR.value,
+        'jojo.sock')
+    # commands run by the daemon when it is running
+    COMMANDS = ('build', 'findver', 'listver', 'push')
+
+
+class Watch(enum.Enum):
+    '''
+    Default watch configuration.
+    '''
+    # seconds without change ending a burst of changes
+    DEBOUNCE = 0.5
+    POLL_INTERVAL = 1.0
+
+
+class Schedule(enum.Enum):
+    '''
+    Default scheduler configuration.
+    '''
+    # seconds between two checks of an image, by version source
+    INTERVALS = (('alpine', 3600), ('github', 3600))
+    # the intervals vary by up to this fraction, to spread the checks
+    JITTER = 0.1
+    # seconds before retrying a failing source, doubled on each failure
+    BACKOFF_MIN = 60
+    BACKOFF_MAX = 3600
+
+
+# seconds between two scans of the images directory for new images
+SCHEDULE_RESCAN_INTERVAL = 60
+
+
 class Config(enum.Enum):
     '''
     Default configuration options.
@@ -43,16 +120,29 @@ class Config(enum.Enum):
     DRY_RUN = 'False'
     FIRST_VERSIONS_LIST = 10
     FIRST_VERSIONS_FIND = 100
+    JOBS = 1
     LOG_LEVEL = 'info'
     TAG_LATEST = False
 
 
+# whether to skip the images whose tag is already in the registry
+CHECK_REGISTRY = 'False'
+
+
 class EnvVar(enum.Enum):
     '''
     Environment variables.
     '''
+    ALPINE_MIRRORS = 'JOJO_ALPINE_MIRRORS'
     BUILDER = 'JOJO_BUILDER'
+    CACHE_DIR = 'JOJO_CACHE_DIR'
+    CACHE_TTL = 'JOJO_CACHE_TTL'
+    CHECK_REGISTRY = 'JOJO_CHECK_REGISTRY'
     DRY_RUN = 'JOJO_DRY_RUN'
     IMAGES_PATH = 'JOJO_IMAGES_PATH'
+    INSECURE_REGISTRIES = 'JOJO_INSECURE_REGISTRIES'
+    JOBS = 'JOJO_JOBS'
     LOG_LEVEL = 'JOJO_LOG_LEVEL'
+    SOCKET = 'JOJO_SOCKET'
+    TRACE = 'JOJO_TRACE'
     GITHUB_TOKEN = 'GITHUB_TOKEN'
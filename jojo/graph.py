@@ -0,0 +1,140 @@
+import concurrent.futures
+import logging
+import typing
+
+import config
+
+LOGGER = logging.getLogger(__name__)
+
+
+class CycleError(ValueError):
+    '''
+    Raised when the images depend on each other.
+    '''
+
+
+def get_dependencies(
+        build_configs: typing.Dict[str, config.ImageBuildConfig]
+        ) -> typing.Dict[str, typing.Set[str]]:
+    '''
+    Returns, for every image, the names of the images it is built from.
+    A base image is a dependency when its repository is one of the
+    images being built, whatever its tag.
+    :param build_configs: The build configurations, by image name.
+    '''
+    repositories = {
+        build_config.image.repository: image_name
+        for image_name, build_config in build_configs.items()
+    }
+
+    dependencies = {}
+    for image_name, build_config in build_configs.items():
+        dependencies[image_name] = {
+            repositories[base_image.repository]
+            for base_image in build_config.get_base_images()
+            if repositories.get(base_image.repository, image_name)
+            != image_name
+        }
+
+    return dependencies
+
+
+def get_dependents(
+        dependencies: typing.Dict[str, typing.Set[str]],
+        image_names: typing.Iterable[str]) -> typing.Set[str]:
+    '''
+    Returns the images transitively built from the given images,
+    the given images included.
+    :param dependencies: The dependencies, by image name.
+    :param image_names: The names of the images.
+    '''
+    dependents = set(image_names)
+    pending = list(dependents)
+    while pending:
+        image_name = pending.pop()
+        for name, deps in dependencies.items():
+            if image_name in deps and name not in dependents:
+                dependents.add(name)
+                pending.append(name)
+
+    return dependents
+
+
+def sort(dependencies: typing.Dict[str, typing.Set[str]]) -> typing.List[str]:
+    '''
+    Returns the image names ordered so that every image comes after
+    the images it depends on.
+    :param dependencies: The dependencies, by image name.
+    :raises: CycleError
+    '''
+    remaining = {k: set(v) for k, v in dependencies.items()}
+    ordered = []
+    while remaining:
+        ready = sorted(k for k, v in remaining.items() if not v)
+        if not ready:
+            raise CycleError(
+                f'dependency cycle between images: {sorted(remaining)}')
+        for image_name in ready:
+            del remaining[image_name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+        ordered.extend(ready)
+
+    return ordered
+
+
+def run(
+        dependencies: typing.Dict[str, typing.Set[str]],
+        func: typing.Callable[[str], typing.Any],
+        jobs: int = 1) -> typing.Dict[str, BaseException]:
+    '''
+    Calls func for every image, running independent images concurrently.
+    An image is only started once all its dependencies succeeded, the
+    dependents of a failed image are skipped.
+    :param dependencies: The dependencies, by image name.
+    :param func: The function to call with the image name.
+    :param jobs: The maximum number of concurrent calls.
+    :returns: The exceptions raised, by image name.
+    :raises: CycleError
+    '''
+    pending = {
+        image_name: set(deps) & set(dependencies)
+        for image_name, deps in dependencies.items()
+    }
+    # fail early rather than deadlock
+    sort(pending)
+
+    failed = {}
+    running = {}
+
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(int(jobs), 1),
+            thread_name_prefix='jojo') as executor:
+        while pending or running:
+            for image_name in sorted(k for k, v in pending.items() if not v):
+                del pending[image_name]
+                LOGGER.debug('Starting %s', image_name)
+                running[executor.submit(func, image_name)] = image_name
+
+            done, _ = concurrent.futures.wait(
+                running,
+                return_when=concurrent.futures.FIRST_COMPLETED)
+
+            for future in done:
+                image_name = running.pop(future)
+                error = future.exception()
+                if error is None:
+                    LOGGER.debug('Finished %s', image_name)
+                    for deps in pending.values():
+                        deps.discard(image_name)
+                    continue
+
+                LOGGER.error('Failed %s: %s', image_name, error)
+                failed[image_name] = error
+                skipped = get_dependents(pending, [image_name])
+                for name in sorted(skipped - {image_name}):
+                    LOGGER.error('Skipping %s, depends on %s',
+                                 name, image_name)
+                    del pending[name]
+
+    return failed
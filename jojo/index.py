@@ -0,0 +1,213 @@
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+import time
+import typing
+
+import config
+import default
+import util
+
+LOGGER = logging.getLogger(__name__)
+
+# bumped when the entries change, older indexes are rebuilt
+INDEX_VERSION = 1
+
+
+class Entry(typing.NamedTuple):
+    '''
+    What the index knows about an image project.
+    '''
+    image_name: str
+    image: str
+    registry: str
+    repository: str
+    tag: typing.Optional[str]
+    source: typing.Optional[str]
+    source_name: typing.Optional[str]
+    base_images: typing.List[str]
+    mtime_ns: int
+    size: int
+
+    @staticmethod
+    def from_build_config(
+            image_name: str,
+            build_config: config.ImageBuildConfig,
+            stat: os.stat_result) -> 'Entry':
+        '''
+        :param image_name: The name of the image directory.
+        :param build_config: The image build configuration.
+        :param stat: The stat of the buildfile.
+        '''
+        source = source_name = None
+        tag_build = build_config.get_tag_build()
+        version_from = tag_build.version_from if tag_build else None
+        if isinstance(version_from, config.VersionFromAlpine):
+            source_name = '/'.join([
+                version_from.version_id,
+                version_from.repository,
+                version_from.package])
+        elif isinstance(version_from, config.VersionFromGithub):
+            source_name = '/'.join([
+                version_from.owner,
+                version_from.repository])
+        if version_from is not None:
+            source = version_from.type.value
+
+        mtime_ns = stat.st_mtime_ns
+        # a buildfile modified within the mtime granularity could keep its
+        # mtime and size, recent ones are loaded again on the next update
+        if time.time() - stat.st_mtime < config.BUILDFILE_CACHE_DELAY:
+            mtime_ns = -1
+
+        return Entry(
+            image_name=image_name,
+            image=build_config.image.full_name,
+            registry=build_config.image.registry,
+            repository=build_config.image.repository,
+            tag=build_config.image.tag,
+            source=source,
+            source_name=source_name,
+            base_images=[
+                i.full_name for i in build_config.get_base_images()],
+            mtime_ns=mtime_ns,
+            size=stat.st_size)
+
+
+class Index:
+    '''
+    Index of the image projects of an images directory, persisted in the
+    cache directory and updated from the buildfiles that changed.
+    '''
+
+    def __init__(self, path: str, cache_dir: str):
+        '''
+        :param path: The path of the images directory.
+        :param cache_dir: The cache directory.
+        '''
+        self.path = os.path.abspath(path)
+        self.cache_dir = cache_dir
+        self.index_path = os.path.join(
+            cache_dir,
+            'index',
+            hashlib.sha256(self.path.encode()).hexdigest() + '.json')
+        self.entries: typing.Dict[str, Entry] = {}
+
+    def load(self):
+        '''
+        Loads the persisted index, if any.
+        '''
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as fobj:
+                content = json.load(fobj)
+            if content['version'] != INDEX_VERSION or \
+                    content['path'] != self.path:
+                return
+            self.entries = {
+                name: Entry(**entry)
+                for name, entry in content['entries'].items()
+            }
+        except (OSError, ValueError, KeyError, TypeError):
+            self.entries = {}
+
+    def save(self):
+        '''
+        Persists the index.
+        '''
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        util.write_atomic(self.index_path, json.dumps({
+            'version': INDEX_VERSION,
+            'path': self.path,
+            'entries': {
+                name: entry._asdict()
+                for name, entry in self.entries.items()
+            },
+        }))
+
+    def update(self) -> bool:
+        '''
+        Updates the index from the images directory, only the buildfiles
+        whose mtime or size changed are loaded.
+        :returns: Whether the index changed.
+        :raises: ValueError
+        '''
+        entries = {}
+        changed = False
+
+        for image_name in util.get_image_names(self.path):
+            buildfile_path = os.path.join(
+                self.path,
+                image_name,
+                default.Config.BUILDFILE_NAME.value)
+            stat = os.stat(buildfile_path)
+
+            entry = self.entries.get(image_name)
+            if entry and entry.mtime_ns == stat.st_mtime_ns and \
+                    entry.size == stat.st_size:
+                entries[image_name] = entry
+                continue
+
+            changed = True
+            LOGGER.debug('Indexing %s', image_name)
+            build_config = config.load_valid_build_config(
+                buildfile_path,
+                image_name=image_name,
+                cache_dir=self.cache_dir)
+            if build_config is not None:
+                entries[image_name] = Entry.from_build_config(
+                    image_name=image_name,
+                    build_config=build_config,
+                    stat=stat)
+
+        changed = changed or set(entries) != set(self.entries)
+        self.entries = entries
+        return changed
+
+    def query(
+            self,
+            patterns: typing.Optional[typing.List[str]] = None,
+            source: typing.Optional[str] = None,
+            registry: typing.Optional[str] = None,
+            base_image: typing.Optional[str] = None) -> typing.List[Entry]:
+        '''
+        Returns the entries matching all the filters, sorted by name.
+        Patterns are shell-style wildcards, e.g. nginx*.
+        :param patterns: Patterns of the image names, any must match.
+        :param source: The version source type, e.g. github, or none.
+        :param registry: Pattern of the registry.
+        :param base_image: Pattern of a base image, matched against its
+                           full name and its repository.
+        '''
+        entries = []
+        for name in sorted(self.entries):
+            entry = self.entries[name]
+            if patterns and not any(
+                    fnmatch.fnmatchcase(name, p) for p in patterns):
+                continue
+            if source and (entry.source or 'none') != source:
+                continue
+            if registry and not fnmatch.fnmatchcase(entry.registry, registry):
+                continue
+            if base_image and not any(
+                    fnmatch.fnmatchcase(i, base_image)
+                    or fnmatch.fnmatchcase(i.rsplit(':', 1)[0], base_image)
+                    for i in entry.base_images):
+                continue
+            entries.append(entry)
+        return entries
+
+
+def get_index(path: str, cache_dir: str) -> Index:
+    '''
+    Returns the up to date index of an images directory.
+    :param path: The path of the images directory.
+    :param cache_dir: The cache directory.
+    :raises: ValueError
+    '''
+    index = Index(path=path, cache_dir=cache_dir)
+    index.load()
+    if index.update():
+        index.save()
+    return index
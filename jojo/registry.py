@@ -0,0 +1,256 @@
+import base64
+import json
+import logging
+import os
+import re
+import threading
+import typing
+
+import requests
+
+import default
+import tracing
+
+LOGGER = logging.getLogger(__name__)
+
+DOCKER_HUB = 'docker.io'
+DOCKER_HUB_API = 'registry-1.docker.io'
+MANIFEST_TYPES = ', '.join([
+    'application/vnd.oci.image.index.v1+json',
+    'application/vnd.oci.image.manifest.v1+json',
+    'application/vnd.docker.distribution.manifest.list.v2+json',
+    'application/vnd.docker.distribution.manifest.v2+json',
+])
+CHALLENGE_RE = re.compile(r'(\w+)="([^"]*)"')
+
+
+class Reference(typing.NamedTuple):
+    '''
+    An image reference split for the distribution API.
+    '''
+    host: str
+    repository: str
+    tag: str
+
+    @staticmethod
+    def from_str(image: str) -> 'Reference':
+        '''
+        :param image: The full name of the image, e.g. r.spiarh.fr/nginx:1.
+        :raises: ValueError
+        '''
+        name, tag = image.rsplit(':', 1)
+        if '/' in tag or '/' not in name:
+            raise ValueError(f'invalid image reference: {image}')
+        host, repository = name.split('/', 1)
+        return Reference(host=host, repository=repository, tag=tag)
+
+    @property
+    def base_url(self) -> str:
+        host = DOCKER_HUB_API if self.host == DOCKER_HUB else self.host
+        scheme = 'http' if is_insecure(self.host) else 'https'
+        return f'{scheme}://{host}'
+
+
+def is_insecure(host: str) -> bool:
+    '''
+    Returns whether a registry is reached over plain HTTP: local
+    registries and the ones listed in JOJO_INSECURE_REGISTRIES.
+    :param host: The registry host, with its port.
+    '''
+    insecure = os.environ.get(default.EnvVar.INSECURE_REGISTRIES.value, '')
+    hostname = host.rsplit(':', 1)[0]
+    return (hostname in ('localhost', '127.0.0.1')
+            or host in [h.strip() for h in insecure.split(',') if h])
+
+
+def get_credentials(host: str) -> typing.Optional[typing.Tuple[str, str]]:
+    '''
+    Returns the user and password of a registry from the containers or
+    docker auth files, as written by podman/docker login.
+    :param host: The registry host, with its port.
+    '''
+    paths = [
+        os.environ.get('REGISTRY_AUTH_FILE'),
+        os.path.join(
+            os.environ.get('XDG_RUNTIME_DIR', '/run/user/%d' % os.getuid()),
+            'containers', 'auth.json'),
+        os.path.expanduser('~/.config/containers/auth.json'),
+        os.path.expanduser('~/.docker/config.json'),
+    ]
+    for path in [p for p in paths if p]:
+        try:
+            with open(path, 'r', encoding='utf-8') as fobj:
+                auths = json.load(fobj).get('auths', {})
+        except (OSError, ValueError):
+            continue
+
+        for key in (host, f'https://{host}', f'https://{host}/v1/'):
+            auth = auths.get(key, {}).get('auth')
+            if auth:
+                user, password = base64.b64decode(auth).decode().split(':', 1)
+                return user, password
+    return None
+
+
+class Registry:
+    '''
+    Client of the OCI distribution API.
+    '''
+
+    def __init__(
+            self,
+            session: typing.Optional[requests.Session] = None,
+            timeout: float = default.Registry.TIMEOUT.value):
+        '''
+        :param session: The HTTP session, shared to pool connections.
+        :param timeout: Seconds before giving up on a request.
+        '''
+        self.http = session or requests.Session()
+        self.timeout = timeout
+        self._tokens: typing.Dict[typing.Tuple[str, str], str] = {}
+        self._lock = threading.Lock()
+
+    def _get_token(
+            self,
+            reference: Reference,
+            challenge: str,
+            actions: str,
+            timeout: typing.Any) -> typing.Optional[str]:
+        '''
+        Returns a bearer token answering a WWW-Authenticate challenge.
+        '''
+        params = dict(CHALLENGE_RE.findall(challenge))
+        realm = params.pop('realm', None)
+        if realm is None:
+            return None
+        params['scope'] = f'repository:{reference.repository}:{actions}'
+
+        credentials = get_credentials(reference.host)
+        response = self.http.get(
+            realm, params=params, auth=credentials, timeout=timeout)
+        response.raise_for_status()
+        body = response.json()
+        return body.get('token') or body.get('access_token')
+
+    def request(
+            self,
+            method: str,
+            reference: Reference,
+            path: str,
+            actions: str = 'pull',
+            **kwargs) -> requests.Response:
+        '''
+        Sends a request to the registry of the reference, authenticating
+        when challenged. Requests time out after the timeout of the client
+        unless a timeout is given.
+        :param method: The HTTP method.
+        :param reference: The image reference.
+        :param path: The path under /v2/<repository>/.
+        :param actions: The token scope actions, e.g. pull or pull,push.
+        :raises: requests.RequestException
+        '''
+        url = f'{reference.base_url}/v2/{reference.repository}/{path}'
+        headers = kwargs.pop('headers', {})
+        kwargs.setdefault('timeout', self.timeout)
+        key = (reference.host, f'{reference.repository}:{actions}')
+
+        with self._lock:
+            token = self._tokens.get(key)
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+
+        with tracing.span(f'{method} {path}', 'registry', url=url):
+            response = self.http.request(
+                method, url, headers=headers, **kwargs)
+        challenge = response.headers.get('WWW-Authenticate', '')
+        if response.status_code != 401:
+            return response
+
+        if challenge.lower().startswith('bearer '):
+            token = self._get_token(
+                reference, challenge, actions, kwargs['timeout'])
+            if token:
+                with self._lock:
+                    self._tokens[key] = token
+                headers['Authorization'] = f'Bearer {token}'
+        elif challenge.lower().startswith('basic '):
+            kwargs['auth'] = get_credentials(reference.host)
+
+        with tracing.span(f'{method} {path}', 'registry', url=url):
+            return self.http.request(
+                method, url, headers=headers, **kwargs)
+
+    def has_tag(self, image: str) -> bool:
+        '''
+        Returns whether the tag of an image exists in its registry.
+        Errors are logged and reported as a missing tag, so that the
+        image is built and pushed anyway.
+        :param image: The full name of the image.
+        '''
+        try:
+            reference = Reference.from_str(image)
+            response = self.request(
+                'HEAD',
+                reference,
+                f'manifests/{reference.tag}',
+                headers={'Accept': MANIFEST_TYPES})
+        except (ValueError, requests.RequestException) as err:
+            LOGGER.warning('Unable to check %s in the registry: %s',
+                           image, err)
+            return False
+
+        if response.status_code == 200:
+            return True
+        if response.status_code != 404:
+            LOGGER.warning('Unable to check %s in the registry: HTTP %s',
+                           image, response.status_code)
+        return False
+
+    def add_tag(self, image: str, tag: str) -> bool:
+        '''
+        Adds a tag to an image already in its registry by uploading its
+        manifest again under the new tag, the layers and the config are
+        not transferred. Errors are logged and reported as a failure, so
+        that the caller can push the tag with the builder instead.
+        :param image: The full name of the pushed image.
+        :param tag: The tag to add, e.g. latest.
+        '''
+        try:
+            reference = Reference.from_str(image)
+            response = self.request(
+                'GET',
+                reference,
+                f'manifests/{reference.tag}',
+                actions='pull,push',
+                headers={'Accept': MANIFEST_TYPES})
+            response.raise_for_status()
+            response = self.request(
+                'PUT',
+                reference,
+                f'manifests/{tag}',
+                actions='pull,push',
+                headers={'Content-Type': response.headers['Content-Type']},
+                data=response.content)
+            response.raise_for_status()
+        except (KeyError, ValueError, requests.RequestException) as err:
+            LOGGER.warning('Unable to tag %s as %s in the registry: %s',
+                           image, tag, err)
+            return False
+
+        LOGGER.info('Tagged %s as %s in the registry', image, tag)
+        return True
+
+
+_REGISTRY: typing.Optional[Registry] = None
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_registry() -> Registry:
+    '''
+    Returns the process-wide registry client.
+    '''
+    global _REGISTRY
+    with _REGISTRY_LOCK:
+        if _REGISTRY is None:
+            _REGISTRY = Registry()
+        return _REGISTRY
@@ -0,0 +1,135 @@
+import concurrent.futures
+import logging
+import threading
+import typing
+
+import config
+import tracing
+import util
+import version_finder
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Result(typing.NamedTuple):
+    '''
+    Outcome of the version lookup of an image.
+    '''
+    image_name: str
+    version_from: typing.Any
+    versions: typing.Optional[version_finder.Versions]
+    latest: typing.Optional[str]
+    error: typing.Optional[BaseException]
+
+    @property
+    def failed(self) -> bool:
+        '''
+        Whether the lookup of an image with a version source failed or
+        found no version.
+        '''
+        if self.version_from is None:
+            return False
+        if self.error is not None:
+            return True
+        if self.versions is not None:
+            return not (self.versions.stable or self.versions.unstable)
+        return self.latest is None
+
+
+def check_results(results: typing.List[Result]):
+    '''
+    Exits with an error when a lookup failed, once the results were used.
+    :param results: The results of the lookups.
+    :raises: SystemExit
+    '''
+    failed = [result.image_name for result in results if result.failed]
+    if failed:
+        LOGGER.error('No version found for %s', ', '.join(failed))
+        raise SystemExit(1)
+
+
+def get_finder(version_from: typing.Any) -> typing.Type:
+    '''
+    Returns the version finder class of a version source.
+    :param version_from: The version source configuration.
+    '''
+    return util.get_class(
+        package='version_finder',
+        module=version_from.type.value,
+        name=version_from.type.value)
+
+
+def resolve(
+        build_configs: typing.Dict[str, config.ImageBuildConfig],
+        first_versions: int,
+        jobs: int,
+        latest: bool = False) -> typing.List[Result]:
+    '''
+    Looks up the versions of several images concurrently.
+    Sources of the same type are resolved in batches (see
+    FindVersion.group), each type being limited to its CONCURRENCY.
+    :param build_configs: The build configurations, by image name.
+    :param first_versions: Release versions to query, from new to old.
+    :param jobs: The maximum number of concurrent lookups.
+    :param latest: Only look up the latest version of each image, the
+                   results then have no versions.
+    :returns: The results, sorted by image name.
+    '''
+    results = {}
+    sources: typing.Dict[config.SourceType, typing.List[str]] = {}
+    for image_name, build_config in build_configs.items():
+        tag_build = build_config.get_tag_build()
+        if tag_build is None or tag_build.version_from is None:
+            results[image_name] = Result(image_name, None, None, None, None)
+            continue
+        sources.setdefault(tag_build.version_from.type, []).append(image_name)
+
+    def lookup(finder, semaphore, image_names):
+        version_froms = [
+            build_configs[n].get_tag_build().version_from
+            for n in image_names
+        ]
+        with semaphore, tracing.span(
+                'lookup', 'resolver', images=image_names):
+            LOGGER.debug('Looking up %s', ', '.join(image_names))
+            get_batch = finder.get_all_batch
+            if latest:
+                get_batch = finder.get_latest_batch
+            return get_batch(
+                version_froms=version_froms,
+                first_versions=first_versions)
+
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(int(jobs), 1),
+            thread_name_prefix='jojo') as executor:
+        futures = {}
+        for image_names in sources.values():
+            finder = get_finder(
+                build_configs[image_names[0]].get_tag_build().version_from)
+            semaphore = threading.BoundedSemaphore(finder.CONCURRENCY)
+            version_froms = [
+                build_configs[n].get_tag_build().version_from
+                for n in image_names
+            ]
+            for positions in finder.group(version_froms):
+                batch = [image_names[i] for i in positions]
+                future = executor.submit(lookup, finder, semaphore, batch)
+                futures[future] = batch
+
+        for future in concurrent.futures.as_completed(futures):
+            batch = futures[future]
+            error = future.exception()
+            found = [None] * len(batch) if error else future.result()
+            if error:
+                LOGGER.error('Lookup failed for %s: %s',
+                             ', '.join(batch), error)
+            for image_name, image_found in zip(batch, found):
+                results[image_name] = Result(
+                    image_name=image_name,
+                    version_from=build_configs[
+                        image_name].get_tag_build().version_from,
+                    versions=None if latest else image_found,
+                    latest=image_found if latest else None,
+                    error=error)
+
+    return [results[image_name] for image_name in sorted(results)]
@@ -0,0 +1,232 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import typing
+
+import config
+import default
+import resolver
+import util
+from version_finder import alpine
+
+LOGGER = logging.getLogger(__name__)
+
+# bumped when the state changes, older states are dropped
+STATE_VERSION = 1
+
+
+class ImageState(typing.NamedTuple):
+    '''
+    When an image was checked and is checked next.
+    '''
+    source: str
+    origin: str
+    next_at: float
+    checked_at: typing.Optional[float] = None
+    version: typing.Optional[str] = None
+
+
+class OriginState(typing.NamedTuple):
+    '''
+    Consecutive failures of an origin and when it is retried.
+    '''
+    failures: int = 0
+    retry_at: float = 0
+
+
+class Scheduler:
+    '''
+    Decides which images have their version checked, spreading the checks
+    over the interval of their source and backing off failing origins.
+    Its state is persisted in the cache directory, so that a restart does
+    not check every image again.
+    '''
+
+    def __init__(
+            self,
+            path: str,
+            cache_dir: str,
+            intervals: typing.Optional[typing.Dict[str, float]] = None,
+            jitter: float = default.Schedule.JITTER.value,
+            backoff_min: float = default.Schedule.BACKOFF_MIN.value,
+            backoff_max: float = default.Schedule.BACKOFF_MAX.value):
+        '''
+        :param path: The path of the images directory.
+        :param cache_dir: The cache directory.
+        :param intervals: Seconds between two checks, by source type.
+        :param jitter: Fraction by which intervals and delays vary.
+        :param backoff_min: Seconds before retrying after a failure.
+        :param backoff_max: Maximum seconds before retrying.
+        '''
+        self.path = os.path.abspath(path)
+        self.state_path = os.path.join(
+            cache_dir,
+            'schedule',
+            hashlib.sha256(self.path.encode()).hexdigest() + '.json')
+        self.intervals = dict(intervals or default.Schedule.INTERVALS.value)
+        self.jitter = float(jitter)
+        self.backoff_min = float(backoff_min)
+        self.backoff_max = float(backoff_max)
+        self.images: typing.Dict[str, ImageState] = {}
+        self.origins: typing.Dict[str, OriginState] = {}
+
+    def load(self):
+        '''
+        Loads the persisted state, if any.
+        '''
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as fobj:
+                content = json.load(fobj)
+            if content['version'] != STATE_VERSION or \
+                    content['path'] != self.path:
+                return
+            self.images = {
+                name: ImageState(**state)
+                for name, state in content['images'].items()
+            }
+            self.origins = {
+                name: OriginState(**state)
+                for name, state in content['origins'].items()
+            }
+        except (OSError, ValueError, KeyError, TypeError):
+            self.images = {}
+            self.origins = {}
+
+    def save(self):
+        '''
+        Persists the state.
+        '''
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        util.write_atomic(self.state_path, json.dumps({
+            'version': STATE_VERSION,
+            'path': self.path,
+            'images': {
+                name: state._asdict() for name, state in self.images.items()
+            },
+            'origins': {
+                name: state._asdict() for name, state in self.origins.items()
+            },
+        }, indent=2))
+
+    def _spread(self, delay: float) -> float:
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def update(
+            self,
+            build_configs: typing.Dict[str, config.ImageBuildConfig],
+            now: float,
+            spread: bool = True):
+        '''
+        Schedules the new images and forgets the removed ones, images
+        without version source are not scheduled.
+        :param build_configs: The build configurations, by image name.
+        :param now: The current time.
+        :param spread: Whether the first checks of the new images are
+                       spread over the jitter of their interval, they are
+                       due now otherwise.
+        '''
+        images = {}
+        for name, build_config in build_configs.items():
+            source, origin = _get_source(build_config)
+            if source not in self.intervals:
+                continue
+            state = self.images.get(name)
+            if state is None:
+                next_at = now
+                if spread:
+                    # first checks are spread too, not all at once
+                    next_at += random.uniform(
+                        0, self.jitter * self.intervals[source])
+                state = ImageState(
+                    source=source,
+                    origin=origin,
+                    next_at=next_at)
+            images[name] = state._replace(source=source, origin=origin)
+        self.images = images
+
+    def _get_due_at(self, state: ImageState) -> float:
+        return max(
+            state.next_at,
+            self.origins.get(state.origin, OriginState()).retry_at)
+
+    def get_due(self, now: float) -> typing.List[str]:
+        '''
+        Returns the images to check now, those of the origins backing
+        off excepted.
+        :param now: The current time.
+        '''
+        return sorted(
+            name for name, state in self.images.items()
+            if self._get_due_at(state) <= now)
+
+    def record(self, results: typing.List[resolver.Result], now: float):
+        '''
+        Schedules the next checks of the images looked up. An origin whose
+        lookups failed is retried after a delay doubling on each failure,
+        its other images waiting for it.
+        :param results: The results of the lookups.
+        :param now: The current time.
+        '''
+        failed = {}
+        succeeded = set()
+        for result in results:
+            if result.version_from is None or \
+                    result.image_name not in self.images:
+                continue
+            state = self.images[result.image_name]
+            if result.error is not None:
+                failed.setdefault(state.origin, []).append(result.image_name)
+                continue
+
+            self.images[result.image_name] = state._replace(
+                next_at=now + self._spread(self.intervals[state.source]),
+                checked_at=now,
+                version=result.latest)
+            succeeded.add(state.origin)
+
+        for origin in succeeded - set(failed):
+            self.origins.pop(origin, None)
+
+        for origin, image_names in failed.items():
+            failures = self.origins.get(origin, OriginState()).failures + 1
+            delay = min(
+                self.backoff_min * 2 ** (failures - 1),
+                self.backoff_max)
+            retry_at = now + self._spread(delay)
+            LOGGER.warning('%s: %d failure(s), retrying in %ds',
+                           origin, failures, retry_at - now)
+            self.origins[origin] = OriginState(
+                failures=failures,
+                retry_at=retry_at)
+            for name in image_names:
+                self.images[name] = self.images[name]._replace(
+                    next_at=retry_at)
+
+    def get_next_at(self) -> typing.Optional[float]:
+        '''
+        Returns when the next check is due, None without scheduled image.
+        '''
+        return min(
+            (self._get_due_at(state) for state in self.images.values()),
+            default=None)
+
+
+def _get_source(
+        build_config: config.ImageBuildConfig
+        ) -> typing.Tuple[typing.Optional[str], typing.Optional[str]]:
+    '''
+    Returns the source type of the version of an image and the origin
+    queried for it: the GitHub API or Alpine mirrors, backed off
+    separately.
+    '''
+    tag_build = build_config.get_tag_build()
+    version_from = tag_build.version_from if tag_build else None
+    if version_from is None:
+        return None, None
+    if isinstance(version_from, config.VersionFromAlpine):
+        # the mirrors fail over to each other, they fail together
+        return version_from.type.value, ','.join(
+            alpine.get_mirrors(version_from))
+    return version_from.type.value, version_from.type.value
@@ -0,0 +1,301 @@
+import http.client
+import http.server
+import io
+import json
+import logging
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+import typing
+
+import default
+import tracing
+import util
+
+LOGGER = logging.getLogger(__name__)
+
+# commands change the process environment, they run one at a time
+_RUN_LOCK = threading.Lock()
+_STARTED_AT = time.time()
+_REQUESTS = [0]
+
+
+class Output(io.TextIOBase):
+    '''
+    Text stream sending what is written to the client of a request.
+    '''
+
+    def __init__(self, send: typing.Callable[[dict], None], name: str):
+        '''
+        :param send: Sends a message to the client.
+        :param name: The name of the stream, stdout or stderr.
+        '''
+        super().__init__()
+        self._send = send
+        self.name = name
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        if text:
+            self._send({'stream': self.name, 'data': text})
+        return len(text)
+
+
+class RequestHandler(http.server.BaseHTTPRequestHandler):
+    '''
+    Handles the requests of the API:
+      GET /v1/status
+      POST /v1/run {"argv": [...], "cwd": "...", "env": {...}}
+    Runs are answered with JSON lines: the output of the command as
+    {"stream": "stdout", "data": "..."} then {"exit": <code>}.
+    The API is only served on a unix socket only the user of the daemon
+    can connect to, the environment of its clients is thus trusted.
+    '''
+    server_version = 'jojo'
+
+    def address_string(self) -> str:
+        # unix sockets have no client address
+        return str(self.client_address or 'local')
+
+    def log_message(self, format: str, *args):
+        LOGGER.debug('%s: %s', self.address_string(), format % args)
+
+    def _send_json(self, code: int, body: typing.Any):
+        content = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        if self.path != '/v1/status':
+            self._send_json(404, {'error': 'not found'})
+            return
+
+        self._send_json(200, {
+            'pid': os.getpid(),
+            'uptime': time.time() - _STARTED_AT,
+            'requests': _REQUESTS[0],
+        })
+
+    def do_POST(self):
+        if self.path != '/v1/run':
+            self._send_json(404, {'error': 'not found'})
+            return
+
+        try:
+            # read before any answer, the client may still be sending it
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        except ValueError as err:
+            self._send_json(400, {'error': str(err)})
+            return
+
+        content_type = self.headers.get('Content-Type', '')
+        if content_type.split(';', 1)[0].strip() != 'application/json':
+            self._send_json(415, {'error': 'expected application/json'})
+            return
+
+        try:
+            body = json.loads(body)
+            argv = body['argv']
+            cwd = body.get('cwd') or os.getcwd()
+            env = body.get('env') or dict(os.environ)
+            if not all(isinstance(a, str) for a in argv) or \
+                    not argv or argv[0] not in default.Server.COMMANDS.value:
+                raise ValueError('command not one of ' + ', '.join(
+                    default.Server.COMMANDS.value))
+        except (ValueError, KeyError, TypeError) as err:
+            self._send_json(400, {'error': str(err)})
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.end_headers()
+
+        lock = threading.Lock()
+        connected = [True]
+
+        def send(message: dict):
+            with lock:
+                if not connected[0]:
+                    return
+                try:
+                    self.wfile.write(json.dumps(message).encode() + b'\n')
+                    self.wfile.flush()
+                except OSError:
+                    # the client left, the command goes on
+                    connected[0] = False
+
+        code = self.server.run(argv=argv, cwd=cwd, env=env, send=send)
+        send({'exit': code})
+
+
+class ServerMixin:
+    '''
+    Runs the commands of the requests one at a time in this process, so
+    that they share its warm caches: imports, HTTP sessions, parsed
+    buildfiles and Alpine indexes.
+    '''
+
+    def run(
+            self,
+            argv: typing.List[str],
+            cwd: str,
+            env: typing.Dict[str, str],
+            send: typing.Callable[[dict], None]) -> int:
+        '''
+        Runs a command as the CLI would, in the directory and environment
+        of the client, its output being sent to the client.
+        :param argv: The arguments of the command.
+        :param cwd: The working directory of the client.
+        :param env: The environment of the client.
+        :param send: Sends a message to the client.
+        :returns: The exit code of the command.
+        '''
+        # imported here, cli is the main module of the process
+        import cli
+
+        with _RUN_LOCK:
+            _REQUESTS[0] += 1
+            LOGGER.info('Running %s', ' '.join(argv))
+
+            root = logging.getLogger()
+            saved = (sys.stdout, sys.stderr, dict(os.environ), os.getcwd(),
+                     root.handlers[:], root.level)
+            stdout, stderr = Output(send, 'stdout'), Output(send, 'stderr')
+            handler = logging.StreamHandler(stderr)
+            handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+
+            try:
+                sys.stdout, sys.stderr = stdout, stderr
+                os.environ.clear()
+                os.environ.update(env)
+                os.chdir(cwd)
+                root.handlers = [handler]
+                return cli.run(argv)
+            except Exception as err:
+                LOGGER.exception('%s failed: %s', ' '.join(argv), err)
+                return 1
+            finally:
+                os.environ.clear()
+                os.environ.update(saved[2])
+                os.chdir(saved[3])
+                root.handlers = saved[4]
+                root.setLevel(saved[5])
+                sys.stdout, sys.stderr = saved[0], saved[1]
+                # the spans of a request are not those of the next one
+                tracing.disable()
+
+
+class UnixServer(
+        ServerMixin,
+        socketserver.ThreadingMixIn,
+        socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str):
+        '''
+        :param path: The path of the socket, only the user can use it.
+        '''
+        umask = os.umask(0o177)
+        try:
+            super().__init__(path, RequestHandler)
+        finally:
+            os.umask(umask)
+
+
+def _is_listening(path: str) -> bool:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except OSError:
+            return False
+    return True
+
+
+def serve(socket_path: str):
+    '''
+    Serves the API on a unix socket until interrupted.
+    :param socket_path: The path of the unix socket.
+    :raises: OSError
+    :raises: ValueError
+    '''
+    if os.path.exists(socket_path):
+        if _is_listening(socket_path):
+            raise ValueError(f'a daemon is already running: {socket_path}')
+        os.unlink(socket_path)
+    os.makedirs(os.path.dirname(socket_path) or '.', exist_ok=True)
+
+    server = UnixServer(socket_path)
+    LOGGER.info('Listening on %s', socket_path)
+
+    # stop as on ctrl-c, so that the socket is removed
+    util.interrupt_on_sigterm()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        LOGGER.info('Stopping')
+    finally:
+        server.server_close()
+        os.unlink(socket_path)
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    '''
+    HTTP connection over a unix socket.
+    '''
+
+    def __init__(self, path: str):
+        super().__init__('localhost')
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+
+
+def forward(socket_path: str, argv: typing.List[str]) -> typing.Optional[int]:
+    '''
+    Runs a command in the daemon, writing its output as it comes.
+    :param socket_path: The path of the daemon socket.
+    :param argv: The arguments of the command.
+    :returns: The exit code of the command, None when no daemon answered.
+    '''
+    connection = UnixHTTPConnection(socket_path)
+    try:
+        connection.request(
+            'POST',
+            '/v1/run',
+            body=json.dumps({
+                'argv': argv,
+                'cwd': os.getcwd(),
+                'env': dict(os.environ),
+            }),
+            headers={'Content-Type': 'application/json'})
+        response = connection.getresponse()
+    except OSError as err:
+        LOGGER.debug('No daemon on %s: %s', socket_path, err)
+        return None
+
+    if response.status != 200:
+        sys.stderr.write(f'jojo daemon: {response.read().decode()}\n')
+        return 2
+
+    with response:
+        for line in response:
+            message = json.loads(line)
+            if 'exit' in message:
+                return message['exit']
+            stream = sys.stderr if message['stream'] == 'stderr' \
+                else sys.stdout
+            stream.write(message['data'])
+            stream.flush()
+
+    sys.stderr.write('jojo daemon: connection lost\n')
+    return 1
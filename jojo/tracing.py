@@ -0,0 +1,126 @@
+from contextlib import contextmanager
+import json
+import os
+import threading
+import time
+import typing
+
+
+class Tracer:
+    '''
+    Records the spans of a run as Chrome trace events, to be loaded in
+    chrome://tracing or https://ui.perfetto.dev.
+    '''
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self._lock = threading.Lock()
+        self._events: typing.List[dict] = []
+        self._threads: typing.Dict[int, str] = {}
+
+    def add(
+            self,
+            name: str,
+            category: str,
+            start: float,
+            end: float,
+            args: typing.Optional[dict] = None):
+        '''
+        Records a complete event.
+        :param name: The name of the span.
+        :param category: The category of the span, e.g. subprocess.
+        :param start: The perf_counter value at the start of the span.
+        :param end: The perf_counter value at the end of the span.
+        :param args: Details shown with the span.
+        '''
+        thread = threading.current_thread()
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': (start - self.start) * 1e6,
+            'dur': (end - start) * 1e6,
+            'pid': os.getpid(),
+            'tid': thread.ident,
+            'args': args or {},
+        }
+        with self._lock:
+            self._events.append(event)
+            self._threads[thread.ident] = thread.name
+
+    def to_dict(self) -> dict:
+        '''
+        Returns the trace in the trace event format.
+        '''
+        with self._lock:
+            events = list(self._events)
+            threads = dict(self._threads)
+
+        metadata = [{
+            'name': 'thread_name',
+            'ph': 'M',
+            'pid': os.getpid(),
+            'tid': tid,
+            'args': {'name': name},
+        } for tid, name in threads.items()]
+
+        return {
+            'traceEvents': metadata + events,
+            'displayTimeUnit': 'ms',
+        }
+
+    def write(self, path: str):
+        '''
+        Writes the trace to a JSON file.
+        :param path: The path of the file.
+        '''
+        with open(path, 'w', encoding='utf-8') as fobj:
+            json.dump(self.to_dict(), fobj)
+
+
+_TRACER: typing.Optional[Tracer] = None
+
+
+def enable() -> Tracer:
+    '''
+    Starts recording spans, they are not recorded by default.
+    '''
+    global _TRACER
+    if _TRACER is None:
+        _TRACER = Tracer()
+    return _TRACER
+
+
+def disable():
+    '''
+    Stops recording spans and drops those recorded.
+    '''
+    global _TRACER
+    _TRACER = None
+
+
+def get_tracer() -> typing.Optional[Tracer]:
+    '''
+    Returns the process-wide tracer, None when tracing is disabled.
+    '''
+    return _TRACER
+
+
+@contextmanager
+def span(name: str, category: str = 'jojo', **args):
+    '''
+    Records the duration of the block as a span, when tracing is enabled.
+    :param name: The name of the span.
+    :param category: The category of the span, e.g. subprocess.
+    :param args: Details shown with the span.
+    '''
+    tracer = _TRACER
+    if tracer is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        tracer.add(name, category, start, time.perf_counter(), args)
@@ -1,13 +1,24 @@
 from contextlib import contextmanager
+import concurrent.futures
+import hashlib
 import os
 import importlib
+import json
 import logging
+import re
+import shutil
+import signal
+import stat as stat_module
+import tempfile
+import threading
 import typing
 
-import yaml
+import default
 
 LOGGER = logging.getLogger(__name__)
 
+DOCKERIGNORE_NAME = '.dockerignore'
+
 
 class Command(list):
     def add_arg(self, name: str):
@@ -62,6 +73,227 @@ def get_image_dir(path: str, image_name: str) -> str:
     return image_dir
 
 
+def read_dockerignore(path: str) -> typing.List[str]:
+    '''
+    Returns the exclude patterns of the .dockerignore of a build context.
+    :param path: The path of the build context.
+    '''
+    try:
+        with open(os.path.join(path, DOCKERIGNORE_NAME), 'r',
+                  encoding='utf-8') as fobj:
+            lines = [line.strip() for line in fobj]
+    except FileNotFoundError:
+        return []
+    return [line for line in lines if line and not line.startswith('#')]
+
+
+def _compile_pattern(pattern: str) -> typing.Pattern:
+    '''
+    Translates a .dockerignore pattern to a regex matching a relative path
+    and everything below it.
+    '''
+    pattern = os.path.normpath(pattern.strip('/'))
+    regex = ''
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith('**', i):
+            regex += '.*'
+            i += 2
+            if pattern.startswith('/', i):
+                regex = regex[:-2] + '(?:.*/)?'
+                i += 1
+            continue
+        if char == '*':
+            regex += '[^/]*'
+        elif char == '?':
+            regex += '[^/]'
+        elif char == '[':
+            end = pattern.find(']', i)
+            if end == -1:
+                regex += re.escape(char)
+            else:
+                char_class = pattern[i:end + 1]
+                if char_class.startswith('[!'):
+                    char_class = '[^' + char_class[2:]
+                regex += char_class
+                i = end
+        else:
+            regex += re.escape(char)
+        i += 1
+    return re.compile(f'^{regex}(?:/.*)?$')
+
+
+class ContextIgnore:
+    '''
+    Matches relative paths against .dockerignore patterns, the last
+    matching pattern wins and a leading ! re-includes a path.
+    '''
+
+    def __init__(self, patterns: typing.List[str]):
+        '''
+        :param patterns: The exclude patterns.
+        '''
+        self.rules = [
+            (_compile_pattern(p.lstrip('!')), p.startswith('!'))
+            for p in patterns
+        ]
+        self.has_exceptions = any(negate for _, negate in self.rules)
+
+    def is_excluded(self, rel_path: str) -> bool:
+        '''
+        :param rel_path: The path relative to the build context.
+        '''
+        excluded = False
+        for regex, negate in self.rules:
+            if regex.match(rel_path):
+                excluded = not negate
+        return excluded
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fobj:
+        for chunk in iter(lambda: fobj.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_context(
+        path: str,
+        excludes: typing.Optional[typing.List[str]] = None,
+        cache_dir: typing.Optional[str] = None,
+        jobs: typing.Optional[int] = None,
+        dry_run: bool = False) -> str:
+    '''
+    Returns a digest of the files of a build context, covering their
+    relative paths, modes and contents. Symlinked directories are
+    followed, the files of their targets are part of the context.
+    Files are hashed in parallel, and with a cache_dir the hash of each
+    file is kept along with its mtime, size and inode, so that unchanged
+    files are only stat'ed on the next call.
+    :param path: The path of the build context.
+    :param excludes: The exclude patterns, the .dockerignore by default.
+    :param cache_dir: The directory of the file hash cache.
+    :param jobs: The number of files hashed concurrently.
+    :param dry_run: Do not write the file hash cache.
+    '''
+    if excludes is None:
+        excludes = read_dockerignore(path)
+    ignore = ContextIgnore(excludes)
+
+    files = {}
+    # the directories above each one, a symlink to one of them is a loop
+    stat = os.stat(path)
+    parents = {path: {(stat.st_dev, stat.st_ino)}}
+    for root, dirs, names in os.walk(path, followlinks=True):
+        rel_root = os.path.relpath(root, path)
+        rel_root = '' if rel_root == '.' else rel_root + '/'
+        if not ignore.has_exceptions:
+            dirs[:] = [
+                d for d in dirs if not ignore.is_excluded(rel_root + d)]
+        walked = []
+        for name in dirs:
+            stat = os.stat(os.path.join(root, name))
+            key = (stat.st_dev, stat.st_ino)
+            if key in parents[root]:
+                LOGGER.warning('Symlink loop in the build context: %s',
+                               os.path.join(root, name))
+                continue
+            parents[os.path.join(root, name)] = parents[root] | {key}
+            walked.append(name)
+        dirs[:] = walked
+        for name in names:
+            rel_path = rel_root + name
+            if not ignore.is_excluded(rel_path):
+                files[rel_path] = os.lstat(os.path.join(root, name))
+
+    cache_path = None
+    cached = {}
+    cached_at = 0
+    if cache_dir:
+        cache_path = os.path.join(
+            cache_dir,
+            'context',
+            hashlib.sha256(os.path.abspath(path).encode()).hexdigest()
+            + '.json')
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as fobj:
+                cached_at = os.fstat(fobj.fileno()).st_mtime_ns
+                cached = json.load(fobj)
+        except (OSError, ValueError):
+            cached = {}
+
+    hashes = {}
+    to_hash = []
+    # files modified in the tick the cache was written in may have
+    # changed after they were hashed without changing their mtime
+    racy = False
+    for rel_path, stat in files.items():
+        signature = [stat.st_mtime_ns, stat.st_size, stat.st_ino]
+        entry = cached.get(rel_path)
+        if stat_module.S_ISLNK(stat.st_mode):
+            hashes[rel_path] = os.readlink(os.path.join(path, rel_path))
+        elif entry and entry[:3] == signature and \
+                stat.st_mtime_ns < cached_at:
+            hashes[rel_path] = entry[3]
+        else:
+            racy = racy or bool(entry and entry[:3] == signature)
+            to_hash.append(rel_path)
+
+    if to_hash:
+        jobs = jobs or min(32, (os.cpu_count() or 1) + 4)
+        # one task per chunk of files, small files are not worth a task
+        size = max(1, len(to_hash) // (jobs * 4))
+        chunks = [to_hash[i:i + size] for i in range(0, len(to_hash), size)]
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=jobs) as executor:
+            for chunk, results in zip(chunks, executor.map(
+                    lambda c: [_hash_file(os.path.join(path, r)) for r in c],
+                    chunks)):
+                hashes.update(zip(chunk, results))
+
+    if cache_path and not dry_run:
+        # symlinks are not cached, their target is read every time
+        entries = {
+            rel_path: [
+                stat.st_mtime_ns, stat.st_size, stat.st_ino, hashes[rel_path]]
+            for rel_path, stat in files.items()
+            if not stat_module.S_ISLNK(stat.st_mode)
+        }
+        # rewritten for the racy files, they are then older than the cache
+        if entries != cached or racy:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            write_atomic(cache_path, json.dumps(entries))
+
+    digest = hashlib.sha256()
+    for rel_path in sorted(files):
+        digest.update(b'%s\0%o\0%s\0' % (
+            rel_path.encode(),
+            files[rel_path].st_mode,
+            hashes[rel_path].encode()))
+    return digest.hexdigest()
+
+
+def get_image_names(path: str) -> typing.List[str]:
+    '''
+    Returns the sorted names of the image directories containing a buildfile.
+    :param path: The path of the images directory.
+    '''
+    if not os.path.isdir(path):
+        raise ValueError(f'images directory does not exist: {path}')
+
+    names = []
+    for entry in os.scandir(path):
+        buildfile = os.path.join(
+            entry.path,
+            default.Config.BUILDFILE_NAME.value)
+        if entry.is_dir() and os.path.isfile(buildfile):
+            names.append(entry.name)
+
+    return sorted(names)
+
+
 def set_image_tag_latest(image: str) -> str:
     '''
     Set the image tag to latest.
@@ -76,9 +308,14 @@ def load_yaml(path: str) -> typing.Any:
     Load file and read yaml.
     :param path: The path of the yaml file.
     '''
+    import yaml
+
+    # the libyaml loader is much faster, when PyYAML was built with it
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
     try:
         with open(path, 'r', encoding='utf-8') as fobj:
-            content = yaml.safe_load(fobj)
+            content = yaml.load(fobj, Loader=loader)
         return content
     except IOError as io_err:
         LOGGER.error('I/O error: %s', io_err)
@@ -86,6 +323,46 @@ def load_yaml(path: str) -> typing.Any:
         LOGGER.error('Error in yaml file: %s', yaml_err)
 
 
+def write_atomic(path: str, content: typing.Union[str, bytes]):
+    '''
+    Writes a file through a temporary file renamed over the path, so that
+    readers never see a partially written file.
+    :param path: The path of the file.
+    :param content: The content of the file.
+    '''
+    mode = 'wb' if isinstance(content, bytes) else 'w'
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(
+        dir=directory,
+        prefix=f'.{os.path.basename(path)}.')
+    try:
+        with os.fdopen(fd, mode) as fobj:
+            fobj.write(content)
+        try:
+            shutil.copymode(path, tmp_path)
+        except FileNotFoundError:
+            os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def strtobool(value: str) -> bool:
+    '''
+    Converts a string representation of truth to a boolean, as the
+    removed distutils.util.strtobool.
+    :param value: The value, e.g. y, yes, true, on, 1, n, no, false...
+    :raises: ValueError
+    '''
+    value = value.strip().lower()
+    if value in ('y', 'yes', 't', 'true', 'on', '1'):
+        return True
+    if value in ('n', 'no', 'f', 'false', 'off', '0'):
+        return False
+    raise ValueError(f'invalid truth value: {value}')
+
+
 def get_class(package: str, module: str, name: str) -> typing.Any:
     '''
     Returns a class.
@@ -102,6 +379,20 @@ def get_class(package: str, module: str, name: str) -> typing.Any:
     return cls
 
 
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def interrupt_on_sigterm():
+    '''
+    Makes SIGTERM stop the process as ctrl-c does, so that what is done on
+    KeyboardInterrupt is also done when a service manager stops it. Only
+    the main thread can set it, e.g. not the threads of the daemon.
+    '''
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, _interrupt)
+
+
 @contextmanager
 def pushd(path: str):
     '''
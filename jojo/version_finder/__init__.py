@@ -1,11 +1,16 @@
 import abc
 import typing
 
+from version_finder import semver
+
 
 class FindVersion(abc.ABC):
     '''
     Base class for package version finding.
     '''
+    # maximum number of concurrent batches against the source
+    CONCURRENCY = 4
+
     @abc.abstractmethod
     def get_all(self, first_versions: int) -> 'Versions':
         raise NotImplementedError()
@@ -14,6 +19,46 @@ class FindVersion(abc.ABC):
     def get_latest(self, first_versions: int) -> 'Versions':
         raise NotImplementedError()
 
+    @classmethod
+    def get_all_batch(
+            cls,
+            version_froms: typing.List[typing.Any],
+            first_versions: int) -> typing.List['Versions']:
+        '''
+        Returns the versions for several sources, in the same order.
+        Finders override it when sources can share requests.
+        '''
+        return [
+            cls(version_from=version_from).get_all(
+                first_versions=first_versions)
+            for version_from in version_froms
+        ]
+
+    @classmethod
+    def get_latest_batch(
+            cls,
+            version_froms: typing.List[typing.Any],
+            first_versions: int) -> typing.List[typing.Optional[str]]:
+        '''
+        Returns the latest version for several sources, in the same order.
+        '''
+        return [
+            cls(version_from=version_from).get_latest(
+                first_versions=first_versions)
+            for version_from in version_froms
+        ]
+
+    @classmethod
+    def group(
+            cls,
+            version_froms: typing.List[typing.Any]
+            ) -> typing.List[typing.List[int]]:
+        '''
+        Returns the positions of the sources to pass together to
+        get_all_batch, one list per batch.
+        '''
+        return [[i] for i in range(len(version_froms))]
+
 
 class Versions(typing.NamedTuple):
     '''
@@ -22,3 +67,18 @@ class Versions(typing.NamedTuple):
     stable: typing.Optional[typing.List[str]]
     unstable: typing.Optional[typing.List[str]]
     match: typing.Optional[str]
+
+
+def match(versions: Versions, spec: typing.Optional[str]) -> Versions:
+    '''
+    Returns the versions with match set to the highest version satisfying
+    the semver constraint, unchanged when there is no constraint.
+    :param versions: The versions found.
+    :param spec: The constraint, e.g. latest-stable, <=1.8, ~1.2, ^2.
+    :raises: ValueError
+    '''
+    if not spec:
+        return versions
+
+    return versions._replace(
+        match=semver.resolve(spec, versions.stable, versions.unstable))
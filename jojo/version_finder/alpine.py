@@ -1,98 +1,429 @@
-import collections
 import dataclasses
-import urllib.request
+import itertools
+import zlib
+import logging
+import os
+import queue
 import tarfile
+import threading
+import time
 import typing
 from io import BytesIO
 
 import version_finder
+import cache
 import config
+import default
+import tracing
 import util
 
 APKINDEX_FILENAME = 'APKINDEX.tar.gz'
+APKINDEX_MEMBER = 'APKINDEX'
+# raised by the parsing of a truncated or corrupted APKINDEX.tar.gz
+PARSE_ERRORS = (EOFError, OSError, tarfile.TarError, zlib.error)
+LOGGER = logging.getLogger(__name__)
 
 
 @dataclasses.dataclass
 class Alpine(version_finder.FindVersion):
     version_from: config.VersionFromAlpine
 
+    CONCURRENCY = default.Alpine.CONCURRENCY.value
+
     def __post_init__(self):
         self.repo = self.version_from.repository
         self.version_id = self.version_from.version_id
         self.arch = self.version_from.arch
-        self.mirror = self.version_from.mirror
+        self.mirrors = get_mirrors(self.version_from)
 
         if not self.version_id.startswith('v'):
             self.version_id = 'v' + self.version_id
 
     @property
     def apkindex_url(self) -> str:
-        # http://dl-cdn.alpinelinux.org/alpine/v3.12/main/x86_64/APKINDEX.tar.gz
-        return util.urljoin(
-            self.mirror,
-            self.version_from.type.value,
-            self.version_id,
-            self.repo,
-            self.arch,
-            APKINDEX_FILENAME,
-        )
-
-    def _fetch_apkindex(self):
-        # TODO add to utils with try/error
-        response = urllib.request.urlopen(self.apkindex_url)
-        return response.read()
-
-    def _parse_apkindex(self, lines, start):
-        pkg_ver = {}
-        for i in range(start[0], len(lines)):
-            # Check for empty line
-            start[0] = i + 1
-            line = lines[i]
-            if not isinstance(line, str):
-                line = line.decode()
-            if line == '\n':
-                break
+        return self.index.url
 
-            if line.startswith('P:'):
-                package = line.split(':')[1].rstrip('\n')
-                pkg_ver['package'] = package
+    @property
+    def index(self) -> 'AlpineIndex':
+        return get_index(
+            mirrors=self.mirrors,
+            version_id=self.version_id,
+            repository=self.repo,
+            arch=self.arch)
 
-            if line.startswith('V:'):
-                version = line.split(':')[1].rstrip('\n')
-                pkg_ver['version'] = version
+    def get_all(self, first_versions: int) -> version_finder.Versions:
+        _ = first_versions
+        package = self.version_from.package
+        return version_finder.match(
+            self.index.get_all([package])[package],
+            self.version_from.semver)
 
-        return pkg_ver
+    def get_latest(self, first_versions: int) -> typing.Any:
+        versions = self.get_all(first_versions=first_versions)
+        if self.version_from.semver:
+            return versions.match
+        return versions.stable[0] if versions.stable else None
 
-    def _parse(self):
-        apkindex = self._fetch_apkindex()
-        fobj = BytesIO(apkindex)
-        with tarfile.open(fileobj=fobj, mode='r:gz') as tar:
-            with tar.extractfile(tar.getmember('APKINDEX')) as handle:
-                lines = handle.readlines()
+    @classmethod
+    def group(
+            cls,
+            version_froms: typing.List[config.VersionFromAlpine]
+            ) -> typing.List[typing.List[int]]:
+        '''
+        Groups the packages by index, so each index is only fetched once.
+        '''
+        groups: typing.Dict[str, typing.List[int]] = {}
+        for i, version_from in enumerate(version_froms):
+            url = cls(version_from=version_from).apkindex_url
+            groups.setdefault(url, []).append(i)
+        return list(groups.values())
 
-        packages = collections.OrderedDict()
-        start = [0]
-        while True:
-            block = self._parse_apkindex(lines, start)
-            if not block:
-                break
-            packages[block['package']] = block['version']
 
-        return packages
+class AlpineIndex:
+    '''
+    Packages of an APKINDEX, fetched once and parsed on demand.
+    Lookups only parse the index up to the last package asked for, later
+    lookups resume where the previous one stopped.
+    '''
 
-    def get_all(self, first_versions: int) -> version_finder.Versions:
-        _ = first_versions
-        packages = self._parse()
-        stable = []
-        if self.version_from.package in packages:
+    def __init__(self, mirrors: typing.List[str], path: str):
+        '''
+        :param mirrors: The urls of the mirrors serving the index.
+        :param path: The path of the APKINDEX.tar.gz on the mirrors.
+        '''
+        self.mirrors = list(mirrors)
+        self.path = path
+        self.created_at = time.time()
+        self._lock = threading.Lock()
+        self._packages: typing.Dict[str, str] = {}
+        self._iterator: typing.Optional[typing.Iterator] = None
+        self._complete = False
+        # the mirror of the index being parsed, those whose index was
+        # unusable
+        self._mirror: typing.Optional[str] = None
+        self._broken: typing.Set[str] = set()
+
+    @property
+    def url(self) -> str:
+        '''
+        The url of the index on the first mirror.
+        '''
+        return util.urljoin(self.mirrors[0], self.path)
+
+    def _fetch(self) -> bytes:
+        '''
+        Fetches the index from the fastest mirror, failing over to the
+        next ones on errors and timeouts.
+        :raises: OSError
+        :raises: http.client.HTTPException
+        '''
+        import http.client
+
+        error: typing.Optional[Exception] = None
+        for mirror in rank_mirrors(self.mirrors, self.path):
+            if mirror in self._broken:
+                continue
+            url = util.urljoin(mirror, self.path)
+            try:
+                with tracing.span('fetch APKINDEX', 'alpine', url=url):
+                    data = cache.get_http_cache().fetch(
+                        url,
+                        timeout=default.Alpine.FETCH_TIMEOUT.value)
+                self._mirror = mirror
+                return data
+            except (OSError, http.client.HTTPException) as err:
+                LOGGER.warning('Unable to fetch %s: %s', url, err)
+                _set_failed(mirror)
+                error = err
+        raise error or OSError(f'no usable index: {self.path}')
+
+    def _parse(self, package: str) -> typing.Optional[str]:
+        '''
+        Parses the fetched index up to a package.
+        '''
+        try:
+            with tracing.span('parse APKINDEX', 'alpine', package=package):
+                for name, version in self._iterator:
+                    self._packages[name] = version
+                    if name == package:
+                        return version
+        except BaseException:
+            # the generator is closed, the index is parsed again next time
+            self._iterator = None
+            raise
+
+        self._iterator = None
+        self._complete = True
+        return None
+
+    def get(self, package: str) -> typing.Optional[str]:
+        '''
+        Returns the version of a package, None if it is not in the index.
+        :param package: The name of the package.
+        '''
+        with self._lock:
+            if package in self._packages or self._complete:
+                return self._packages.get(package)
+
+            while True:
+                if self._iterator is None:
+                    self._iterator = iter_apkindex(BytesIO(self._fetch()))
+                try:
+                    return self._parse(package)
+                except PARSE_ERRORS as err:
+                    # e.g. truncated, it is not used again, the next
+                    # mirror is tried
+                    url = util.urljoin(self._mirror, self.path)
+                    LOGGER.warning('Unable to parse %s: %s', url, err)
+                    cache.get_http_cache().discard(url)
+                    _set_failed(self._mirror)
+                    self._broken.add(self._mirror)
+
+    def get_all(
+            self,
+            packages: typing.Iterable[str]
+            ) -> typing.Dict[str, version_finder.Versions]:
+        '''
+        Returns the versions of packages, by package name.
+        :param packages: The names of the packages.
+        '''
+        results = {}
+        for package in packages:
+            version = self.get(package)
             # there is only one package per repo
-            stable = [packages[self.version_from.package]]
+            results[package] = version_finder.Versions(
+                stable=[version] if version is not None else [],
+                unstable=None,
+                match=None)
+        return results
 
-        return version_finder.Versions(
-            stable=stable,
-            unstable=None,
-            match=None)
+    def get_latest(
+            self,
+            packages: typing.Iterable[str]
+            ) -> typing.Dict[str, typing.Optional[str]]:
+        '''
+        Returns the latest version of packages, by package name.
+        :param packages: The names of the packages.
+        '''
+        return {package: self.get(package) for package in packages}
 
-    def get_latest(self, first_versions: int) -> typing.Any:
-        versions = self.get_all(first_versions=first_versions)
-        return versions.stable[0]
+
+def get_mirrors(version_from: config.VersionFromAlpine) -> typing.List[str]:
+    '''
+    Returns the mirrors of an Alpine source: its mirror, its other
+    mirrors, then those of JOJO_ALPINE_MIRRORS, separated by commas.
+    :param version_from: The version source configuration.
+    '''
+    mirrors = [version_from.mirror or default.Alpine.MIRROR.value]
+    mirrors += version_from.mirrors or []
+    mirrors += os.environ.get(
+        default.EnvVar.ALPINE_MIRRORS.value, '').split(',')
+    return list(dict.fromkeys(m.strip() for m in mirrors if m.strip()))
+
+
+_PROBE_LOCK = threading.Lock()
+
+
+def _probe(url: str, timeout: float) -> typing.Optional[float]:
+    '''
+    Returns the seconds a HEAD request on the url takes, None on errors.
+    '''
+    import http.client
+    import urllib.request
+
+    start = time.perf_counter()
+    try:
+        request = urllib.request.Request(url, method='HEAD')
+        with urllib.request.urlopen(request, timeout=timeout):
+            pass
+    except (OSError, http.client.HTTPException) as err:
+        LOGGER.debug('Probe of %s failed: %s', url, err)
+        return None
+    return time.perf_counter() - start
+
+
+def _set_latency(mirror: str, latency: float):
+    cache.get_json_cache().set('alpine-mirror', mirror, {'latency': latency})
+
+
+def _set_failed(mirror: str):
+    '''
+    Marks a mirror as failing, its last measured latency is kept for when
+    it is tried again.
+    '''
+    json_cache = cache.get_json_cache()
+    entry = json_cache.get('alpine-mirror', mirror) or {}
+    json_cache.set('alpine-mirror', mirror, {
+        'latency': entry.get('latency'),
+        'failed_at': time.time(),
+    })
+
+
+def _get_latency(
+        entry: typing.Optional[dict],
+        now: float,
+        retry_delay: float) -> typing.Tuple[bool, typing.Optional[float]]:
+    '''
+    Returns whether the latency of a mirror is known and the latency, None
+    for a mirror that failed recently. A mirror that failed earlier is
+    ranked by its last latency, or probed again without one.
+    '''
+    if entry is None:
+        return False, None
+    failed_at = entry.get('failed_at')
+    if failed_at is not None and now - failed_at < retry_delay:
+        return True, None
+    latency = entry.get('latency')
+    return latency is not None, latency
+
+
+def rank_mirrors(
+        mirrors: typing.List[str],
+        path: str,
+        timeout: float = default.Alpine.PROBE_TIMEOUT.value,
+        retry_delay: float = default.Alpine.RETRY_DELAY.value
+        ) -> typing.List[str]:
+    '''
+    Returns the mirrors from the fastest to the slowest, the failing ones
+    last. The latencies are measured with concurrent HEAD requests on the
+    path and kept in the cache for its TTL, a mirror failing meanwhile is
+    moved last for retry_delay seconds only. Only the first healthy answer
+    is waited for, the slower mirrors are ranked after it while they are
+    still being probed.
+    :param mirrors: The urls of the mirrors.
+    :param path: The path of a file every mirror serves.
+    :param timeout: Seconds after which a mirror is considered failing.
+    :param retry_delay: Seconds a failing mirror is ranked last.
+    '''
+    if len(mirrors) < 2:
+        return list(mirrors)
+
+    json_cache = cache.get_json_cache()
+    # one probe at a time, the others then find the latencies cached
+    with _PROBE_LOCK:
+        latencies = {}
+        now = time.time()
+        for mirror in mirrors:
+            known, latency = _get_latency(
+                json_cache.get('alpine-mirror', mirror), now, retry_delay)
+            if known:
+                latencies[mirror] = latency
+
+        missing = [m for m in mirrors if m not in latencies]
+        probed: queue.Queue = queue.Queue()
+
+        def probe(mirror: str):
+            latency = _probe(util.urljoin(mirror, path), timeout)
+            LOGGER.debug('Mirror %s: latency %s', mirror, latency)
+            if latency is None:
+                _set_failed(mirror)
+            else:
+                _set_latency(mirror, latency)
+            probed.put((mirror, latency))
+
+        # daemon threads, a hanging mirror does not delay the exit
+        for mirror in missing:
+            threading.Thread(
+                target=probe,
+                args=(mirror,),
+                name='jojo-probe',
+                daemon=True).start()
+
+        # nothing to wait for when a healthy mirror is known already
+        healthy = any(latency is not None for latency in latencies.values())
+        with tracing.span('probe mirrors', 'alpine', mirrors=missing):
+            for _ in [] if healthy else missing:
+                mirror, latency = probed.get()
+                latencies[mirror] = latency
+                if latency is not None:
+                    break
+
+    # unknown latencies are slower than the measured ones, sorted is
+    # stable so equal mirrors keep their configured order
+    def rank(mirror: str) -> typing.Tuple[int, float]:
+        if mirror not in latencies:
+            return 1, 0
+        if latencies[mirror] is None:
+            return 2, 0
+        return 0, latencies[mirror]
+
+    return sorted(mirrors, key=rank)
+
+
+_INDEXES: typing.Dict[
+    typing.Tuple[typing.Tuple[str, ...], str, str, str], AlpineIndex] = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def get_index(
+        mirrors: typing.List[str],
+        version_id: str,
+        repository: str,
+        arch: str) -> AlpineIndex:
+    '''
+    Returns the process-wide index of an Alpine repository.
+    :param mirrors: The urls of the mirrors.
+    :param version_id: The Alpine branch, e.g. v3.12.
+    :param repository: The repository, e.g. main.
+    :param arch: The architecture, e.g. x86_64.
+    '''
+    key = (tuple(mirrors), version_id, repository, arch)
+    ttl = cache.get_http_cache().ttl
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(key)
+        # long running processes refresh the index as the HTTP cache does
+        if index is None or time.time() - index.created_at >= ttl:
+            # http://dl-cdn.alpinelinux.org/alpine/v3.12/main/x86_64/APKINDEX.tar.gz
+            _INDEXES[key] = AlpineIndex(mirrors=mirrors, path=util.urljoin(
+                config.SourceType.ALPINE.value,
+                version_id,
+                repository,
+                arch,
+                APKINDEX_FILENAME,
+            ))
+        return _INDEXES[key]
+
+
+def iter_apkindex(
+        fileobj: typing.BinaryIO,
+        packages: typing.Optional[typing.Iterable[str]] = None
+        ) -> typing.Iterator[typing.Tuple[str, str]]:
+    '''
+    Yields the (package, version) pairs of an APKINDEX.tar.gz.
+    The index is decompressed as it is read and only the P: and V: fields
+    are decoded. When packages are given, only those are yielded and
+    reading stops as soon as all of them were found.
+    :param fileobj: The APKINDEX.tar.gz file object.
+    :param packages: The names of the packages to look for.
+    '''
+    wanted = None
+    if packages is not None:
+        wanted = {p.encode() for p in packages}
+        if not wanted:
+            return
+
+    with tarfile.open(fileobj=fileobj, mode='r:gz') as tar:
+        for member in tar:
+            if member.name == APKINDEX_MEMBER:
+                break
+        else:
+            return
+
+        with tar.extractfile(member) as handle:
+            package = version = None
+            # an empty line ends a package block, so does the end of file
+            for line in itertools.chain(handle, (b'\n',)):
+                field = line[:2]
+                if field == b'P:':
+                    package = line[2:].rstrip(b'\n')
+                elif field == b'V:':
+                    version = line[2:].rstrip(b'\n')
+                elif line == b'\n':
+                    if package is not None and version is not None and (
+                            wanted is None or package in wanted):
+                        yield package.decode(), version.decode()
+                        if wanted is not None:
+                            wanted.discard(package)
+                            if not wanted:
+                                return
+                    package = version = None
@@ -1,25 +1,126 @@
 import dataclasses
+import datetime
 import logging
 import os
+import threading
+import time
 import typing
 
 import requests
 
+import cache
 import util
 import config
 import default
+import tracing
 import version_finder
 
 GITHUB_GRAPHQL_API = 'https://api.github.com/graphql'
+GITHUB_PAGE_SIZE_MAX = 100
 LOGGER = logging.getLogger(__name__)
 
+RELEASES_FRAGMENT = '''
+fragment releases on Repository {
+  releases(first: $first, after: $after, orderBy: {field: CREATED_AT, direction: DESC}) {
+    nodes {
+      tagName
+      isPrerelease
+    }
+    pageInfo {
+      endCursor
+      hasNextPage
+    }
+  }
+}
+'''  # noqa: E501
+
+RATE_LIMIT_FIELDS = '''
+  rateLimit {
+    cost
+    remaining
+    resetAt
+  }
+'''
+
+
+class RateLimit(typing.NamedTuple):
+    '''
+    GraphQL rate limit status, as returned by the last query.
+    '''
+    cost: int
+    remaining: int
+    reset_at: datetime.datetime
+
+
+_SESSION: typing.Optional[requests.Session] = None
+_SESSION_LOCK = threading.Lock()
+_RATE_LIMIT: typing.Optional[RateLimit] = None
+_RATE_LIMIT_LOCK = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    '''
+    Returns the process-wide HTTP session, so connections are reused.
+    '''
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            _SESSION = requests.Session()
+        return _SESSION
+
+
+def get_rate_limit() -> typing.Optional[RateLimit]:
+    '''
+    Returns the rate limit status of the last query, None before any.
+    '''
+    return _RATE_LIMIT
+
+
+def _update_rate_limit(results: typing.Any):
+    global _RATE_LIMIT
+    rate_limit = ((results or {}).get('data') or {}).get('rateLimit')
+    if not rate_limit:
+        return
+
+    reset_at = datetime.datetime.fromisoformat(
+        rate_limit['resetAt'].replace('Z', '+00:00'))
+    with _RATE_LIMIT_LOCK:
+        _RATE_LIMIT = RateLimit(
+            cost=rate_limit['cost'],
+            remaining=rate_limit['remaining'],
+            reset_at=reset_at)
+    LOGGER.debug('GitHub rate limit: %s', _RATE_LIMIT)
+
+
+def wait_for_rate_limit(
+        reserve: int = default.GITHUB_RATE_LIMIT_RESERVE):
+    '''
+    Sleeps until the rate limit resets when the remaining budget is not
+    above the reserve, so batches slow down instead of being throttled.
+    :param reserve: Points of the budget kept unused.
+    '''
+    rate_limit = get_rate_limit()
+    if rate_limit is None or rate_limit.remaining > reserve:
+        return
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    delay = (rate_limit.reset_at - now).total_seconds()
+    if delay > 0:
+        LOGGER.warning(
+            'GitHub rate limit almost exhausted (%s remaining), '
+            'waiting %ds until %s',
+            rate_limit.remaining, delay, rate_limit.reset_at.isoformat())
+        time.sleep(delay)
+
 
 @dataclasses.dataclass
 class Github(version_finder.FindVersion):
     version_from: config.VersionFromGithub
 
+    CONCURRENCY = default.Github.CONCURRENCY.value
+
     def __post_init__(self):
-        self.http = requests.Session()
+        self.http = get_session()
         self.headers = self._define_headers()
 
     @staticmethod
@@ -30,39 +131,79 @@ class Github(version_finder.FindVersion):
 
     def _query(self, query=None, variables=None):
         '''
-        Execute a GraphQL query.
+        Execute a GraphQL query, waiting for the rate limit to reset when
+        it is exhausted, a few times at most.
+        :raises: SystemExit
         '''
-        try:
-            request = self.http.post(
-                GITHUB_GRAPHQL_API,
-                json={'query': query, 'variables': variables},
-                headers=self.headers)
-            request.raise_for_status()
-            return request.json()
-        except(ConnectionError, requests.HTTPError, requests.Timeout) as err:
-            LOGGER.error('connection failed: %s', err)
+        attempts = default.Github.RATE_LIMIT_ATTEMPTS.value
+        for attempt in range(1, attempts + 1):
+            wait_for_rate_limit()
+            try:
+                with tracing.span('query', 'github', variables=variables):
+                    request = self.http.post(
+                        GITHUB_GRAPHQL_API,
+                        json={'query': query, 'variables': variables},
+                        headers=self.headers)
+                    request.raise_for_status()
+                    results = request.json()
+            except (ConnectionError, requests.HTTPError,
+                    requests.Timeout) as err:
+                LOGGER.error('connection failed: %s', err)
+                return None
+
+            _update_rate_limit(results)
+
+            errors = results.get('errors') or []
+            if not any(e.get('type') == 'RATE_LIMITED' for e in errors):
+                return results
+            if attempt == attempts:
+                break
+
+            reset = request.headers.get('X-RateLimit-Reset')
+            delay = max(
+                int(reset) - time.time() if reset else 0,
+                default.Github.RATE_LIMIT_BACKOFF_MIN.value * attempt)
+            LOGGER.warning('GitHub rate limit exhausted, waiting %ds '
+                           '(attempt %d of %d)', delay, attempt, attempts)
+            time.sleep(delay)
+
+        raise SystemExit(
+            f'GitHub rate limit still exhausted after {attempts} attempts')
+
+    def _get_releases(
+            self,
+            first_versions: int,
+            after: typing.Optional[str] = None) -> typing.Any:
+        '''
+        Returns a page of releases of the repository, None if the
+        repository does not exist.
+        :param first_versions: The size of the page.
+        :param after: The cursor of the end of the previous page.
+        '''
+        key = self._cache_key(self.version_from, first_versions, after)
+        repository = cache.get_json_cache().get('github', key)
+        if repository is not None:
+            return repository
 
-    def _get_releases(self, first_versions: int) -> typing.Any:
         query = '''
-        query($owner: String!, $repo: String!, $first: Int!) {
+        query($owner: String!, $repo: String!, $first: Int!, $after: String) {
           repository(name: $repo, owner: $owner) {
-            releases(first: $first, orderBy: {field: CREATED_AT, direction: DESC}) {
-              nodes {
-                tagName
-                isPrerelease
-              }
-            }
+            ...releases
           }
+        ''' + RATE_LIMIT_FIELDS + '''
         }
-        '''  # noqa: E501
+        ''' + RELEASES_FRAGMENT
 
         variables = {
             'owner': self.version_from.owner,
             'repo': self.version_from.repository,
             'first': int(first_versions),
+            'after': after,
         }
 
         results = self._query(query=query, variables=variables)
+        if results is None:
+            raise SystemExit('GitHub query failed')
 
         if 'errors' in results:
             errors = results['errors']
@@ -70,20 +211,286 @@ class Github(version_finder.FindVersion):
                 LOGGER.error(err)
             raise SystemExit(errors)
 
-        return results
+        repository = results['data']['repository']
+        if repository:
+            cache.get_json_cache().set('github', key, repository)
+        return repository
 
-    def get_all(self, first_versions: int) -> version_finder.Versions:
-        results = self._get_releases(first_versions=first_versions)
-        if results['data']['repository']:
-            releases = results['data']['repository']['releases']['nodes']
-            stable = [r['tagName'] for r in releases if not r['isPrerelease']]
-            unstable = [r['tagName'] for r in releases if r['isPrerelease']]
+    def _get_releases_batch(
+            self,
+            version_froms: typing.List[config.VersionFromGithub],
+            first_versions: int) -> typing.Dict[str, typing.Any]:
+        '''
+        Queries the first page of releases of several repositories in one
+        request, each repository under its own alias.
+        :returns: The repository data, by alias.
+        '''
+        definitions = ['$first: Int!', '$after: String']
+        fields = []
+        variables = {'first': int(first_versions), 'after': None}
+        for i, version_from in enumerate(version_froms):
+            definitions.append(f'$owner{i}: String!, $repo{i}: String!')
+            fields.append(
+                f'r{i}: repository(name: $repo{i}, owner: $owner{i}) '
+                '{ ...releases }')
+            variables[f'owner{i}'] = version_from.owner
+            variables[f'repo{i}'] = version_from.repository
+
+        query = 'query({}) {{\n  {}\n{}}}\n'.format(
+            ', '.join(definitions),
+            '\n  '.join(fields),
+            RATE_LIMIT_FIELDS) + RELEASES_FRAGMENT
+
+        results = self._query(query=query, variables=variables)
+        if results is None:
+            raise SystemExit('GitHub query failed')
+
+        # a missing repository only fails its own alias
+        errors = [e for e in results.get('errors', []) if not e.get('path')]
+        for err in results.get('errors', []):
+            LOGGER.error(err)
+        if errors:
+            raise SystemExit(errors)
+
+        return results.get('data') or {}
+
+    @classmethod
+    def _get_first_pages(
+            cls,
+            version_froms: typing.List[config.VersionFromGithub],
+            first_versions: int,
+            batch_size: int
+            ) -> typing.Dict[typing.Tuple[str, str], typing.Any]:
+        '''
+        Returns the first page of releases of several repositories,
+        querying up to batch_size repositories per GraphQL request.
+        :returns: The repository data, by (owner, repository).
+        '''
+        pages = {}
+        missing = []
+        for owner, repository in dict.fromkeys(
+                (v.owner, v.repository) for v in version_froms):
+            version_from = config.VersionFromGithub(
+                owner=owner,
+                repository=repository)
+            pages[(owner, repository)] = cache.get_json_cache().get(
+                'github',
+                cls._cache_key(version_from, first_versions))
+            if pages[(owner, repository)] is None:
+                missing.append(version_from)
+
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            data = cls(version_from=batch[0])._get_releases_batch(
+                version_froms=batch,
+                first_versions=first_versions)
+            for i, version_from in enumerate(batch):
+                repository = data.get(f'r{i}')
+                if repository:
+                    cache.get_json_cache().set(
+                        'github',
+                        cls._cache_key(version_from, first_versions),
+                        repository)
+                pages[(version_from.owner, version_from.repository)] = \
+                    repository
+
+        return pages
+
+    @staticmethod
+    def _iter_page(
+            repository: typing.Any
+            ) -> typing.Tuple[typing.List[dict], typing.Optional[str]]:
+        '''
+        Returns the releases of a page and the cursor of the next page,
+        None when it is the last one.
+        '''
+        if not repository:
+            return [], None
+
+        releases = repository['releases']
+        page_info = releases.get('pageInfo') or {}
+        cursor = None
+        if page_info.get('hasNextPage'):
+            cursor = page_info.get('endCursor')
+        return releases['nodes'], cursor
+
+    def iter_releases(
+            self,
+            page_size: int,
+            limit: typing.Optional[int] = None,
+            after: typing.Optional[str] = None
+            ) -> typing.Iterator[dict]:
+        '''
+        Yields the releases of the repository, from new to old, fetching
+        pages lazily so that callers can stop early.
+        :param page_size: The number of releases per page, up to 100.
+        :param limit: The maximum number of releases to yield.
+        :param after: The cursor to start after.
+        '''
+        page_size = min(int(page_size), GITHUB_PAGE_SIZE_MAX)
+        count = 0
+        while True:
+            first = page_size
+            if limit is not None:
+                first = min(page_size, int(limit) - count)
+            if first <= 0:
+                return
+
+            nodes, after = self._iter_page(
+                self._get_releases(first_versions=first, after=after))
+            for node in nodes:
+                yield node
+            count += len(nodes)
+
+            if after is None:
+                return
+
+    @staticmethod
+    def _to_versions(releases: typing.List[dict]) -> version_finder.Versions:
+        stable = [r['tagName'] for r in releases if not r['isPrerelease']]
+        unstable = [r['tagName'] for r in releases if r['isPrerelease']]
 
         return version_finder.Versions(
-            stable=list(map(util.sanitize_version, stable or [])),
-            unstable=list(map(util.sanitize_version, unstable or [])),
+            stable=list(map(util.sanitize_version, stable)),
+            unstable=list(map(util.sanitize_version, unstable)),
             match=None)
 
+    @staticmethod
+    def _get_stable(releases: typing.Iterable[dict]) -> typing.Optional[str]:
+        for release in releases:
+            if not release['isPrerelease']:
+                return util.sanitize_version(release['tagName'])
+        return None
+
+    @staticmethod
+    def _cache_key(
+            version_from: config.VersionFromGithub,
+            first_versions: int,
+            after: typing.Optional[str] = None) -> str:
+        return '/'.join([
+            version_from.owner,
+            version_from.repository,
+            str(int(first_versions)),
+        ] + ([after] if after else []))
+
+    def get_all(self, first_versions: int) -> version_finder.Versions:
+        releases = self.iter_releases(
+            page_size=first_versions,
+            limit=first_versions)
+        return version_finder.match(
+            self._to_versions(list(releases)),
+            self.version_from.semver)
+
     def get_latest(self, first_versions: int) -> typing.Any:
-        versions = self.get_all(first_versions=first_versions)
-        return versions.stable[0]
+        '''
+        Returns the newest stable release, looking at up to first_versions
+        releases through small pages. With a semver constraint, the
+        highest matching version of the first_versions releases.
+        '''
+        if self.version_from.semver:
+            return self.get_all(first_versions=first_versions).match
+
+        releases = self.iter_releases(
+            page_size=default.Github.PAGE_SIZE_LATEST.value,
+            limit=first_versions)
+        return self._get_stable(releases)
+
+    @classmethod
+    def get_all_batch(
+            cls,
+            version_froms: typing.List[config.VersionFromGithub],
+            first_versions: int,
+            batch_size: int = default.Github.BATCH_SIZE.value
+            ) -> typing.List[version_finder.Versions]:
+        '''
+        Returns the versions of several repositories, querying the first
+        page of up to batch_size repositories per GraphQL request.
+        '''
+        first_versions = int(first_versions)
+        pages = cls._get_first_pages(
+            version_froms=version_froms,
+            first_versions=min(first_versions, GITHUB_PAGE_SIZE_MAX),
+            batch_size=batch_size)
+
+        versions = {}
+        for key, repository in pages.items():
+            releases, after = cls._iter_page(repository)
+            if after is not None and len(releases) < first_versions:
+                owner, name = key
+                finder = cls(version_from=config.VersionFromGithub(
+                    owner=owner,
+                    repository=name))
+                releases = releases + list(finder.iter_releases(
+                    page_size=GITHUB_PAGE_SIZE_MAX,
+                    limit=first_versions - len(releases),
+                    after=after))
+            versions[key] = cls._to_versions(releases)
+
+        return [
+            version_finder.match(versions[(v.owner, v.repository)], v.semver)
+            for v in version_froms
+        ]
+
+    @classmethod
+    def get_latest_batch(
+            cls,
+            version_froms: typing.List[config.VersionFromGithub],
+            first_versions: int,
+            batch_size: int = default.Github.BATCH_SIZE.value
+            ) -> typing.List[typing.Optional[str]]:
+        '''
+        Returns the newest stable release of several repositories. Only a
+        small first page is queried in batch, repositories without a
+        stable release in it are paged through one by one. Repositories
+        with a semver constraint are resolved through get_all_batch.
+        '''
+        first_versions = int(first_versions)
+        constrained = [v for v in version_froms if v.semver]
+        matches = [
+            versions.match for versions in cls.get_all_batch(
+                version_froms=constrained,
+                first_versions=first_versions,
+                batch_size=batch_size)
+        ] if constrained else []
+
+        page_size = default.Github.PAGE_SIZE_LATEST.value
+        pages = cls._get_first_pages(
+            version_froms=[v for v in version_froms if not v.semver],
+            first_versions=min(first_versions, page_size),
+            batch_size=batch_size)
+
+        latest = {}
+        for key, repository in pages.items():
+            releases, after = cls._iter_page(repository)
+            version = cls._get_stable(releases)
+            if version is None and after is not None:
+                owner, name = key
+                finder = cls(version_from=config.VersionFromGithub(
+                    owner=owner,
+                    repository=name))
+                version = cls._get_stable(finder.iter_releases(
+                    page_size=page_size,
+                    limit=first_versions - len(releases),
+                    after=after))
+            latest[key] = version
+
+        matches.reverse()
+        return [
+            matches.pop() if v.semver else latest[(v.owner, v.repository)]
+            for v in version_froms
+        ]
+
+    @classmethod
+    def group(
+            cls,
+            version_froms: typing.List[config.VersionFromGithub],
+            batch_size: int = default.Github.BATCH_SIZE.value
+            ) -> typing.List[typing.List[int]]:
+        '''
+        Splits the repositories into batches of one GraphQL query each.
+        '''
+        positions = list(range(len(version_froms)))
+        return [
+            positions[start:start + batch_size]
+            for start in range(0, len(positions), batch_size)
+        ]
@@ -0,0 +1,192 @@
+import functools
+import re
+import typing
+
+# 1.2.3, v1.2, 1.21.3-r0, 2.0.0-rc.1, 3.1_rc2
+VERSION_RE = re.compile(r'^[vV]?(\d+(?:\.\d+)*)(.*)$')
+REVISION_RE = re.compile(r'-r(\d+)$')
+TOKEN_RE = re.compile(r'\d+|[a-zA-Z]+')
+CONSTRAINT_RE = re.compile(r'^(<=|>=|<|>|==|=|~|\^)?\s*[vV]?(\d+(?:\.\d+)*)$')
+# apk suffixes following a release, in order, e.g. 9.3_p2 is a patched 9.3
+POST_SUFFIXES = ('cvs', 'svn', 'git', 'hg', 'p')
+
+LATEST = 'latest'
+LATEST_STABLE = 'latest-stable'
+
+
+class Key(typing.NamedTuple):
+    '''
+    Comparable form of a version, computed once per version.
+    '''
+    valid: bool
+    release: typing.Tuple[int, ...]
+    final: bool
+    suffix: typing.Tuple[typing.Tuple[int, typing.Any], ...]
+    revision: int
+
+
+@functools.lru_cache(maxsize=65536)
+def sort_key(version: str) -> Key:
+    '''
+    Returns the comparable key of a version. Pre-releases sort before
+    their release and post-releases (apk _p, _git...) after it,
+    unparsable versions before everything else.
+    :param version: The version, e.g. v1.2.3-rc1.
+    '''
+    match = VERSION_RE.match(version)
+    if not match:
+        return Key(False, (), False, (), 0)
+
+    release, rest = match.groups()
+    revision = 0
+    revision_match = REVISION_RE.search(rest)
+    if revision_match:
+        revision = int(revision_match.group(1))
+        rest = rest[:revision_match.start()]
+
+    # numbers sort before identifiers, as in semver
+    suffix = tuple(
+        (0, int(token)) if token.isdigit() else (1, token.lower())
+        for token in TOKEN_RE.findall(rest))
+
+    final = not suffix
+    if suffix and suffix[0][0] == 1 and suffix[0][1] in POST_SUFFIXES:
+        # stable, ordered by suffix then by its number
+        final = True
+        suffix = ((2, POST_SUFFIXES.index(suffix[0][1])),) + suffix[1:]
+
+    return Key(
+        valid=True,
+        release=_strip(tuple(int(n) for n in release.split('.'))),
+        final=final,
+        suffix=suffix,
+        revision=revision)
+
+
+def _strip(release: typing.Tuple[int, ...]) -> typing.Tuple[int, ...]:
+    '''
+    Removes trailing zeros, so that 1.2 and 1.2.0 compare equal.
+    '''
+    end = len(release)
+    while end > 1 and release[end - 1] == 0:
+        end -= 1
+    return release[:end]
+
+
+def _bump(release: typing.Tuple[int, ...], index: int) -> typing.Tuple:
+    '''
+    Returns the release with the part at index incremented and the
+    following parts dropped, e.g. (1, 2, 3), 1 -> (1, 3).
+    '''
+    return release[:index] + (release[index] + 1,)
+
+
+class Constraint:
+    '''
+    Version constraint, e.g. latest, latest-stable, <=1.8, ~1.2, ^2,
+    several of them separated by commas must all be satisfied.
+    '''
+
+    def __init__(self, spec: str):
+        '''
+        :param spec: The constraint.
+        :raises: ValueError
+        '''
+        self.spec = spec.strip()
+        self.stable_only = self.spec != LATEST
+        # (lower, upper) bounds on release tuples, lower inclusive and
+        # upper exclusive, None when unbounded
+        self.ranges: typing.List[typing.Tuple[
+            typing.Optional[tuple], typing.Optional[tuple]]] = []
+
+        if self.spec in (LATEST, LATEST_STABLE):
+            return
+
+        for part in self.spec.split(','):
+            self.ranges.append(self._parse(part.strip()))
+
+    def _parse(self, part: str) -> typing.Tuple:
+        match = CONSTRAINT_RE.match(part)
+        if not match:
+            raise ValueError(f'invalid version constraint: {part}')
+
+        operator, version = match.groups()
+        parts = tuple(int(n) for n in version.split('.'))
+        release = _strip(parts)
+        # a partial version covers all its patch versions: <=1.8 is <1.9
+        upper = _bump(parts, len(parts) - 1)
+
+        if operator in (None, '=', '=='):
+            return release, upper
+        if operator == '<':
+            return None, release
+        if operator == '<=':
+            return None, upper
+        if operator == '>':
+            return upper, None
+        if operator == '>=':
+            return release, None
+        if operator == '~':
+            # ~1.2.3 is <1.3, ~1.2 is <1.3, ~1 is <2
+            return release, _bump(parts, min(1, len(parts) - 1))
+        # ^1.2.3 is <2, ^0.2.3 is <0.3, ^0.0.3 is <0.0.4
+        index = next(
+            (i for i, n in enumerate(parts) if n != 0),
+            len(parts) - 1)
+        return release, _bump(parts, index)
+
+    def matches(self, key: Key) -> bool:
+        '''
+        Returns whether a version key satisfies the constraint.
+        :param key: The key of the version.
+        '''
+        if not key.valid or (self.stable_only and not key.final):
+            return False
+
+        for lower, upper in self.ranges:
+            if lower is not None and key.release < lower:
+                return False
+            if upper is not None and key.release >= upper:
+                return False
+        return True
+
+    def resolve(self, versions: typing.Iterable[str]) -> typing.Optional[str]:
+        '''
+        Returns the highest version satisfying the constraint.
+        :param versions: The candidate versions.
+        '''
+        best = best_key = None
+        for version in versions:
+            key = sort_key(version)
+            if self.matches(key) and (best_key is None or key > best_key):
+                best, best_key = version, key
+        return best
+
+
+@functools.lru_cache(maxsize=1024)
+def get_constraint(spec: str) -> Constraint:
+    '''
+    Returns the parsed constraint of a spec.
+    :param spec: The constraint.
+    :raises: ValueError
+    '''
+    return Constraint(spec)
+
+
+def resolve(
+        spec: str,
+        stable: typing.Optional[typing.List[str]],
+        unstable: typing.Optional[typing.List[str]] = None
+        ) -> typing.Optional[str]:
+    '''
+    Returns the highest version satisfying a constraint.
+    :param spec: The constraint.
+    :param stable: The stable versions.
+    :param unstable: The pre-release versions.
+    :raises: ValueError
+    '''
+    constraint = get_constraint(spec)
+    candidates = list(stable or [])
+    if not constraint.stable_only:
+        candidates += unstable or []
+    return constraint.resolve(candidates)
@@ -0,0 +1,263 @@
+import abc
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import time
+import typing
+
+import default
+
+LOGGER = logging.getLogger(__name__)
+
+# from sys/inotify.h
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM
+              | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+              | IN_MOVE_SELF)
+EVENT_HEADER = struct.Struct('iIII')
+READ_SIZE = 64 * 1024
+
+
+class Watcher(abc.ABC):
+    '''
+    Base class of the watchers of a directory tree.
+    '''
+
+    def __init__(self, path: str):
+        '''
+        :param path: The path of the directory to watch.
+        '''
+        self.path = os.path.abspath(path)
+
+    @abc.abstractmethod
+    def read(self, timeout: typing.Optional[float] = None) -> typing.Set[str]:
+        '''
+        Waits for changes and returns the paths that changed.
+        :param timeout: Seconds to wait at most, forever when None.
+        :returns: The changed paths, empty after the timeout.
+        '''
+        pass
+
+    def close(self):
+        pass
+
+    def wait(
+            self,
+            debounce: float,
+            timeout: typing.Optional[float] = None) -> typing.Set[str]:
+        '''
+        Waits for changes and returns the paths that changed once no
+        change happened for debounce seconds, so that the files written
+        by an editor or a git checkout are reported at once.
+        :param debounce: Seconds without change ending a burst.
+        :param timeout: Seconds to wait at most for a first change,
+                        forever when None.
+        :returns: The changed paths, empty after the timeout.
+        '''
+        paths = self.read(timeout)
+        while paths:
+            more = self.read(debounce)
+            if not more:
+                break
+            paths.update(more)
+        return paths
+
+    def get_image_names(self, paths: typing.Iterable[str]) -> typing.Set[str]:
+        '''
+        Returns the names of the image directories of changed paths.
+        :param paths: The changed paths.
+        '''
+        image_names = {
+            os.path.relpath(path, self.path).split(os.sep, 1)[0]
+            for path in paths
+        }
+        return image_names - {'.', '..'}
+
+
+def _get_libc() -> ctypes.CDLL:
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    # raises AttributeError when the libc has no inotify
+    libc.inotify_init1.argtypes = [ctypes.c_int]
+    libc.inotify_add_watch.argtypes = [
+        ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    return libc
+
+
+class InotifyWatcher(Watcher):
+    '''
+    Watches a directory tree with inotify, the directories created in the
+    tree being watched as they appear.
+    '''
+
+    def __init__(self, path: str):
+        '''
+        :param path: The path of the directory to watch.
+        :raises: OSError
+        '''
+        super().__init__(path)
+        try:
+            self._libc = _get_libc()
+        except AttributeError as err:
+            raise OSError(errno.ENOSYS, f'inotify is not available: {err}')
+
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._directories: typing.Dict[int, str] = {}
+
+        try:
+            self._add_tree(self.path)
+        except OSError:
+            self.close()
+            raise
+
+    def _add_watch(self, directory: str):
+        wd = self._libc.inotify_add_watch(
+            self._fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            # removed since it was listed
+            if err in (errno.ENOENT, errno.ENOTDIR):
+                return
+            raise OSError(err, os.strerror(err), directory)
+        self._directories[wd] = directory
+
+    def _add_tree(self, directory: str):
+        for root, _, _ in os.walk(directory):
+            self._add_watch(root)
+
+    def read(self, timeout: typing.Optional[float] = None) -> typing.Set[str]:
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+        try:
+            data = os.read(self._fd, READ_SIZE)
+        except BlockingIOError:
+            return set()
+
+        paths = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                # events were lost, anything could have changed
+                LOGGER.warning('Too many changes at once, checking all '
+                               'the images')
+                paths.update(
+                    os.path.join(self.path, entry)
+                    for entry in os.listdir(self.path))
+                continue
+            if mask & IN_IGNORED:
+                self._directories.pop(wd, None)
+                continue
+
+            directory = self._directories.get(wd)
+            if directory is None:
+                continue
+            path = os.path.join(directory, os.fsdecode(name)) \
+                if name else directory
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                try:
+                    self._add_tree(path)
+                except OSError as err:
+                    LOGGER.warning('Unable to watch %s: %s', path, err)
+            paths.add(path)
+        return paths
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingWatcher(Watcher):
+    '''
+    Watches a directory tree by comparing the mtime and size of its files
+    at intervals, where inotify is not available.
+    '''
+
+    def __init__(
+            self,
+            path: str,
+            interval: float = default.Watch.POLL_INTERVAL.value):
+        '''
+        :param path: The path of the directory to watch.
+        :param interval: Seconds between two scans of the tree.
+        '''
+        super().__init__(path)
+        self.interval = float(interval)
+        self._snapshot = self._scan()
+
+    def _scan(self) -> typing.Dict[str, typing.Tuple[int, int]]:
+        snapshot = {}
+        for root, dirs, files in os.walk(self.path):
+            for name in dirs + files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.lstat(path)
+                except OSError:
+                    continue
+                snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def read(self, timeout: typing.Optional[float] = None) -> typing.Set[str]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            delay = self.interval
+            if deadline is not None:
+                delay = min(delay, max(deadline - time.monotonic(), 0))
+            time.sleep(delay)
+
+            snapshot = self._scan()
+            paths = {
+                path for path in snapshot.keys() | self._snapshot.keys()
+                if snapshot.get(path) != self._snapshot.get(path)
+            }
+            self._snapshot = snapshot
+            if paths or (deadline is not None
+                         and time.monotonic() >= deadline):
+                return paths
+
+
+def get_watcher(
+        path: str,
+        poll: bool = False,
+        interval: float = default.Watch.POLL_INTERVAL.value) -> Watcher:
+    '''
+    Returns a watcher of a directory tree, using inotify when available
+    and polling otherwise.
+    :param path: The path of the directory to watch.
+    :param poll: Whether to poll even if inotify is available, e.g. for
+                 network file systems.
+    :param interval: Seconds between two scans when polling.
+    '''
+    if not poll:
+        try:
+            return InotifyWatcher(path)
+        except OSError as err:
+            LOGGER.warning('Unable to use inotify, polling every %ss: %s',
+                           interval, err)
+    return PollingWatcher(path, interval=interval)
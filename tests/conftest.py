@@ -0,0 +1,6 @@
+import os
+import sys
+
+# the modules of jojo import each other as top-level modules, as when
+# running jojo/cli.py
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'jojo'))
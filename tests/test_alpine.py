@@ -0,0 +1,271 @@
+import http.client
+import http.server
+import io
+import socket
+import tarfile
+import threading
+import time
+import tracemalloc
+import typing
+
+import pytest
+
+import cache
+from version_finder import alpine
+
+PATH = 'alpine/v3.20/main/x86_64/APKINDEX.tar.gz'
+
+
+def _apkindex() -> bytes:
+    content = b'P:musl\nV:1.2.5-r0\n\nP:nginx\nV:1.26.1-r0\n\n'
+    fileobj = io.BytesIO()
+    with tarfile.open(fileobj=fileobj, mode='w:gz') as tar:
+        info = tarfile.TarInfo(alpine.APKINDEX_MEMBER)
+        info.size = len(content)
+        tar.addfile(info, io.BytesIO(content))
+    return fileobj.getvalue()
+
+
+APKINDEX = _apkindex()
+
+
+class MirrorHandler(http.server.BaseHTTPRequestHandler):
+    '''
+    Stand-in for an Alpine mirror, behaving as the mode of its server:
+    ok, error (HTTP 500 on GET), trickle (the body sent slowly),
+    truncated (the connection closed during the body) or corrupt (not
+    a tarball).
+    '''
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(APKINDEX)))
+        self.end_headers()
+
+    def do_GET(self):
+        mode = self.server.mode
+        if mode == 'error':
+            self.send_error(500)
+            return
+
+        self.do_HEAD()
+        if mode == 'ok':
+            self.wfile.write(APKINDEX)
+            return
+        if mode == 'truncated':
+            self.wfile.write(APKINDEX[:len(APKINDEX) // 2])
+            self.close_connection = True
+            return
+        if mode == 'corrupt':
+            self.wfile.write(b'\0' * len(APKINDEX))
+            return
+        try:
+            for i in range(len(APKINDEX)):
+                self.wfile.write(APKINDEX[i:i + 1])
+                self.wfile.flush()
+                time.sleep(0.05)
+        except OSError:
+            pass
+
+
+def _start(mode: str) -> http.server.ThreadingHTTPServer:
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), MirrorHandler)
+    server.daemon_threads = True
+    server.mode = mode
+    threading.Thread(
+        target=server.serve_forever,
+        kwargs={'poll_interval': 0.05},
+        daemon=True).start()
+    return server
+
+
+@pytest.fixture
+def mirrors(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, '_HTTP_CACHE', None)
+    monkeypatch.setattr(cache, '_JSON_CACHE', None)
+    cache.configure(directory=str(tmp_path), ttl=3600)
+
+    servers = {
+        mode: _start(mode)
+        for mode in ('ok', 'error', 'trickle', 'truncated', 'corrupt')
+    }
+    yield {
+        mode: 'http://127.0.0.1:%d' % server.server_port
+        for mode, server in servers.items()
+    }
+    for server in servers.values():
+        server.shutdown()
+        server.server_close()
+
+
+def test_fetch_deadline(mirrors):
+    url = f'{mirrors["trickle"]}/{PATH}'
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        cache.get_http_cache().fetch(url, timeout=0.5)
+    assert time.monotonic() - start < 1.5
+
+
+def test_fetch_truncated(mirrors, tmp_path):
+    url = f'{mirrors["truncated"]}/{PATH}'
+    with pytest.raises(http.client.IncompleteRead):
+        cache.get_http_cache().fetch(url, timeout=5)
+    assert not (tmp_path / 'http').exists()
+
+
+@pytest.mark.parametrize('mode', ['truncated', 'corrupt'])
+def test_get_fails_over_unusable_index(mirrors, mode):
+    alpine._set_latency(mirrors[mode], 0.001)
+    alpine._set_latency(mirrors['ok'], 0.5)
+
+    index = alpine.AlpineIndex([mirrors[mode], mirrors['ok']], PATH)
+    assert index.get('nginx') == '1.26.1-r0'
+    assert index.get('musl') == '1.2.5-r0'
+    # not kept in the cache
+    url = f'{mirrors[mode]}/{PATH}'
+    assert cache.get_http_cache()._read(url) == (None, {})
+
+
+def test_get_after_parse_error(mirrors, monkeypatch):
+    iter_apkindex = alpine.iter_apkindex
+    calls = []
+
+    def failing(fileobj):
+        calls.append(fileobj)
+        for i, package in enumerate(iter_apkindex(fileobj)):
+            if len(calls) == 1 and i == 1:
+                raise RuntimeError('interrupted')
+            yield package
+
+    monkeypatch.setattr(alpine, 'iter_apkindex', failing)
+    index = alpine.AlpineIndex([mirrors['ok']], PATH)
+    with pytest.raises(RuntimeError):
+        index.get('nginx')
+    # parsed again, not taken as the end of the index
+    assert index.get('nginx') == '1.26.1-r0'
+    assert len(calls) == 2
+
+
+def test_fetch_fails_over(mirrors):
+    # the failing mirror answers probes first
+    alpine._set_latency(mirrors['error'], 0.001)
+    alpine._set_latency(mirrors['ok'], 0.5)
+
+    index = alpine.AlpineIndex([mirrors['error'], mirrors['ok']], PATH)
+    assert index.get('nginx') == '1.26.1-r0'
+
+    # ranked last for a while, its latency kept for later
+    entry = cache.get_json_cache().get('alpine-mirror', mirrors['error'])
+    assert entry['latency'] == 0.001
+    assert alpine.rank_mirrors([mirrors['error'], mirrors['ok']], PATH) == \
+        [mirrors['ok'], mirrors['error']]
+    assert alpine.rank_mirrors(
+        [mirrors['error'], mirrors['ok']], PATH, retry_delay=0) == \
+        [mirrors['error'], mirrors['ok']]
+
+
+def _wait_entry(mirror: str) -> dict:
+    '''
+    Returns the cache entry of a mirror, once its probe is over.
+    '''
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        entry = cache.get_json_cache().get('alpine-mirror', mirror)
+        if entry is not None:
+            return entry
+        time.sleep(0.01)
+    raise AssertionError(f'{mirror} was not probed')
+
+
+def test_rank_probes(mirrors):
+    # nothing listens on a port just released
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        dead = 'http://127.0.0.1:%d' % sock.getsockname()[1]
+
+    assert alpine.rank_mirrors([dead, mirrors['ok']], PATH) == \
+        [mirrors['ok'], dead]
+    assert _wait_entry(dead)['failed_at']
+
+    # a failing mirror without known latency is probed again once its
+    # retry delay is over
+    assert alpine.rank_mirrors(
+        [dead, mirrors['ok']], PATH, retry_delay=0) == [mirrors['ok'], dead]
+
+
+def _large_apkindex(packages: int) -> bytes:
+    content = b''.join(
+        b'C:Q1abcdefghijklmnopqrstuvwxyz0123=\nP:package%d\nV:1.%d-r0\n'
+        b'A:x86_64\nS:123456\nI:654321\nT:Description of a package\n'
+        b'U:https://example.com\nL:MIT\no:origin\nm:Maintainer\n'
+        b't:1700000000\nc:0123456789abcdef\nD:so:libc.musl-x86_64.so.1\n'
+        b'p:cmd:package%d\n\n' % (i, i, i)
+        for i in range(packages))
+    fileobj = io.BytesIO()
+    with tarfile.open(fileobj=fileobj, mode='w:gz') as tar:
+        info = tarfile.TarInfo(alpine.APKINDEX_MEMBER)
+        info.size = len(content)
+        tar.addfile(info, io.BytesIO(content))
+    return fileobj.getvalue()
+
+
+def _parse_all_lines(data: bytes, package: str) -> str:
+    '''
+    The parser iter_apkindex replaced: every line read and decoded, every
+    package kept.
+    '''
+    with tarfile.open(fileobj=io.BytesIO(data), mode='r:gz') as tar:
+        with tar.extractfile(tar.getmember('APKINDEX')) as handle:
+            lines = handle.readlines()
+
+    packages = {}
+    block = {}
+    for line in lines:
+        line = line.decode()
+        if line == '\n':
+            packages[block['package']] = block['version']
+            block = {}
+        elif line.startswith('P:'):
+            block['package'] = line.split(':')[1].rstrip('\n')
+        elif line.startswith('V:'):
+            block['version'] = line.split(':')[1].rstrip('\n')
+    return packages[package]
+
+
+def _measure(parse) -> typing.Tuple[float, int]:
+    '''
+    Returns the best time of a few runs of parse and its peak memory.
+    '''
+    best = float('inf')
+    for _ in range(3):
+        start = time.perf_counter()
+        parse()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        parse()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def test_iter_apkindex_benchmark():
+    data = _large_apkindex(20000)
+
+    def stream():
+        return dict(alpine.iter_apkindex(
+            io.BytesIO(data), ['package15000']))['package15000']
+
+    assert stream() == _parse_all_lines(data, 'package15000') == '1.15000-r0'
+    stream_time, stream_peak = _measure(stream)
+    lines_time, lines_peak = _measure(
+        lambda: _parse_all_lines(data, 'package15000'))
+
+    # the package is 3/4 into the index, the gain is not only stopping
+    # early
+    assert stream_time < lines_time
+    assert stream_peak * 10 < lines_peak
@@ -0,0 +1,117 @@
+import argparse
+import os
+import stat
+
+import pytest
+
+from action import build_action
+
+BUILDFILE = '''\
+image:
+  registry: registry.example.com
+  name: {name}
+  tag: "1.0"
+  tag_build:
+    version: "1.0"
+{from_image}'''
+
+FROM_IMAGE = '''\
+from_image:
+  registry: registry.example.com
+  name: {name}
+  tag: "1.0"
+'''
+
+
+@pytest.fixture
+def podman(tmp_path, monkeypatch):
+    '''
+    Returns the log of a fake podman, one line per call.
+    '''
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    log = tmp_path / 'podman.log'
+    script = bin_dir / 'podman'
+    script.write_text(f'#!/bin/sh\necho "$@" >> {log}\n')
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv('PATH', f'{bin_dir}{os.pathsep}{os.environ["PATH"]}')
+    return log
+
+
+def _builds(log) -> list:
+    if not log.exists():
+        return []
+    return [line.split()[2] for line in log.read_text().splitlines()
+            if line.startswith('build ')]
+
+
+def _image(path, name, from_name=None):
+    image_dir = path / name
+    image_dir.mkdir(parents=True)
+    (image_dir / 'Dockerfile').write_text(f'FROM scratch\nLABEL {name}=1\n')
+    from_image = FROM_IMAGE.format(name=from_name) if from_name else ''
+    (image_dir / '.jojo.yaml').write_text(
+        BUILDFILE.format(name=name, from_image=from_image))
+    return image_dir
+
+
+@pytest.fixture
+def namespace(tmp_path):
+    images = tmp_path / 'images'
+    _image(images, 'base')
+    _image(images, 'app', from_name='base')
+    return argparse.Namespace(
+        path=str(images),
+        cache_dir=str(tmp_path / 'cache'),
+        builder='podman',
+        dry_run=False,
+        force=False,
+        push=False,
+        check_registry=False,
+        rebuild=False,
+        tag_latest=False,
+        jobs=2)
+
+
+def test_build_order(namespace, podman):
+    assert build_action.build_images(namespace, ['app', 'base']) == {}
+    assert _builds(podman) == [
+        'registry.example.com/base:1.0', 'registry.example.com/app:1.0']
+
+
+def test_build_skips_unchanged(namespace, podman):
+    build_action.build_images(namespace, ['app', 'base'])
+    build_action.build_images(namespace, ['app', 'base'])
+    assert len(_builds(podman)) == 2
+
+    # the images built from a changed image are built again too
+    with open(os.path.join(namespace.path, 'base', 'Dockerfile'), 'a') as fobj:
+        fobj.write('LABEL changed=1\n')
+    build_action.build_images(namespace, ['app', 'base'])
+    assert _builds(podman)[2:] == [
+        'registry.example.com/base:1.0', 'registry.example.com/app:1.0']
+
+    namespace.force = True
+    build_action.build_images(namespace, ['app'])
+    assert len(_builds(podman)) == 5
+
+
+def test_build_dry_run_not_recorded(namespace, podman):
+    namespace.dry_run = True
+    build_action.build_images(namespace, ['base'])
+    assert _builds(podman) == []
+    # nor is the file hash cache of the context
+    assert not os.path.exists(os.path.join(namespace.cache_dir, 'context'))
+
+    namespace.dry_run = False
+    build_action.build_images(namespace, ['base'])
+    assert _builds(podman) == ['registry.example.com/base:1.0']
+
+
+def test_build_push_after_build(namespace, podman):
+    build_action.build_images(namespace, ['base'])
+    # built but not pushed, pushing builds it again
+    namespace.push = True
+    build_action.build_images(namespace, ['base'])
+    build_action.build_images(namespace, ['base'])
+    assert len(_builds(podman)) == 2
@@ -0,0 +1,33 @@
+import threading
+
+import builder
+import registry
+
+
+class Client:
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.threads = []
+
+    def add_tag(self, image, tag):
+        self.threads.append(threading.current_thread())
+        return tag not in self.failing
+
+
+def test_add_registry_tags_single(monkeypatch):
+    client = Client()
+    monkeypatch.setattr(registry, 'get_registry', lambda: client)
+    assert builder.add_registry_tags('r.example.com/app:1', ['latest']) == []
+    assert client.threads == [threading.current_thread()]
+
+
+def test_add_registry_tags_several(monkeypatch):
+    client = Client(failing=['1'])
+    monkeypatch.setattr(registry, 'get_registry', lambda: client)
+    assert builder.add_registry_tags(
+        'r.example.com/app:1.0.0', ['latest', '1', '1.0']) == ['1']
+    assert len(client.threads) == 3
+
+
+def test_add_registry_tags_none():
+    assert builder.add_registry_tags('r.example.com/app:1', []) == []
@@ -0,0 +1,182 @@
+import os
+
+import dacite
+import pytest
+import yaml
+
+import config
+import util
+
+
+def test_local_cache_ref_is_in_cache_dir():
+    build_cache = config.BuildCache(ref='{image}')
+    assert build_cache.get_ref('/cache', 'app') == '/cache/layers/app'
+
+
+def test_absolute_local_cache_ref():
+    build_cache = config.BuildCache(ref='/var/cache/{image}')
+    assert build_cache.get_ref('/cache', 'app') == '/var/cache/app'
+
+
+def test_registry_cache_ref():
+    build_cache = config.BuildCache(
+        ref='registry.example.com/cache/{image}',
+        type=config.CacheType.REGISTRY)
+    assert build_cache.get_ref('/cache', 'app') == \
+        'registry.example.com/cache/app'
+
+
+IMAGE = {'registry': 'registry.example.com', 'name': 'app', 'tag': '1.0'}
+
+
+def _dacite(data: dict) -> config.ImageBuildConfig:
+    return dacite.from_dict(
+        data_class=config.ImageBuildConfig,
+        data=data,
+        config=dacite.Config(cast=[
+            config.CacheType, config.SourceType, config.TagType]))
+
+
+BUILD_CONFIGS = [
+    {'image': dict(IMAGE, tag_build=None)},
+    {'image': dict(IMAGE, tag=None, tag_build=None,
+                   build_args={'KEY': 'value'})},
+    {
+        'image': dict(IMAGE, tag_build={
+            'version': '1.2-r0',
+            'type': 'VERSION',
+            'version_from': {
+                'type': 'alpine',
+                'package': 'nginx',
+                'repository': 'main',
+                'version_id': 'v3.20',
+                'mirrors': ['http://mirror.example.com'],
+            },
+        }),
+        'from_image': dict(IMAGE, name='base'),
+        'from_image_builder': None,
+    },
+    {
+        'image': dict(IMAGE, tag_build={
+            'version': None,
+            'version_from': {
+                'type': 'github',
+                'owner': 'owner',
+                'repository': 'repo',
+                'semver': '^1',
+            },
+        }),
+        'cache': {'ref': 'registry.example.com/cache', 'type': 'registry'},
+        'platforms': ['linux/amd64', 'linux/arm64'],
+    },
+    {
+        'image': dict(IMAGE, tag_build={'version': '1'}),
+        'cache': {'ref': '{image}', 'mode': None},
+    },
+]
+
+
+@pytest.mark.parametrize('data', BUILD_CONFIGS)
+def test_convert_as_dacite(data):
+    assert config._convert_build_config(data) == _dacite(data)
+    assert config.ImageBuildConfig.from_dict(data) == _dacite(data)
+
+
+@pytest.mark.parametrize('data', BUILD_CONFIGS)
+def test_to_yaml(data):
+    build_config = config.ImageBuildConfig.from_dict(data)
+    assert config.ImageBuildConfig.from_dict(
+        yaml.safe_load(build_config.to_yaml())) == build_config
+
+
+def test_to_yaml_leaves_out_unset():
+    build_config = config.ImageBuildConfig.from_dict(BUILD_CONFIGS[2])
+    assert yaml.safe_load(build_config.to_yaml()) == {
+        'image': dict(IMAGE, tag_build={
+            'version': '1.2-r0',
+            'type': 'VERSION',
+            'version_from': {
+                'type': 'alpine',
+                'package': 'nginx',
+                'repository': 'main',
+                'version_id': 'v3.20',
+                'arch': 'x86_64',
+                'mirror': 'http://dl-cdn.alpinelinux.org',
+                'mirrors': ['http://mirror.example.com'],
+            },
+        }),
+        'from_image': dict(IMAGE, name='base'),
+    }
+
+    # the fields without default are kept
+    build_config = config.ImageBuildConfig.from_dict(BUILD_CONFIGS[0])
+    assert yaml.safe_load(build_config.to_yaml()) == {
+        'image': dict(IMAGE, tag_build=None)}
+
+
+@pytest.mark.parametrize('data', [
+    {'image': {'registry': 'registry.example.com', 'tag_build': None}},
+    {'image': dict(IMAGE, tag_build=None), 'platforms': 'linux/amd64'},
+    {'image': dict(IMAGE, tag_build={'version': '1', 'type': 'OTHER'})},
+])
+def test_convert_invalid(data):
+    with pytest.raises(config.ConversionError):
+        config._convert_build_config(data)
+    # dacite reports the error
+    with pytest.raises(ValueError):
+        config.ImageBuildConfig.from_dict(data)
+
+
+def test_buildfile_cache(tmp_path, monkeypatch):
+    buildfile = tmp_path / '.jojo.yaml'
+    buildfile.write_text(
+        'image:\n  registry: r\n  name: app\n  tag: "1"\n  tag_build: null\n')
+    os.utime(buildfile, (0, 0))
+    cache_dir = str(tmp_path / 'cache')
+    monkeypatch.setattr(config, '_BUILDFILES', {})
+
+    expected = config.load_build_config(str(buildfile))
+    assert config.load_build_config(str(buildfile), cache_dir) == expected
+
+    # the cached content is used, from memory then from the disk
+    monkeypatch.setattr(util, 'load_yaml', None)
+    assert config.load_build_config(str(buildfile), cache_dir) == expected
+    monkeypatch.setattr(config, '_BUILDFILES', {})
+    assert config.load_build_config(str(buildfile), cache_dir) == expected
+
+
+def test_buildfile_cache_modified(tmp_path, monkeypatch):
+    buildfile = tmp_path / '.jojo.yaml'
+    buildfile.write_text(
+        'image:\n  registry: r\n  name: app\n  tag: "1"\n  tag_build: null\n')
+    os.utime(buildfile, (0, 0))
+    cache_dir = str(tmp_path / 'cache')
+    monkeypatch.setattr(config, '_BUILDFILES', {})
+    config.load_build_config(str(buildfile), cache_dir)
+
+    buildfile.write_text(
+        'image:\n  registry: r\n  name: app\n  tag: "2"\n  tag_build: null\n')
+    os.utime(buildfile, (1, 1))
+    assert config.load_build_config(
+        str(buildfile), cache_dir).image.tag == '2'
+
+
+@pytest.mark.parametrize('content', [
+    '',
+    'image: [\n',
+    '- image\n',
+    'image: {}\n',
+    'image: {registry: r, name: app, tag: "1", tag_build: {type: OTHER}}\n',
+])
+def test_load_valid_build_config(tmp_path, content, caplog):
+    buildfile = tmp_path / '.jojo.yaml'
+    buildfile.write_text(content)
+    with pytest.raises(ValueError):
+        config.load_build_config(str(buildfile))
+    assert config.load_valid_build_config(str(buildfile), 'app') is None
+    assert 'app: unable to load the buildfile' in caplog.text
+
+
+def test_load_valid_build_config_missing(tmp_path):
+    assert config.load_valid_build_config(
+        str(tmp_path / '.jojo.yaml'), 'app') is None
@@ -0,0 +1,21 @@
+import enum
+
+import pytest
+
+import default
+
+ENUMS = [
+    value for value in vars(default).values()
+    if isinstance(value, type) and issubclass(value, enum.Enum)
+    and value.__module__ == default.__name__
+]
+
+
+@pytest.mark.parametrize('defaults', ENUMS, ids=lambda e: e.__name__)
+def test_no_alias(defaults):
+    aliases = {
+        name: member.name
+        for name, member in defaults.__members__.items()
+        if name != member.name
+    }
+    assert aliases == {}
@@ -0,0 +1,74 @@
+import concurrent.futures
+import io
+import os
+import threading
+import time
+
+import pytest
+
+from builder import executor
+
+
+def _is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+@pytest.fixture
+def runner():
+    return executor.Executor(
+        tail_lines=2, stdout=io.StringIO(), stderr=io.StringIO())
+
+
+def test_check_call_output(runner):
+    runner.check_call(['sh', '-c', 'echo one; echo two >&2'], prefix='app')
+    assert runner.stdout.getvalue() == 'app | one\n'
+    assert runner.stderr.getvalue() == 'app | two\n'
+
+
+def test_check_call_failure(runner):
+    with pytest.raises(executor.CommandError) as info:
+        runner.check_call(['sh', '-c', 'echo 1; echo 2; echo 3; exit 3'])
+    assert info.value.returncode == 3
+    assert info.value.output == '2\n3'
+
+
+def test_check_call_kills_on_error(runner, tmp_path):
+    pid_path = tmp_path / 'pid'
+    # a line longer than the limit fails the reading of the output
+    script = (f'echo $$ > {pid_path}; '
+              f'head -c {executor.LINE_LIMIT + 1} /dev/zero | tr "\\0" x; '
+              'exec sleep 30')
+    with pytest.raises(ValueError):
+        runner.check_call(['sh', '-c', script])
+    assert not _is_running(int(pid_path.read_text()))
+
+
+def test_cancel(runner, tmp_path):
+    pid_path = tmp_path / 'pid'
+    errors = []
+
+    def run():
+        try:
+            runner.check_call(
+                ['sh', '-c', f'echo $$ > {pid_path}; exec sleep 30'],
+                prefix='app')
+        except concurrent.futures.CancelledError as err:
+            errors.append(err)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    while not pid_path.exists() or not pid_path.read_text():
+        time.sleep(0.01)
+    assert runner.cancel('other') == 0
+    assert runner.cancel('app') == 1
+    thread.join(5)
+    assert errors
+    # killed by the event loop, shortly after the cancellation
+    deadline = time.monotonic() + 5
+    while _is_running(int(pid_path.read_text())):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
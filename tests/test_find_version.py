@@ -0,0 +1,76 @@
+import os
+
+import pytest
+
+import config
+import resolver
+from action import find_version_action
+
+BUILDFILE = '''\
+image:
+  registry: registry.example.com
+  name: {name}
+  tag: "1.0"
+  tag_build:
+    version: "1.0"
+    version_from:
+      type: github
+      owner: owner
+      repository: {name}
+'''
+
+
+@pytest.fixture
+def images(tmp_path):
+    paths = {}
+    for name in ('app', 'tools'):
+        (tmp_path / name).mkdir()
+        path = tmp_path / name / '.jojo.yaml'
+        path.write_text(BUILDFILE.format(name=name))
+        os.utime(path, (0, 0))
+        paths[name] = str(path)
+    return paths
+
+
+def _update(paths, versions, dry_run=False):
+    build_configs = {
+        name: config.load_build_config(path) for name, path in paths.items()
+    }
+    results = [
+        resolver.Result(
+            image_name=name,
+            version_from=build_configs[name].image.tag_build.version_from,
+            versions=None,
+            latest=version,
+            error=None)
+        for name, version in versions.items()
+    ]
+    return find_version_action.update_versions(
+        results=results,
+        build_configs=build_configs,
+        buildfile_paths=paths,
+        dry_run=dry_run)
+
+
+def test_update_changed_only(images):
+    changes = _update(images, {'app': '1.0', 'tools': '2.0'})
+    assert changes == [find_version_action.Change('tools', '1.0', '2.0')]
+
+    # the unchanged buildfile is not rewritten
+    assert os.stat(images['app']).st_mtime_ns == 0
+    assert os.stat(images['tools']).st_mtime_ns != 0
+    build_config = config.load_build_config(images['tools'])
+    assert build_config.image.tag == '2.0'
+    assert build_config.image.tag_build.version == '2.0'
+
+
+def test_update_not_found(images):
+    assert _update(images, {'app': None}) == []
+    assert os.stat(images['app']).st_mtime_ns == 0
+
+
+def test_update_dry_run(images):
+    changes = _update(images, {'app': '1.1', 'tools': '1.0'}, dry_run=True)
+    assert changes == [find_version_action.Change('app', '1.0', '1.1')]
+    assert os.stat(images['app']).st_mtime_ns == 0
+    assert config.load_build_config(images['app']).image.tag == '1.0'
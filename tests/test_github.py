@@ -0,0 +1,56 @@
+import pytest
+
+import config
+from version_finder import github
+
+
+class Response:
+    def __init__(self, results, headers=None):
+        self.results = results
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.results
+
+
+class Session:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.posts = 0
+
+    def post(self, url, **kwargs):
+        self.posts += 1
+        return self.responses.pop(0)
+
+
+RATE_LIMITED = Response(
+    {'errors': [{'type': 'RATE_LIMITED'}]},
+    headers={'X-RateLimit-Reset': '0'})
+
+
+@pytest.fixture
+def finder(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(github.time, 'sleep', sleeps.append)
+    finder = github.Github(version_from=config.VersionFromGithub(
+        owner='owner', repository='repo'))
+    finder.sleeps = sleeps
+    return finder
+
+
+def test_query_retries_when_rate_limited(finder):
+    finder.http = Session([RATE_LIMITED, Response({'data': {}})])
+    assert finder._query('query', {}) == {'data': {}}
+    # the reset is past, the minimum backoff applies
+    assert finder.sleeps == [1]
+
+
+def test_query_gives_up_when_rate_limited(finder):
+    finder.http = Session([RATE_LIMITED] * 5)
+    with pytest.raises(SystemExit):
+        finder._query('query', {})
+    assert finder.http.posts == 3
+    assert finder.sleeps == [1, 2]
@@ -0,0 +1,95 @@
+import threading
+
+import pytest
+
+import config
+import graph
+
+
+def _build_config(name, from_name=None) -> config.ImageBuildConfig:
+    from_image = None
+    if from_name:
+        from_image = config.Image(
+            registry='registry.example.com', name=from_name, tag='old')
+    return config.ImageBuildConfig(
+        image=config.ImageTagFrom(
+            registry='registry.example.com',
+            name=name,
+            tag='1.0',
+            tag_build=None),
+        from_image=from_image)
+
+
+def test_get_dependencies():
+    dependencies = graph.get_dependencies({
+        'base': _build_config('base', 'alpine'),
+        'app': _build_config('app', 'base'),
+        'tool': _build_config('tool', 'tool'),
+    })
+    # any tag of an image built is a dependency, external images are not
+    assert dependencies == {'base': set(), 'app': {'base'}, 'tool': set()}
+
+
+def test_get_dependents():
+    dependencies = {'base': set(), 'app': {'base'}, 'web': {'app'},
+                    'other': set()}
+    assert graph.get_dependents(dependencies, ['base']) == \
+        {'base', 'app', 'web'}
+
+
+def test_sort():
+    assert graph.sort({'web': {'app'}, 'app': {'base'}, 'base': set(),
+                       'other': set()}) == ['base', 'other', 'app', 'web']
+
+
+def test_sort_cycle():
+    with pytest.raises(graph.CycleError):
+        graph.sort({'a': {'b'}, 'b': {'a'}, 'c': set()})
+
+
+def test_run_order():
+    dependencies = {'web': {'app'}, 'app': {'base'}, 'base': set()}
+    events = []
+    lock = threading.Lock()
+
+    def build(image_name):
+        with lock:
+            events.append(image_name)
+
+    assert graph.run(dependencies, build, jobs=4) == {}
+    assert events == ['base', 'app', 'web']
+
+
+def test_run_concurrently():
+    # both wait for each other, they only finish when run at once
+    barrier = threading.Barrier(2, timeout=5)
+    dependencies = {'one': set(), 'two': set(), 'app': {'one', 'two'}}
+    built = []
+
+    def build(image_name):
+        if image_name != 'app':
+            barrier.wait()
+        built.append(image_name)
+
+    assert graph.run(dependencies, build, jobs=2) == {}
+    assert built[-1] == 'app'
+
+
+def test_run_skips_dependents_of_failures():
+    dependencies = {'base': set(), 'app': {'base'}, 'web': {'app'},
+                    'other': set()}
+    built = []
+
+    def build(image_name):
+        if image_name == 'base':
+            raise RuntimeError('build failed')
+        built.append(image_name)
+
+    failed = graph.run(dependencies, build, jobs=2)
+    assert list(failed) == ['base']
+    assert built == ['other']
+
+
+def test_run_cycle():
+    with pytest.raises(graph.CycleError):
+        graph.run({'a': {'b'}, 'b': {'a'}}, lambda image_name: None)
@@ -0,0 +1,73 @@
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+CLI = os.path.join(os.path.dirname(__file__), '..', 'jojo', 'cli.py')
+IMPORT_TIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+\d+ \|\s+(\S+)$')
+SLOW_MODULES = ('jinja2', 'requests', 'yaml', 'dacite')
+# microseconds spent importing the modules of a dry run, far above what
+# it takes, but below what any of the slow modules would add
+BUDGET = 200000
+
+BUILDFILE = '''\
+image:
+  registry: registry.example.com
+  name: app
+  tag: "1.0"
+  tag_build: null
+'''
+
+
+def _import_times(*args: str) -> dict:
+    '''
+    Returns the microseconds spent importing each module, by name.
+    '''
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', *args],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=True)
+    times = {}
+    for line in process.stderr.splitlines():
+        match = IMPORT_TIME_RE.match(line)
+        if match:
+            times[match.group(2)] = int(match.group(1))
+    return times
+
+
+@pytest.fixture
+def images(tmp_path):
+    image_dir = tmp_path / 'images' / 'app'
+    image_dir.mkdir(parents=True)
+    buildfile = image_dir / '.jojo.yaml'
+    buildfile.write_text(BUILDFILE)
+    # recent buildfiles are not cached
+    os.utime(buildfile, (0, 0))
+    return tmp_path
+
+
+def test_push_dry_run_imports(images):
+    args = [
+        CLI, 'push', '--dry-run',
+        '--path', str(images / 'images'),
+        '--cache-dir', str(images / 'cache'),
+        '--builder', 'podman',
+        'app',
+    ]
+    # the first run parses the buildfile and caches it
+    _import_times(*args)
+
+    # what the interpreter imports to start is not the CLI's doing
+    startup = _import_times('-c', 'pass')
+    times = {
+        name: time for name, time in _import_times(*args).items()
+        if name not in startup
+    }
+
+    for module in SLOW_MODULES:
+        assert module not in times
+    assert sum(times.values()) < BUDGET
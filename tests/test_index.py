@@ -0,0 +1,135 @@
+import json
+import os
+
+import pytest
+
+import cli
+import config
+import index
+
+BUILDFILES = {
+    'nginx': '''\
+image:
+  registry: registry.example.com
+  name: nginx
+  tag: "1.26"
+  tag_build:
+    version: "1.26"
+    version_from:
+      type: alpine
+      package: nginx
+      repository: main
+      version_id: v3.20
+from_image:
+  registry: registry.example.com
+  name: alpine
+  tag: "3.20"
+''',
+    'nginx-exporter': '''\
+image:
+  registry: other.example.com
+  name: nginx-exporter
+  tag: "1.0"
+  tag_build:
+    version: "1.0"
+    version_from:
+      type: github
+      owner: nginx
+      repository: nginx-prometheus-exporter
+''',
+    'tools': '''\
+image:
+  registry: registry.example.com
+  name: tools
+  tag: latest
+  tag_build: null
+from_image:
+  registry: registry.example.com
+  name: nginx
+  tag: "1.26"
+''',
+}
+
+
+@pytest.fixture
+def images(tmp_path):
+    path = tmp_path / 'images'
+    for name, content in BUILDFILES.items():
+        (path / name).mkdir(parents=True)
+        buildfile = path / name / '.jojo.yaml'
+        buildfile.write_text(content)
+        os.utime(buildfile, (0, 0))
+    return path
+
+
+def _names(entries) -> list:
+    return [entry.image_name for entry in entries]
+
+
+def test_query(images, tmp_path):
+    image_index = index.get_index(str(images), str(tmp_path / 'cache'))
+    assert _names(image_index.query()) == ['nginx', 'nginx-exporter', 'tools']
+    assert _names(image_index.query(patterns=['nginx*'])) == \
+        ['nginx', 'nginx-exporter']
+    assert _names(image_index.query(patterns=['tools', 'nginx'])) == \
+        ['nginx', 'tools']
+    assert _names(image_index.query(source='github')) == ['nginx-exporter']
+    assert _names(image_index.query(source='none')) == ['tools']
+    assert _names(image_index.query(registry='other.*')) == \
+        ['nginx-exporter']
+    assert _names(image_index.query(
+        base_image='registry.example.com/nginx')) == ['tools']
+    assert _names(image_index.query(base_image='*/alpine:3.*')) == ['nginx']
+    assert _names(image_index.query(patterns=['nginx*'], source='alpine')) \
+        == ['nginx']
+
+
+def test_update_loads_changed_buildfiles(images, tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / 'cache')
+    index.get_index(str(images), cache_dir)
+
+    loaded = []
+    load_build_config = config.load_build_config
+
+    def counting_load(path, **kwargs):
+        loaded.append(os.path.basename(os.path.dirname(path)))
+        return load_build_config(path, **kwargs)
+
+    monkeypatch.setattr(config, 'load_build_config', counting_load)
+    index.get_index(str(images), cache_dir)
+    assert loaded == []
+
+    buildfile = images / 'tools' / '.jojo.yaml'
+    buildfile.write_text(BUILDFILES['tools'].replace('latest', '"2.0"'))
+    os.utime(buildfile, (1, 1))
+    (images / 'nginx' / '.jojo.yaml').unlink()
+    image_index = index.get_index(str(images), cache_dir)
+    assert loaded == ['tools']
+    assert _names(image_index.query()) == ['nginx-exporter', 'tools']
+    assert image_index.entries['tools'].tag == '2.0'
+
+
+def test_invalid_buildfile_left_out(images, tmp_path):
+    (images / 'tools' / '.jojo.yaml').write_text('image: {}\n')
+    image_index = index.get_index(str(images), str(tmp_path / 'cache'))
+    assert _names(image_index.query()) == ['nginx', 'nginx-exporter']
+
+
+def test_ls(images, tmp_path, capsys):
+    args = ['ls', '--path', str(images), '--cache-dir', str(tmp_path)]
+    assert cli.run(args + ['--source', 'alpine']) == 0
+    assert capsys.readouterr().out.split('\t') == [
+        'nginx', 'registry.example.com/nginx:1.26',
+        'alpine:v3.20/main/nginx', 'registry.example.com/alpine:3.20\n']
+
+    assert cli.run(args + ['--json', 'tools']) == 0
+    assert json.loads(capsys.readouterr().out) == [{
+        'image_name': 'tools',
+        'image': 'registry.example.com/tools:latest',
+        'registry': 'registry.example.com',
+        'repository': 'registry.example.com/tools',
+        'tag': 'latest',
+        'source': None,
+        'source_name': None,
+        'base_images': ['registry.example.com/nginx:1.26'],
+    }]
@@ -0,0 +1,105 @@
+import http.server
+import json
+import threading
+import time
+
+import pytest
+
+import registry
+
+MANIFEST_TYPE = 'application/vnd.oci.image.manifest.v1+json'
+TOKEN = 'secret'
+
+
+class RegistryHandler(http.server.BaseHTTPRequestHandler):
+    '''
+    Stand-in for a registry:2 with token authentication: manifests are
+    kept by path, /slow/ repositories never answer in time.
+    '''
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, code, body=b'', headers=None):
+        self.send_response(code)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _authorized(self) -> bool:
+        if self.headers.get('Authorization') == f'Bearer {TOKEN}':
+            return True
+        host = '127.0.0.1:%d' % self.server.server_port
+        self._send(401, headers={
+            'WWW-Authenticate': f'Bearer realm="http://{host}/token",'
+                                f'service="{host}"',
+        })
+        return False
+
+    def do_GET(self):
+        if self.path.startswith('/token'):
+            self._send(200, json.dumps({'token': TOKEN}).encode())
+            return
+        if '/slow/' in self.path:
+            time.sleep(1)
+        if not self._authorized():
+            return
+        manifest = self.server.manifests.get(self.path)
+        if manifest is None:
+            self._send(404)
+            return
+        self._send(200, manifest, {'Content-Type': MANIFEST_TYPE})
+
+    do_HEAD = do_GET
+
+    def do_PUT(self):
+        if not self._authorized():
+            return
+        length = int(self.headers['Content-Length'])
+        self.server.manifests[self.path] = self.rfile.read(length)
+        self._send(201)
+
+
+@pytest.fixture
+def server():
+    server = http.server.ThreadingHTTPServer(
+        ('127.0.0.1', 0), RegistryHandler)
+    server.daemon_threads = True
+    server.manifests = {'/v2/team/app/manifests/1.0': b'{"layers": []}'}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield '127.0.0.1:%d' % server.server_port
+    server.shutdown()
+    server.server_close()
+
+
+def test_has_tag(server):
+    client = registry.Registry()
+    assert client.has_tag(f'{server}/team/app:1.0')
+    assert not client.has_tag(f'{server}/team/app:2.0')
+
+
+def test_add_tag(server):
+    client = registry.Registry()
+    assert client.add_tag(f'{server}/team/app:1.0', 'latest')
+    assert client.has_tag(f'{server}/team/app:latest')
+
+
+def test_request_timeout(server):
+    client = registry.Registry(timeout=0.2)
+    start = time.monotonic()
+    assert not client.has_tag(f'{server}/slow/app:1.0')
+    assert time.monotonic() - start < 0.9
+
+
+def test_request_timeout_of_caller(server):
+    client = registry.Registry(timeout=0.2)
+    response = client.request(
+        'GET',
+        registry.Reference.from_str(f'{server}/slow/app:1.0'),
+        'manifests/1.0',
+        timeout=5)
+    # answered in time, once authenticated
+    assert response.status_code == 404
@@ -0,0 +1,43 @@
+import pytest
+
+import config
+import resolver
+import version_finder
+
+GITHUB = config.VersionFromGithub(owner='owner', repository='repo')
+
+
+def _result(**kwargs) -> resolver.Result:
+    fields = {
+        'image_name': 'app',
+        'version_from': GITHUB,
+        'versions': None,
+        'latest': None,
+        'error': None,
+    }
+    fields.update(kwargs)
+    return resolver.Result(**fields)
+
+
+@pytest.mark.parametrize('result, failed', [
+    (_result(version_from=None), False),
+    (_result(latest='1.0'), False),
+    (_result(), True),
+    (_result(error=OSError('unreachable')), True),
+    (_result(versions=version_finder.Versions(['1.0'], [], None)), False),
+    (_result(versions=version_finder.Versions([], ['2.0-rc1'], None)),
+     False),
+    (_result(versions=version_finder.Versions([], [], None)), True),
+])
+def test_result_failed(result, failed):
+    assert result.failed is failed
+
+
+def test_check_results():
+    resolver.check_results([_result(latest='1.0'), _result(version_from=None)])
+    with pytest.raises(SystemExit) as info:
+        resolver.check_results([
+            _result(latest='1.0'),
+            _result(image_name='down', error=OSError('unreachable')),
+        ])
+    assert info.value.code == 1
@@ -0,0 +1,147 @@
+import pytest
+
+import config
+import default
+import resolver
+import scheduler
+
+NOW = 1000000.0
+
+
+def _build_config(version_from) -> config.ImageBuildConfig:
+    return config.ImageBuildConfig(image=config.ImageTagFrom(
+        registry='registry.example.com',
+        name='app',
+        tag='1.0',
+        tag_build=config.TagBuild(version='1.0', version_from=version_from)))
+
+
+def _alpine(mirror: str) -> config.VersionFromAlpine:
+    return config.VersionFromAlpine(
+        package='nginx', repository='main', version_id='v3.20',
+        mirror=mirror)
+
+
+def _github() -> config.VersionFromGithub:
+    return config.VersionFromGithub(owner='owner', repository='repo')
+
+
+def _result(name, version_from, latest='2.0', error=None):
+    return resolver.Result(
+        image_name=name,
+        version_from=version_from,
+        versions=None,
+        latest=None if error else latest,
+        error=error)
+
+
+@pytest.fixture
+def build_configs(monkeypatch):
+    monkeypatch.delenv(default.EnvVar.ALPINE_MIRRORS.value, raising=False)
+    return {
+        'one': _build_config(_alpine('http://one.example.com')),
+        'two': _build_config(_alpine('http://two.example.com')),
+        'gh': _build_config(_github()),
+    }
+
+
+def _scheduler(tmp_path, **kwargs) -> scheduler.Scheduler:
+    kwargs.setdefault('jitter', 0)
+    return scheduler.Scheduler(
+        path=str(tmp_path / 'images'),
+        cache_dir=str(tmp_path / 'cache'),
+        intervals={'alpine': 3600, 'github': 7200},
+        backoff_min=60,
+        backoff_max=300,
+        **kwargs)
+
+
+def test_new_images_due_now_without_spread(tmp_path, build_configs):
+    image_scheduler = _scheduler(tmp_path, jitter=0.5)
+    image_scheduler.update(build_configs, NOW, spread=False)
+    assert image_scheduler.get_due(NOW) == ['gh', 'one', 'two']
+
+
+def test_new_images_spread(tmp_path, build_configs):
+    image_scheduler = _scheduler(tmp_path, jitter=0.5)
+    image_scheduler.update(build_configs, NOW)
+    for state in image_scheduler.images.values():
+        assert NOW <= state.next_at <= NOW + 0.5 * 7200
+
+
+def test_interval_by_source(tmp_path, build_configs):
+    image_scheduler = _scheduler(tmp_path)
+    image_scheduler.update(build_configs, NOW, spread=False)
+    image_scheduler.record([
+        _result(name, build_configs[name].get_tag_build().version_from)
+        for name in build_configs
+    ], NOW)
+
+    assert image_scheduler.get_due(NOW + 3599) == []
+    assert image_scheduler.get_due(NOW + 3600) == ['one', 'two']
+    assert image_scheduler.get_due(NOW + 7200) == ['gh', 'one', 'two']
+    assert image_scheduler.images['one'].version == '2.0'
+
+
+def test_backoff_progression(tmp_path, build_configs):
+    image_scheduler = _scheduler(tmp_path)
+    image_scheduler.update({'one': build_configs['one']}, NOW, spread=False)
+    version_from = build_configs['one'].get_tag_build().version_from
+
+    now = NOW
+    for delay in (60, 120, 240, 300, 300):
+        image_scheduler.record(
+            [_result('one', version_from, error=OSError('down'))], now)
+        assert image_scheduler.get_next_at() == now + delay
+        now += delay
+
+    image_scheduler.record([_result('one', version_from)], now)
+    assert image_scheduler.origins == {}
+    assert image_scheduler.get_next_at() == now + 3600
+
+
+def test_origin_isolation(tmp_path, build_configs):
+    image_scheduler = _scheduler(tmp_path)
+    image_scheduler.update(build_configs, NOW, spread=False)
+    image_scheduler.record([
+        _result('one', _alpine('http://one.example.com'),
+                error=OSError('down')),
+        _result('two', _alpine('http://two.example.com')),
+        _result('gh', _github()),
+    ], NOW)
+
+    # only the images of the failing mirror are retried
+    assert image_scheduler.get_due(NOW + 60) == ['one']
+    assert list(image_scheduler.origins) == ['http://one.example.com']
+
+
+def test_state_reload(tmp_path, build_configs):
+    image_scheduler = _scheduler(tmp_path)
+    image_scheduler.update(build_configs, NOW, spread=False)
+    image_scheduler.record([
+        _result('one', _alpine('http://one.example.com'),
+                error=OSError('down')),
+        _result('gh', _github()),
+    ], NOW)
+    image_scheduler.save()
+
+    reloaded = _scheduler(tmp_path)
+    reloaded.load()
+    assert reloaded.images == image_scheduler.images
+    assert reloaded.origins == image_scheduler.origins
+
+    # images already scheduled keep their schedule
+    reloaded.update(build_configs, NOW + 1, spread=False)
+    assert reloaded.get_due(NOW + 1) == ['two']
+
+
+def test_state_of_other_path(tmp_path, build_configs):
+    image_scheduler = _scheduler(tmp_path)
+    image_scheduler.update(build_configs, NOW)
+    image_scheduler.save()
+
+    other = scheduler.Scheduler(
+        path=str(tmp_path / 'other'),
+        cache_dir=str(tmp_path / 'cache'))
+    other.load()
+    assert other.images == {}
@@ -0,0 +1,66 @@
+import pytest
+
+from version_finder import semver
+
+
+@pytest.mark.parametrize('lower, higher', [
+    ('1.2', '1.10'),
+    ('1.2', '1.2.1'),
+    ('1.2.0-rc1', '1.2.0'),
+    ('1.2.0-alpha', '1.2.0-beta'),
+    ('3.1_alpha1', '3.1_beta1'),
+    ('3.1_beta2', '3.1_pre1'),
+    ('3.1_pre1', '3.1_rc1'),
+    ('3.1_rc1', '3.1'),
+    ('3.1_rc1', '3.1_rc2'),
+    ('1.0', '1.0_cvs'),
+    ('1.0_cvs', '1.0_svn'),
+    ('1.0_svn', '1.0_git'),
+    ('1.0_git', '1.0_hg'),
+    ('1.0_hg', '1.0_p1'),
+    ('1.0_p1', '1.0_p2'),
+    ('1.0_p2', '1.0.1'),
+    ('9.3_p2-r0', '9.3_p2-r1'),
+    ('invalid', '0.1'),
+])
+def test_sort_key_order(lower, higher):
+    assert semver.sort_key(lower) < semver.sort_key(higher)
+
+
+def test_sort_key_equal():
+    assert semver.sort_key('v1.2') == semver.sort_key('1.2.0')
+
+
+@pytest.mark.parametrize('version, final', [
+    ('1.2.3', True),
+    ('9.3_p2-r0', True),
+    ('2.39_git20230101', True),
+    ('1.0_rc1', False),
+    ('2.0.0-beta.1', False),
+])
+def test_sort_key_final(version, final):
+    assert semver.sort_key(version).final is final
+
+
+@pytest.mark.parametrize('spec, expected', [
+    ('latest', '2.0.0-rc1'),
+    ('latest-stable', '1.9.1_p1'),
+    ('<=1.8', '1.8.3'),
+    ('~1.8.1', '1.8.3'),
+    ('^1', '1.9.1_p1'),
+    ('>=1.9, <2', '1.9.1_p1'),
+    ('==1.7', None),
+])
+def test_resolve(spec, expected):
+    stable = ['1.8.0', '1.8.3', '1.9.1', '1.9.1_p1']
+    unstable = ['1.9.0-rc1', '2.0.0-rc1']
+    assert semver.resolve(spec, stable, unstable) == expected
+
+
+def test_resolve_post_release():
+    assert semver.resolve('latest-stable', ['9.3_p2-r0']) == '9.3_p2-r0'
+
+
+def test_invalid_constraint():
+    with pytest.raises(ValueError):
+        semver.resolve('>=x', ['1.0'])
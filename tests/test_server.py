@@ -0,0 +1,115 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+import cli
+import default
+import server
+
+CLI = os.path.join(os.path.dirname(__file__), '..', 'jojo', 'cli.py')
+
+BUILDFILE = '''\
+image:
+  registry: registry.example.com
+  name: tools
+  tag: latest
+  tag_build: null
+'''
+
+
+@pytest.fixture(scope='module')
+def daemon(tmp_path_factory):
+    path = tmp_path_factory.mktemp('daemon')
+    socket_path = str(path / 'jojo.sock')
+    process = subprocess.Popen([sys.executable, CLI, 'serve', socket_path])
+    deadline = time.monotonic() + 10
+    while not os.path.exists(socket_path):
+        assert process.poll() is None
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    yield socket_path
+    process.terminate()
+    assert process.wait(timeout=10) == 0
+    assert not os.path.exists(socket_path)
+
+
+@pytest.fixture
+def images(tmp_path, monkeypatch):
+    (tmp_path / 'images' / 'tools').mkdir(parents=True)
+    (tmp_path / 'images' / 'tools' / '.jojo.yaml').write_text(BUILDFILE)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path / 'images'
+
+
+def _request(socket_path: str, method: str, url: str, **kwargs):
+    connection = server.UnixHTTPConnection(socket_path)
+    connection.request(method, url, **kwargs)
+    response = connection.getresponse()
+    with response:
+        return response.status, json.loads(response.read())
+
+
+def test_forward_cwd(daemon, images, capsys):
+    # the relative path is that of the client
+    assert server.forward(daemon, [
+        'listver', '--path', 'images', '--cache-dir', 'cache', 'tools']) == 0
+    assert 'tools: no tag_build configured' in capsys.readouterr().err
+
+
+def test_forward_env(daemon, images, monkeypatch, capsys):
+    monkeypatch.setenv(default.EnvVar.IMAGES_PATH.value, str(images))
+    args = ['listver', '--cache-dir', 'cache']
+    assert server.forward(daemon, args + ['tools']) == 0
+    assert 'tools: no tag_build configured' in capsys.readouterr().err
+    assert server.forward(daemon, args + ['missing']) == 1
+    assert 'image directory does not exist' in capsys.readouterr().err
+
+
+def test_forward_usage_error(daemon, capsys):
+    assert server.forward(daemon, ['build', '--no-such-option']) == 2
+    assert 'usage:' in capsys.readouterr().err
+
+
+def test_forward_command_not_served(daemon, capsys):
+    assert server.forward(daemon, ['serve']) == 2
+    assert 'command not one of' in capsys.readouterr().err
+
+
+def test_forward_no_daemon(tmp_path):
+    assert server.forward(str(tmp_path / 'missing.sock'), ['build']) is None
+
+
+def test_main_forwards(daemon, images, monkeypatch, capsys):
+    monkeypatch.setenv(default.EnvVar.SOCKET.value, daemon)
+    monkeypatch.setenv(default.EnvVar.IMAGES_PATH.value, str(images))
+    monkeypatch.setattr(sys, 'argv', ['jojo', 'listver', 'missing'])
+    monkeypatch.setattr(cli, 'run', None)
+    with pytest.raises(SystemExit) as info:
+        cli.main()
+    assert info.value.code == 1
+
+
+def test_status(daemon):
+    status, body = _request(daemon, 'GET', '/v1/status')
+    assert status == 200
+    assert body['pid'] != os.getpid()
+    assert body['requests'] >= 0
+    assert _request(daemon, 'GET', '/v1/other')[0] == 404
+
+
+def test_run_requires_json(daemon):
+    body = json.dumps({'argv': ['build']})
+    status, response = _request(
+        daemon, 'POST', '/v1/run', body=body,
+        headers={'Content-Type': 'text/plain'})
+    assert status == 415
+    assert response == {'error': 'expected application/json'}
+
+    status, response = _request(
+        daemon, 'POST', '/v1/run', body='{',
+        headers={'Content-Type': 'application/json'})
+    assert status == 400
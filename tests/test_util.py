@@ -0,0 +1,121 @@
+import os
+
+import util
+
+
+def _context(tmp_path):
+    context = tmp_path / 'context'
+    context.mkdir()
+    (context / 'Dockerfile').write_text('FROM scratch\n')
+    (context / 'data').write_text('data\n')
+    os.symlink('data', context / 'link')
+    return context
+
+
+def test_hash_context_changes(tmp_path):
+    context = _context(tmp_path)
+    digest = util.hash_context(str(context), excludes=[])
+    assert util.hash_context(str(context), excludes=[]) == digest
+
+    (context / 'data').write_text('other data\n')
+    assert util.hash_context(str(context), excludes=[]) != digest
+
+
+def test_hash_context_symlink_target(tmp_path):
+    context = _context(tmp_path)
+    digest = util.hash_context(str(context), excludes=[])
+    os.unlink(context / 'link')
+    os.symlink('Dockerfile', context / 'link')
+    assert util.hash_context(str(context), excludes=[]) != digest
+
+
+def test_hash_context_cache(tmp_path):
+    context = _context(tmp_path)
+    cache_dir = tmp_path / 'cache'
+    digest = util.hash_context(
+        str(context), excludes=[], cache_dir=str(cache_dir))
+    (sidecar,) = (cache_dir / 'context').iterdir()
+
+    # unchanged, even with a symlink in the context
+    written_at = sidecar.stat().st_mtime_ns + 10**9
+    os.utime(sidecar, ns=(written_at, written_at))
+    assert util.hash_context(
+        str(context), excludes=[], cache_dir=str(cache_dir)) == digest
+    assert sidecar.stat().st_mtime_ns == written_at
+
+    (context / 'data').write_text('other data\n')
+    assert util.hash_context(
+        str(context), excludes=[], cache_dir=str(cache_dir)) != digest
+    assert sidecar.stat().st_mtime_ns != written_at
+
+
+def test_hash_context_racy(tmp_path):
+    context = _context(tmp_path)
+    cache_dir = tmp_path / 'cache'
+    digest = util.hash_context(
+        str(context), excludes=[], cache_dir=str(cache_dir))
+    (sidecar,) = (cache_dir / 'context').iterdir()
+
+    # modified in the tick the sidecar was written in, after being hashed
+    data = context / 'data'
+    mtime = data.stat().st_mtime_ns
+    data.write_text('DATA\n')
+    os.utime(data, ns=(mtime, mtime))
+    os.utime(sidecar, ns=(mtime, mtime))
+    changed = util.hash_context(
+        str(context), excludes=[], cache_dir=str(cache_dir))
+    assert changed != digest
+
+    # the sidecar is rewritten, it is then newer than the files
+    assert sidecar.stat().st_mtime_ns > mtime
+    assert util.hash_context(
+        str(context), excludes=[], cache_dir=str(cache_dir)) == changed
+
+
+def test_hash_context_dry_run(tmp_path):
+    context = _context(tmp_path)
+    cache_dir = tmp_path / 'cache'
+    digest = util.hash_context(
+        str(context), excludes=[], cache_dir=str(cache_dir), dry_run=True)
+    assert not cache_dir.exists()
+    assert util.hash_context(
+        str(context), excludes=[], cache_dir=str(cache_dir)) == digest
+    assert cache_dir.exists()
+
+
+def test_hash_context_symlinked_directory(tmp_path):
+    context = _context(tmp_path)
+    shared = tmp_path / 'shared'
+    shared.mkdir()
+    (shared / 'file').write_text('shared\n')
+    os.symlink(shared, context / 'shared')
+    # a loop is walked once
+    os.symlink(context, shared / 'context')
+    digest = util.hash_context(str(context), excludes=[])
+
+    (shared / 'file').write_text('other\n')
+    assert util.hash_context(str(context), excludes=[]) != digest
+
+
+def test_hash_context_warm_only_stats(tmp_path, monkeypatch):
+    context = tmp_path / 'context'
+    for i in range(100):
+        directory = context / f'dir{i}'
+        directory.mkdir(parents=True)
+        for j in range(100):
+            (directory / f'file{j}').write_bytes(b'%d %d\n' % (i, j))
+    cache_dir = tmp_path / 'cache'
+    digest = util.hash_context(
+        str(context), excludes=[], cache_dir=str(cache_dir))
+
+    opened = []
+
+    def tracking_open(path, *args, **kwargs):
+        opened.append(str(path))
+        return open(path, *args, **kwargs)
+
+    monkeypatch.setattr(util, 'open', tracking_open, raising=False)
+    assert util.hash_context(
+        str(context), excludes=[], cache_dir=str(cache_dir)) == digest
+    # only the sidecar was read, the 10k files were only stat'ed
+    assert opened == [str(path) for path in (cache_dir / 'context').iterdir()]
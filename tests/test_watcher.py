@@ -0,0 +1,81 @@
+import os
+import threading
+import time
+
+import pytest
+
+import watcher
+
+
+@pytest.fixture(params=['inotify', 'poll'])
+def watch(request, tmp_path):
+    (tmp_path / 'app').mkdir()
+    (tmp_path / 'app' / '.jojo.yaml').write_text('image: {}\n')
+    (tmp_path / 'tools').mkdir()
+    tree_watcher = watcher.get_watcher(
+        str(tmp_path), poll=request.param == 'poll', interval=0.05)
+    if request.param == 'inotify' and \
+            not isinstance(tree_watcher, watcher.InotifyWatcher):
+        pytest.skip('inotify is not available')
+    yield tree_watcher
+    tree_watcher.close()
+
+
+def test_get_watcher_poll(tmp_path):
+    assert isinstance(watcher.get_watcher(str(tmp_path), poll=True),
+                      watcher.PollingWatcher)
+
+
+def test_no_change(watch):
+    start = time.monotonic()
+    assert watch.wait(debounce=0.1, timeout=0.3) == set()
+    assert time.monotonic() - start >= 0.3
+
+
+def test_modified(watch, tmp_path):
+    buildfile = tmp_path / 'app' / '.jojo.yaml'
+    buildfile.write_text('image:\n  name: app\n')
+    paths = watch.wait(debounce=0.2, timeout=5)
+    assert str(buildfile) in paths
+    assert watch.get_image_names(paths) == {'app'}
+
+
+def test_deleted(watch, tmp_path):
+    (tmp_path / 'app' / '.jojo.yaml').unlink()
+    paths = watch.wait(debounce=0.2, timeout=5)
+    assert str(tmp_path / 'app' / '.jojo.yaml') in paths
+
+
+def test_new_directory_watched(watch, tmp_path):
+    (tmp_path / 'new').mkdir()
+    assert str(tmp_path / 'new') in watch.wait(debounce=0.2, timeout=5)
+
+    (tmp_path / 'new' / 'Dockerfile').write_text('FROM scratch\n')
+    paths = watch.wait(debounce=0.2, timeout=5)
+    assert str(tmp_path / 'new' / 'Dockerfile') in paths
+    assert watch.get_image_names(paths) == {'new'}
+
+
+def test_burst_reported_at_once(watch, tmp_path):
+    def write():
+        for name in ('app', 'tools', 'app'):
+            with open(tmp_path / name / 'file', 'a') as fobj:
+                fobj.write('change\n')
+            time.sleep(0.1)
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    paths = watch.wait(debounce=0.5, timeout=5)
+    thread.join()
+    assert watch.get_image_names(paths) == {'app', 'tools'}
+    assert watch.wait(debounce=0.1, timeout=0.2) == set()
+
+
+def test_get_image_names(tmp_path):
+    tree_watcher = watcher.PollingWatcher(str(tmp_path))
+    assert tree_watcher.get_image_names([
+        str(tmp_path),
+        str(tmp_path / 'app'),
+        str(tmp_path / 'app' / 'deep' / 'file'),
+        os.path.join(str(tmp_path), 'tools', '.jojo.yaml'),
+    ]) == {'app', 'tools'}